@@ -0,0 +1,82 @@
+"""
+Compares the size and load time of nation data stored as a JSON column and as a compressed binary column.
+
+Run with ``python benchmarks/data_storage.py [database url]`` from the repository root, with ``src`` on the path. A
+temporary SQLite database is used when no url is given. The benchmark tables are dropped afterwards.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any
+
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, JSON, select, func, text, Engine
+
+from Scout.database import types
+
+NATIONS = 20000
+SCALES = 88
+
+
+def make_nation(i: int) -> dict[str, Any]:
+    return {"NAME": "Nation {}".format(i), "TYPE": "Republic", "FULLNAME": "The Republic of Nation {}".format(i),
+            "MOTTO": "Strength in numbers", "CATEGORY": "Left-Leaning College State", "UNSTATUS": "Non-member",
+            "ENDORSEMENTS": ",".join("nation_{}".format(random.randrange(NATIONS)) for _ in range(i % 20)),
+            "REGION": "Region {}".format(i % 300), "POPULATION": str(random.randrange(5, 40000)),
+            "LASTLOGIN": str(1700000000 + i), "LASTACTIVITY": "2 days ago", "INFLUENCE": "Zero",
+            "CENSUS": {"SCALE": [{"@id": str(scale), "SCORE": "{:.2f}".format(random.uniform(0, 10000)),
+                                  "RANK": str(random.randrange(NATIONS)), "RRANK": str(random.randrange(100))}
+                                 for scale in range(SCALES)]}}
+
+
+def table_size(engine: Engine, name: str) -> int:
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            return connection.scalar(text("SELECT pg_total_relation_size(:name)"), {"name": name})
+        if engine.dialect.name == "sqlite":
+            return connection.scalar(text("SELECT sum(pgsize) FROM dbstat WHERE name = :name"), {"name": name})
+    return 0
+
+
+def measure(engine: Engine, name: str, column_type, nations: list[dict[str, Any]]):
+    table = Table("bench_{}".format(name), MetaData(), Column("id", Integer, primary_key=True),
+                  Column("data", column_type))
+    table.drop(engine, checkfirst=True)
+    table.create(engine)
+    try:
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            connection.execute(table.insert(), [{"id": i, "data": nation} for i, nation in enumerate(nations)])
+        write = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with engine.connect() as connection:
+            loaded = connection.execute(select(table.c.data)).scalars().all()
+        load = time.perf_counter() - started
+        assert len(loaded) == len(nations)
+
+        print("{:<10} {:>10.1f} MiB {:>8.2f}s write {:>8.2f}s load".format(
+            name, table_size(engine, table.name) / 1024 / 1024, write, load))
+    finally:
+        table.drop(engine)
+
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else "sqlite:///{}".format(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    engine = create_engine(url)
+    random.seed(0)
+    nations = [make_nation(i) for i in range(NATIONS)]
+
+    measure(engine, "json", JSON, nations)
+    for compression in ("none", "zlib", "zstd"):
+        try:
+            types.set_compression(compression)
+        except ValueError as e:
+            print("{:<10} skipped, {}".format(compression, e))
+            continue
+        measure(engine, compression, types.CompressedJSON, nations)
+
+
+if __name__ == "__main__":
+    main()
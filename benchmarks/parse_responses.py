@@ -0,0 +1,44 @@
+"""
+Compares xmltodict with parse_response, which gives the same layout using ElementTree, on a typical nation response.
+
+Run with ``python benchmarks/parse_responses.py`` from the repository root, with ``src`` on the path.
+"""
+import sys
+import timeit
+import tracemalloc
+
+import xmltodict
+
+from Scout.nsapi.parsing import parse_response
+
+SCALES = 90
+ENDORSEMENTS = 200
+
+
+def make_response() -> str:
+    census = "".join("<SCALE id=\"{0}\"><SCORE>{0}.25</SCORE><RANK>{0}</RANK><RRANK>{0}</RRANK></SCALE>".format(i)
+                     for i in range(SCALES))
+    endorsements = ",".join("nation_{}".format(i) for i in range(ENDORSEMENTS))
+    return ("<NATION id=\"testlandia\"><NAME>Testlandia</NAME><REGION>Testregionia</REGION>"
+            "<UNSTATUS>WA Delegate</UNSTATUS><ENDORSEMENTS>{}</ENDORSEMENTS><POPULATION>41234</POPULATION>"
+            "<LASTLOGIN>1700000000</LASTLOGIN><CENSUS>{}</CENSUS></NATION>").format(endorsements, census)
+
+
+def measure(name: str, parse, runs: int):
+    seconds = min(timeit.repeat(parse, number=runs, repeat=5)) / runs
+    tracemalloc.start()
+    result = parse()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print("{:<10} {:>8.1f} us/parse {:>8.1f} KiB retained".format(name, seconds * 1e6, size / 1024))
+
+
+def main(runs: int = 2000):
+    response = make_response()
+    measure("xmltodict", lambda: xmltodict.parse(response)["NATION"], runs)
+    measure("etree", lambda: parse_response(response, "NATION"), runs)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
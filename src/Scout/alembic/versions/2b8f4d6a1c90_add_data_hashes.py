@@ -0,0 +1,29 @@
+"""Add the data hash to nations and regions
+
+Revision ID: 2b8f4d6a1c90
+Revises:
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b8f4d6a1c90'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Rows start without a hash, so the first data dump ingest writes every one of them and fills it in.
+    for table in ("nations", "regions"):
+        with op.batch_alter_table(table) as batch:
+            batch.add_column(sa.Column("data_hash", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    for table in ("nations", "regions"):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("data_hash")
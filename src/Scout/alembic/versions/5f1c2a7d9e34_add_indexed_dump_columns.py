@@ -0,0 +1,55 @@
+"""Add the indexed columns to nations and regions
+
+Revision ID: 5f1c2a7d9e34
+Revises: 2b8f4d6a1c90
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1c2a7d9e34'
+down_revision = '2b8f4d6a1c90'
+branch_labels = None
+depends_on = None
+
+NATION_COLUMNS = [
+    sa.Column("canonical_name", sa.String(), nullable=True),
+    sa.Column("wa_status", sa.String(), nullable=True),
+    sa.Column("endorsement_count", sa.Integer(), nullable=True),
+    sa.Column("influence", sa.String(), nullable=True),
+    sa.Column("last_login", sa.Integer(), nullable=True),
+    sa.Column("last_activity", sa.String(), nullable=True),
+]
+REGION_COLUMNS = [
+    sa.Column("canonical_name", sa.String(), nullable=True),
+    sa.Column("delegate", sa.String(), nullable=True),
+    sa.Column("founder", sa.String(), nullable=True),
+]
+INDEXES = {
+    "nations": ["region_id", "canonical_name", "wa_status"],
+    "regions": ["canonical_name", "delegate", "founder"],
+}
+
+
+def upgrade() -> None:
+    for table, columns in (("nations", NATION_COLUMNS), ("regions", REGION_COLUMNS)):
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.add_column(column.copy())
+        for column in INDEXES[table]:
+            op.create_index(op.f("ix_{}_{}".format(table, column)), table, [column])
+
+        # Clearing the hashes makes the next data dump ingest rewrite every row, which fills in the new columns.
+        op.execute(sa.text("UPDATE {} SET data_hash = NULL".format(table)))
+
+
+def downgrade() -> None:
+    for table, columns in (("nations", NATION_COLUMNS), ("regions", REGION_COLUMNS)):
+        for column in INDEXES[table]:
+            op.drop_index(op.f("ix_{}_{}".format(table, column)), table_name=table)
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.drop_column(column.name)
@@ -0,0 +1,74 @@
+"""Store nation and region data as compressed binary
+
+Revision ID: 8a4e6b0c2d17
+Revises: 5f1c2a7d9e34
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from Scout.database import types
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6b0c2d17'
+down_revision = '5f1c2a7d9e34'
+branch_labels = None
+depends_on = None
+
+TABLES = ("nations", "regions")
+BATCH_SIZE = 1000
+
+
+def _recode(table: str, convert):
+    # Rewrites the data of every row in Python, for the databases that can not do it in SQL.
+    connection = op.get_bind()
+    rows = sa.table(table, sa.column("id", sa.Integer), sa.column("data", sa.LargeBinary))
+    last_id = -1
+    while batch := connection.execute(sa.select(rows.c.id, rows.c.data).where(rows.c.id > last_id)
+                                      .order_by(rows.c.id).limit(BATCH_SIZE)).all():
+        connection.execute(rows.update().where(rows.c.id == sa.bindparam("row_id")),
+                           [{"row_id": id, "data": convert(data)} for id, data in batch])
+        last_id = batch[-1][0]
+
+
+def _plain(data: bytes | str) -> bytes:
+    return b"j" + json.dumps(types.decode(data), separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def upgrade() -> None:
+    # Existing rows are stored as plain JSON behind the plain header. Clearing the hashes makes the next data dump
+    # ingest rewrite them compressed.
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == "postgresql":
+            op.alter_column(table, "data", type_=sa.LargeBinary(), existing_type=sa.JSON(), existing_nullable=False,
+                            postgresql_using="convert_to('j' || data::text, 'UTF8')")
+        else:
+            with op.batch_alter_table(table) as batch:
+                batch.alter_column("data", type_=sa.LargeBinary(), existing_type=sa.JSON(), existing_nullable=False)
+            if dialect == "sqlite":
+                op.execute(sa.text("UPDATE {} SET data = CAST('j' || data AS BLOB)".format(table)))
+            else:
+                _recode(table, lambda data: b"j" + (data.encode() if isinstance(data, str) else bytes(data)))
+        op.execute(sa.text("UPDATE {} SET data_hash = NULL".format(table)))
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        _recode(table, _plain)
+        if dialect == "postgresql":
+            op.alter_column(table, "data", type_=sa.JSON(), existing_type=sa.LargeBinary(), existing_nullable=False,
+                            postgresql_using="convert_from(substring(data from 2), 'UTF8')::json")
+            continue
+
+        if dialect == "sqlite":
+            op.execute(sa.text("UPDATE {} SET data = CAST(substr(data, 2) AS TEXT)".format(table)))
+        else:
+            _recode(table, lambda data: bytes(data)[1:])
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column("data", type_=sa.JSON(), existing_type=sa.LargeBinary(), existing_nullable=False)
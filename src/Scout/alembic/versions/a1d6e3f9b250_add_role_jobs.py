@@ -0,0 +1,33 @@
+"""Add the queue of pending role changes
+
+Revision ID: a1d6e3f9b250
+Revises: e7b2c5d8f013
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d6e3f9b250'
+down_revision = 'e7b2c5d8f013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('role_jobs',
+                    sa.Column('guild_snowflake', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('member_snowflake', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('add', sa.JSON(), nullable=False),
+                    sa.Column('remove', sa.JSON(), nullable=False),
+                    sa.Column('revision', sa.Integer(), nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('not_before', sa.DateTime(), nullable=True),
+                    sa.Column('created', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+                    sa.PrimaryKeyConstraint('guild_snowflake', 'member_snowflake'))
+
+
+def downgrade() -> None:
+    op.drop_table('role_jobs')
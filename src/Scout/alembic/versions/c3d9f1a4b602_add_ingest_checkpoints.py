@@ -0,0 +1,31 @@
+"""Add checkpoints for resuming the data dump ingest
+
+Revision ID: c3d9f1a4b602
+Revises: 8a4e6b0c2d17
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d9f1a4b602'
+down_revision = '8a4e6b0c2d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ingest_checkpoints',
+                    sa.Column('dump_type', sa.String(), nullable=False),
+                    sa.Column('identity', sa.String(), nullable=False),
+                    sa.Column('phase', sa.String(), nullable=False),
+                    sa.Column('records', sa.Integer(), nullable=False),
+                    sa.Column('last_updated', sa.DateTime(), server_default=sa.func.now(),
+                              nullable=False),
+                    sa.PrimaryKeyConstraint('dump_type'))
+
+
+def downgrade() -> None:
+    op.drop_table('ingest_checkpoints')
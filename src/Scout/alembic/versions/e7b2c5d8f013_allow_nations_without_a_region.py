@@ -0,0 +1,33 @@
+"""Allow nations without a region, for verified nations that no longer exist
+
+Revision ID: e7b2c5d8f013
+Revises: c3d9f1a4b602
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b2c5d8f013'
+down_revision = 'c3d9f1a4b602'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('nations') as batch_op:
+        batch_op.alter_column('region_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    # Nations without a region no longer exist on NationStates, so they are removed along with everything about them.
+    detached = sa.select(sa.column('id')).select_from(sa.table('nations')).where(sa.column('region_id').is_(None))
+    op.execute(sa.table('user_nations', sa.column('nation_id')).delete()
+               .where(sa.column('nation_id').in_(detached)))
+    op.execute(sa.table('nation_ownership_information', sa.column('id')).delete()
+               .where(sa.column('id').in_(detached)))
+    op.execute(sa.table('nations', sa.column('region_id')).delete().where(sa.column('region_id').is_(None)))
+    with op.batch_alter_table('nations') as batch_op:
+        batch_op.alter_column('region_id', existing_type=sa.Integer(), nullable=False)
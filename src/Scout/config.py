@@ -20,6 +20,14 @@ def default_values() -> dict[str, str]:
         "PING_PREFIX": "True",
         "DB_DIALECT": "sqlite",
         "REGION": "",
+        "DUMP_DIRECTORY": ".",
+        "NS_CACHE_SIZE": "1024",
+        "NS_CACHE_FILE": "",
+        "DUMP_PROCESSES": "1",
+        "DUMP_MEMORY_BUDGET": "0",
+        "DUMP_ARCHIVE_DAYS": "0",
+        "DB_COMPRESSION": "zlib",
+        "ROLE_JOB_WORKERS": "4",
     }
 
 
@@ -73,14 +81,23 @@ def toml_flatten(toml_config):
         "PREFIXLESS_DMS": toml_config['bot']['commands']['ALLOW_PREFIXLESS_IN_DMS'],
         "PING_PREFIX": toml_config['bot']['commands']['ALLOW_PING_AS_PREFIX'],
         "DISCORD_API_KEY": toml_config['bot']['api']['discord']['API_KEY'],
+        "ROLE_JOB_WORKERS": toml_config['bot']['api']['discord'].get('ROLE_JOB_WORKERS', 4),
         "NATION": check_str(toml_config['bot']['api']['n']['NATION'], 'api.n.NATION'),
         "CONTACT_INFO": check_str(toml_config['bot']['api']['n']['CONTACT_INFO'], "api.n.CONTACT_INFO"),
         "REGION": str_to_opt_str(toml_config['bot']['api']['n']['REGION']),
+        "DUMP_DIRECTORY": str_to_opt_str(toml_config['bot']['api']['n'].get('DUMP_DIRECTORY', '')),
+        "DUMP_PROCESSES": toml_config['bot']['api']['n'].get('DUMP_PROCESSES', 1),
+        "DUMP_MEMORY_BUDGET": toml_config['bot']['api']['n'].get('DUMP_MEMORY_BUDGET', 0),
+        "DUMP_ARCHIVE_DAYS": toml_config['bot']['api']['n'].get('DUMP_ARCHIVE_DAYS', 0),
+        "NS_CACHE_SIZE": toml_config['bot']['api']['n'].get('CACHE_SIZE', 1024),
+        "NS_CACHE_FILE": str_to_opt_str(toml_config['bot']['api']['n'].get('CACHE_FILE', '')),
         "DB_DIALECT": check_str(toml_config['bot']['database']['sql']['DIALECT'], "database.sql.DIALECT"),
         "DB_DRIVER": str_to_opt_str(toml_config['bot']['database']['sql']['DRIVER']),
+        "DB_ASYNC_DRIVER": str_to_opt_str(toml_config['bot']['database']['sql'].get('ASYNC_DRIVER', '')),
         "DB_TABLE": str_to_opt_str(toml_config['bot']['database']['sql']['TABLE']),
         "DB_LOGIN": toml_config['bot']['database']['sql']['LOGIN'],
-        "DB_CONN": toml_config['bot']['database']['sql']['CONNECTION']
+        "DB_CONN": toml_config['bot']['database']['sql']['CONNECTION'],
+        "DB_COMPRESSION": toml_config['bot']['database']['sql'].get('COMPRESSION', 'zlib'),
     }
 
 
@@ -114,8 +131,10 @@ def pythonize_env(env_config):
                 env_config[key] = [k for k in val.split(":") if k]
             case "PREFIXLESS_DMS" | "PING_PREFIX":
                 env_config[key] = str_to_bool(val)
-            case "REGION" | "DB_DRIVER" | "TABLE":
+            case "REGION" | "DB_DRIVER" | "DB_ASYNC_DRIVER" | "TABLE" | "DUMP_DIRECTORY" | "NS_CACHE_FILE":
                 env_config[key] = str_to_opt_str(val)
+            case "NS_CACHE_SIZE" | "DUMP_PROCESSES" | "DUMP_MEMORY_BUDGET" | "DUMP_ARCHIVE_DAYS" | "ROLE_JOB_WORKERS":
+                env_config[key] = int(val)
             case "DB_LOGIN":
                 env_config[key] = {'user': val.split(":")[0], 'password': val.split(":")[1]}
             case "DB_CONN":
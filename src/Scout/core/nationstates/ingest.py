@@ -0,0 +1,556 @@
+"""
+This module contains the ingest of the NationStates daily data dumps into the database.
+"""
+import datetime
+import hashlib
+import json
+import time
+from collections import Counter
+import itertools
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional
+
+from sqlalchemy import (Engine, Connection, ColumnElement, MetaData, Table, Column, Text, Index, select, insert, update,
+                        delete, exists, func, true)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from Scout.database import types
+from Scout.database.models import (Region, Nation, NationOwnershipInformation, IngestCheckpoint, user_nation,
+                                   guild_region)
+from Scout.nsapi.cache import canonicalize
+
+DELETE_BATCH_SIZE = 500
+LOOKUP_CHUNK_SIZE = 500
+LOADER_BATCHES = 2
+"""About how many batches worth of memory a loader holds while staging a batch, on top of the batch itself."""
+INDEXED_COLUMNS = {
+    Nation: ("canonical_name", "wa_status", "endorsement_count", "influence", "last_login", "last_activity"),
+    Region: ("canonical_name", "delegate", "founder"),
+}
+
+
+def content_hash(data: dict[str, Any]) -> str:
+    """Hashes a nation or region's data.
+
+    The data is serialized with sorted keys and no whitespace before it is hashed, so the same data always gives the
+    same hash no matter how it was parsed.
+
+    Args:
+        data: The data from the data dump.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _count(value: Any) -> Optional[int]:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len([item for item in value.split(",") if item])
+    return None
+
+
+def _nation_name(value: Any) -> Optional[str]:
+    # NationStates uses 0 when a region has no delegate or founder.
+    if not isinstance(value, str) or value in ("", "0"):
+        return None
+    return canonicalize(value)
+
+
+def record_columns(table: type[Region] | type[Nation], record: dict[str, Any]) -> dict[str, Any]:
+    """Gets the values of the indexed columns from a nation or region's data.
+
+    This works for records from the data dumps and for API responses, which are parsed into the same layout. Fields
+    that are missing from the record are None.
+
+    Args:
+        table: The table the record belongs to, either Region or Nation.
+        record: The data of the nation or region.
+    """
+    if table is Nation:
+        return {'canonical_name': canonicalize(record["NAME"]),
+                'wa_status': record.get("UNSTATUS", None),
+                'endorsement_count': _count(record["ENDORSEMENTS"]) if "ENDORSEMENTS" in record else None,
+                'influence': record.get("INFLUENCE", None),
+                'last_login': _int(record.get("LASTLOGIN", None)),
+                'last_activity': record.get("LASTACTIVITY", None)}
+    return {'canonical_name': canonicalize(record["NAME"]),
+            'delegate': _nation_name(record.get("DELEGATE", None)),
+            'founder': _nation_name(record.get("FOUNDER", None))}
+
+
+def _chunks(values: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(values)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _removable(table: type[Region] | type[Nation]) -> ColumnElement[bool]:
+    # Nations that a user has verified as theirs, and regions that still have nations or are linked to a guild, are
+    # kept even when they are no longer in the data dump.
+    if table is Nation:
+        return (~exists().where(user_nation.c.nation_id == Nation.id)
+                & ~exists().where(NationOwnershipInformation.id == Nation.id))
+    return ~exists().where(Nation.region_id == Region.id) & ~exists().where(guild_region.c.region_id == Region.id)
+
+
+def verified_nations(engine: Engine) -> dict[int, tuple[str, Optional[int]]]:
+    """Gets the name and region id of every nation that a user has verified as theirs.
+
+    Args:
+        engine: The database engine.
+
+    Returns:
+        The name and region id of each nation, keyed by the nation's id.
+    """
+    with Session(engine) as session:
+        return {id: (name, region_id) for id, name, region_id in
+                session.execute(select(Nation.id, Nation.name, Nation.region_id)
+                                .where(exists().where(user_nation.c.nation_id == Nation.id)))}
+
+
+def detach_nations(engine: Engine, nation_ids: Iterable[int]):
+    """Takes nations that no longer exist out of their region.
+
+    Verified nations are kept when they leave the data dump, this stops them from counting as residents of the region
+    they were last in. Their data hash is cleared, so if the nation is founded again it is written back by the next
+    ingest.
+
+    Args:
+        engine: The database engine.
+        nation_ids: The ids of the nations.
+    """
+    with Session(engine) as session:
+        for ids in _chunks(nation_ids, DELETE_BATCH_SIZE):
+            session.execute(update(Nation).where(Nation.id.in_(ids)).values(region_id=None, data_hash=None))
+        session.commit()
+
+
+def region_moves(before: dict[int, tuple[str, Optional[int]]], after: dict[int, tuple[str, Optional[int]]]
+                 ) -> dict[int, tuple[Optional[int], Optional[int]]]:
+    """Finds the verified nations whose region changed between two calls of verified_nations.
+
+    Nations that were verified in between are left out, they were given their roles when they were verified.
+
+    Returns:
+        The region id the nation was in and the region id it is in now, keyed by the nation's id. A region id of None
+        means the nation no longer exists.
+    """
+    return {id: (before[id][1], region_id) for id, (_, region_id) in after.items()
+            if id in before and before[id][1] != region_id}
+
+
+class IngestProgress:
+    """Keeps track of how far along an ingest is.
+
+    Attributes:
+        phase: What the ingest is currently doing.
+        done: The amount of records processed in the current phase.
+        total: The amount of records in the current phase, if known.
+    """
+    phase: str
+    done: int
+    total: Optional[int]
+
+    def __init__(self):
+        self.phase = "idle"
+        self.done = 0
+        self.total = None
+        self._started = time.monotonic()
+        self._start_done = 0
+
+    def start(self, phase: str, total: Optional[int] = None, done: int = 0):
+        """Starts a new phase.
+
+        Args:
+            phase: The name of the phase.
+            total: The amount of records in the phase, if known.
+            done: The amount of records that were already processed, such as before a restart.
+        """
+        self.phase = phase
+        self.total = total
+        self.done = done
+        self._started = time.monotonic()
+        self._start_done = done
+
+    def advance(self, amount: int) -> bool:
+        """Records that more records were processed.
+
+        Returns:
+            If another tenth of the phase has been completed, this is useful for deciding when to log.
+        """
+        before = self.done
+        self.done += amount
+        return bool(self.total) and self.done * 10 // self.total > before * 10 // self.total
+
+    @property
+    def rate(self) -> float:
+        """The amount of records processed per second in the current phase."""
+        elapsed = time.monotonic() - self._started
+        return (self.done - self._start_done) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """How many seconds are estimated to be left in the current phase, if it can be estimated."""
+        if not self.total or not self.rate:
+            return None
+        return max(self.total - self.done, 0) / self.rate
+
+    def __str__(self) -> str:
+        if self.total is None and not self.done:
+            return self.phase.capitalize()
+        if self.total is None:
+            return "{}: {} records, {:.0f} records/s".format(self.phase, self.done, self.rate)
+        eta = "unknown" if self.eta is None else str(datetime.timedelta(seconds=round(self.eta)))
+        return "{}: {} of {} records ({:.0%}), {:.0f} records/s, ETA {}".format(
+            self.phase, self.done, self.total, self.done / self.total if self.total else 1, self.rate, eta)
+
+
+class DumpLoader:
+    """Loads the records of a data dump into the nations or regions table.
+
+    Records are given to the loader in batches with stage, and once the whole dump has been staged merge and
+    remove_missing bring the table in line with the dump. Only records whose data hash changed are written.
+
+    Every step records a checkpoint in the same transaction as its writes. If the ingest of the same dump is started
+    again after a restart the loader picks up where it left off. The whole dump should still be given to stage, and
+    records that were already staged are skipped.
+
+    This loader works on every database, and compares the records with the known rows in Python and writes the batches
+    through the ORM as they are staged. By default the name and hash of every known row is loaded up front. When bounded
+    the known rows are instead looked up batch by batch, and the rows that were seen are tracked in a bitmap of their
+    ids, so the memory used does not grow with the size of the table. The dialect specific loaders stream the records
+    into a staging table instead and merge them with a single upsert, and are always bounded.
+
+    Nations whose region is not in the regions table are written without a region, and counted as orphaned.
+
+    Attributes:
+        engine: The database engine.
+        table: The table the records are loaded into, either Region or Nation.
+        identity: The identity of the data dump, used to tell if a checkpoint belongs to it.
+        counts: The amount of inserted, updated, unchanged, removed and orphaned rows.
+        phase: How far the ingest of the dump got, either staging, merged or done.
+        resumed: The amount of records that were staged before the loader was opened.
+        bounded: If known rows are looked up batch by batch instead of all being loaded when the loader is opened.
+    """
+    engine: Engine
+    table: type[Region] | type[Nation]
+    identity: str
+    counts: Counter
+    phase: str
+    resumed: int
+    bounded: bool
+
+    def __init__(self, engine: Engine, table: type[Region] | type[Nation], identity: str, *, bounded: bool = False):
+        self.engine = engine
+        self.table = table
+        self.identity = identity
+        self.counts = Counter()
+        self.phase = "staging"
+        self.resumed = 0
+        self.bounded = bounded
+        self._staged = 0
+        self._known: dict[str, tuple[int, Optional[str]]] = {}
+        self._regions: dict[str, int] = {}
+        self._seen: set[str] = set()
+        self._max_id = 0
+        self._seen_ids = bytearray()
+
+    @property
+    def dump_type(self) -> str:
+        return self.table.__tablename__
+
+    def _load_checkpoint(self, session: Session | Connection):
+        checkpoint = session.execute(select(IngestCheckpoint.identity, IngestCheckpoint.phase,
+                                            IngestCheckpoint.records)
+                                     .where(IngestCheckpoint.dump_type == self.dump_type)).one_or_none()
+        if checkpoint is not None and checkpoint.identity == self.identity:
+            self.phase, self.resumed = checkpoint.phase, checkpoint.records
+            return
+
+        session.execute(delete(IngestCheckpoint).where(IngestCheckpoint.dump_type == self.dump_type))
+        session.execute(insert(IngestCheckpoint).values(dump_type=self.dump_type, identity=self.identity,
+                                                        phase=self.phase, records=0))
+        session.commit()
+
+    def _save_checkpoint(self, session: Session | Connection):
+        session.execute(update(IngestCheckpoint)
+                        .where(IngestCheckpoint.dump_type == self.dump_type)
+                        .values(phase=self.phase, records=self._staged))
+
+    def _skip(self, records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        # Gives back the records that still have to be staged, after the ones staged before a restart.
+        skip = len(records) if self.phase != "staging" else min(max(self.resumed - self._staged, 0), len(records))
+        self._staged += len(records)
+        return records[skip:]
+
+    def open(self):
+        """Prepares the loader, this must be called before anything is staged."""
+        with Session(self.engine) as session:
+            self._load_checkpoint(session)
+            if self.bounded:
+                # Rows inserted while loading get higher ids, and are never removed since they are in the dump.
+                self._max_id = session.scalar(select(func.max(self.table.id))) or 0
+                self._seen_ids = bytearray(self._max_id // 8 + 1)
+                return
+            self._known = {name: (id, data_hash) for name, id, data_hash in
+                           session.execute(select(self.table.name, self.table.id, self.table.data_hash))}
+            if self.table is Nation:
+                self._regions = {name: id for name, id in session.execute(select(Region.name, Region.id))}
+
+    def close(self):
+        """Releases everything held by the loader."""
+        self._known.clear()
+        self._seen.clear()
+        self._seen_ids = bytearray()
+
+    def _lookup(self, session: Session, names: list[str]) -> dict[str, tuple[int, Optional[str]]]:
+        # Gets the id and data hash of the known rows with the given names.
+        if not self.bounded:
+            return {name: self._known[name] for name in names if name in self._known}
+        known = {}
+        for chunk in _chunks(names, LOOKUP_CHUNK_SIZE):
+            known.update((name, (id, data_hash)) for name, id, data_hash in session.execute(
+                select(self.table.name, self.table.id, self.table.data_hash).where(self.table.name.in_(chunk))))
+        return known
+
+    def _region_ids(self, session: Session, names: set[str]) -> dict[str, int]:
+        if not self.bounded:
+            return self._regions
+        regions = {}
+        for chunk in _chunks(names, LOOKUP_CHUNK_SIZE):
+            regions.update((name, id) for name, id in
+                           session.execute(select(Region.name, Region.id).where(Region.name.in_(chunk))))
+        return regions
+
+    def _mark_seen(self, names: list[str], known: dict[str, tuple[int, Optional[str]]]):
+        if not self.bounded:
+            self._seen.update(names)
+            return
+        for id, _ in known.values():
+            if id <= self._max_id:
+                self._seen_ids[id >> 3] |= 1 << (id & 7)
+
+    def _missing_ids(self) -> Iterator[int]:
+        # Gets the ids of the rows that were known when the loader was opened, but were not in the dump.
+        if not self.bounded:
+            return (id for name, (id, _) in self._known.items() if name not in self._seen)
+        return (id for id in range(1, self._max_id + 1) if not self._seen_ids[id >> 3] & 1 << (id & 7))
+
+    def stage(self, records: list[dict[str, Any]]) -> int:
+        """Stages a batch of records from the data dump.
+
+        Args:
+            records: The records from the data dump.
+
+        Returns:
+            The amount of records that were staged, records that were staged before a restart are not counted.
+        """
+        now = datetime.datetime.now(datetime.UTC)
+        new_rows, changed_rows = [], []
+        with Session(self.engine) as session:
+            # Records staged before a restart are still looked up, so the rows they belong to are not removed.
+            names = [record["NAME"].casefold() for record in records]
+            known = self._lookup(session, names)
+            self._mark_seen(names, known)
+            records = self._skip(records)
+            if self.table is Nation:
+                regions = self._region_ids(session, {record["REGION"].casefold() for record in records})
+
+            for record in records:
+                name = record["NAME"].casefold()
+                data_hash = content_hash(record)
+                row = {'data': record, 'data_hash': data_hash, **record_columns(self.table, record)}
+                if self.table is Nation:
+                    # The region is part of the data, so a nation that moved always has a different hash.
+                    row['region_id'] = regions.get(record["REGION"].casefold(), None)
+                    if row['region_id'] is None:
+                        self.counts["orphaned"] += 1
+                if name not in known:
+                    new_rows.append({'name': name, **row})
+                elif known[name][1] != data_hash:
+                    changed_rows.append({'id': known[name][0], 'last_updated': now, **row})
+
+            if new_rows:
+                session.execute(insert(self.table), new_rows)
+            if changed_rows:
+                session.execute(update(self.table), changed_rows)
+            self._save_checkpoint(session)
+            session.commit()
+        self.counts["inserted"] += len(new_rows)
+        self.counts["updated"] += len(changed_rows)
+        self.counts["unchanged"] += len(records) - len(new_rows) - len(changed_rows)
+        return len(records)
+
+    def merge(self):
+        """Writes the staged records into the table."""
+        if self.phase != "staging":
+            return
+        self.phase = "merged"
+        with Session(self.engine) as session:
+            self._save_checkpoint(session)
+            session.commit()
+
+    def remove_missing(self):
+        """Removes the rows that are no longer in the data dump."""
+        if self.phase != "merged":
+            return
+        self.phase = "done"
+        with Session(self.engine) as session:
+            for ids in _chunks(self._missing_ids(), DELETE_BATCH_SIZE):
+                result = session.execute(delete(self.table)
+                                         .where(self.table.id.in_(ids))
+                                         .where(_removable(self.table)))
+                self.counts["removed"] += result.rowcount
+            self._save_checkpoint(session)
+            session.commit()
+
+
+class StagingLoader(DumpLoader):
+    """A loader that streams records into a staging table and merges them with INSERT ... ON CONFLICT.
+
+    Nothing is looked up in Python, the new, changed and missing rows are all found by the database. The staging table
+    is kept until the ingest is done, so an ingest that was interrupted does not have to stage everything again.
+    """
+    dialect: Any = None
+
+    def __init__(self, engine: Engine, table: type[Region] | type[Nation], identity: str, *, bounded: bool = False):
+        super().__init__(engine, table, identity, bounded=bounded)
+        columns = [Column("name", Text), Column("data", table.__table__.c.data.type), Column("data_hash", Text)]
+        columns += [Column(name, table.__table__.c[name].type) for name in INDEXED_COLUMNS[table]]
+        if table is Nation:
+            columns.append(Column("region_name", Text))
+        self.staging = Table("{}_staging".format(table.__tablename__), MetaData(), *columns)
+        self._connection: Optional[Connection] = None
+
+    def open(self):
+        self._connection = self.engine.connect()
+        self._load_checkpoint(self._connection)
+        if self.phase == "staging" and not self.resumed:
+            self.staging.drop(self._connection, checkfirst=True)
+        self.staging.create(self._connection, checkfirst=True)
+        self._connection.commit()
+
+    def close(self):
+        if self._connection is not None:
+            if self.phase == "done":
+                self.staging.drop(self._connection, checkfirst=True)
+                self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def _rows(self, records: list[dict[str, Any]]) -> Iterable[dict[str, Any]]:
+        for record in records:
+            row = {'name': record["NAME"].casefold(), 'data': record, 'data_hash': content_hash(record),
+                   **record_columns(self.table, record)}
+            if self.table is Nation:
+                row['region_name'] = record["REGION"].casefold()
+            yield row
+
+    def stage(self, records: list[dict[str, Any]]) -> int:
+        if records := self._skip(records):
+            self._copy(list(self._rows(records)))
+        self._save_checkpoint(self._connection)
+        self._connection.commit()
+        return len(records)
+
+    def _copy(self, rows: list[dict[str, Any]]):
+        self._connection.execute(insert(self.staging), rows)
+
+    def _source(self):
+        # A name that was staged more than once is only merged once, as the upsert can not touch a row twice.
+        staged = [column for column in self.staging.c if column.name != "region_name"]
+        rank = func.row_number().over(partition_by=self.staging.c.name).label("rank")
+        if self.table is Nation:
+            ranked = (select(*staged, Region.id.label("region_id"), rank)
+                      .outerjoin(Region, Region.name == self.staging.c.region_name)).subquery()
+        else:
+            ranked = select(*staged, rank).subquery()
+        return select(*(column for column in ranked.c if column.name != "rank")).where(ranked.c.rank == 1)
+
+    def merge(self):
+        if self.phase != "staging":
+            return
+        Index("{}_name".format(self.staging.name), self.staging.c.name).create(self._connection, checkfirst=True)
+        source = self._source().subquery()
+        inserted, updated, staged = self._connection.execute(select(
+            func.count().filter(~exists().where(self.table.name == source.c.name)),
+            func.count().filter(exists().where(self.table.name == source.c.name)
+                                .where(self.table.data_hash.is_distinct_from(source.c.data_hash))),
+            func.count()).select_from(source)).one()
+        if self.table is Nation:
+            self.counts["orphaned"] += self._connection.scalar(select(func.count()).select_from(source)
+                                                               .where(source.c.region_id.is_(None)))
+
+        upsert = self.dialect.insert(self.table).from_select(
+            [column.name for column in source.c], select(source).where(true()))
+        columns = {column.name: upsert.excluded[column.name] for column in source.c if column.name != "name"}
+        self._connection.execute(upsert.on_conflict_do_update(
+            index_elements=[self.table.name],
+            set_={**columns, 'last_updated': func.now()},
+            where=self.table.data_hash.is_distinct_from(upsert.excluded.data_hash)))
+        self.phase = "merged"
+        self._save_checkpoint(self._connection)
+        self._connection.commit()
+
+        self.counts["inserted"] += inserted
+        self.counts["updated"] += updated
+        self.counts["unchanged"] += staged - inserted - updated
+
+    def remove_missing(self):
+        if self.phase != "merged":
+            return
+        result = self._connection.execute(delete(self.table)
+                                          .where(~exists().where(self.staging.c.name == self.table.name))
+                                          .where(_removable(self.table)))
+        self.phase = "done"
+        self._save_checkpoint(self._connection)
+        self._connection.commit()
+        self.counts["removed"] += result.rowcount
+
+
+class SQLiteLoader(StagingLoader):
+    """The staging loader for SQLite, which stages records with executemany."""
+    dialect = sqlite
+
+
+class PostgresLoader(StagingLoader):
+    """The staging loader for PostgreSQL, which stages records with COPY."""
+    dialect = postgresql
+
+    def _copy(self, rows: list[dict[str, Any]]):
+        columns = ", ".join(column.name for column in self.staging.c)
+        cursor = self._connection.connection.cursor()
+        try:
+            with cursor.copy("COPY {} ({}) FROM STDIN".format(self.staging.name, columns)) as copy:
+                for row in rows:
+                    copy.write_row([types.encode(value) if key == "data" else value for key, value in row.items()])
+        finally:
+            cursor.close()
+
+
+def make_loader(engine: Engine, table: type[Region] | type[Nation], identity: str, *,
+                bounded: bool = False) -> DumpLoader:
+    """Makes the fastest loader for the engine's dialect.
+
+    Args:
+        engine: The database engine.
+        table: The table the records are loaded into, either Region or Nation.
+        identity: The identity of the data dump being loaded.
+        bounded: If the memory used by the loader must not grow with the size of the table.
+    """
+    match engine.dialect.name:
+        case "sqlite":
+            return SQLiteLoader(engine, table, identity, bounded=bounded)
+        case "postgresql":
+            return PostgresLoader(engine, table, identity, bounded=bounded)
+        case _:
+            return DumpLoader(engine, table, identity, bounded=bounded)
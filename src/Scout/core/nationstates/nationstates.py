@@ -5,33 +5,42 @@ import asyncio
 import datetime
 import logging
 import json
-from collections import OrderedDict
-from typing import Any, Optional
+import os
+from typing import Optional
 
 import discord
-import sqlalchemy.sql.functions
 from discord.ext import commands, tasks
 from discord.ext.commands import Context
-from sqlalchemy import select, insert, update
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 
 import Scout.nsapi.ns as ns
-from Scout.core.nationstates import __VERSION__
-from Scout.database.models import Region, Nation
+from Scout.nsapi import dumps
+from Scout.nsapi.archive import DumpArchive
+from Scout.core.nationstates import __VERSION__, ingest
+from Scout.nsapi.cache import canonicalize
+from Scout.nsapi.exceptions import NotFound
+from Scout.nsapi.scheduler import Priority
+from Scout.database.models import Region, Nation, IngestCheckpoint
 
 utc = datetime.timezone.utc
 time = datetime.time(hour=6, minute=00, tzinfo=utc)
 
 logger = logging.getLogger("discord.cogs.core.nationstates")
 
+CHANGES_SHOWN = 10
+
 class NationStates(commands.Cog):
     """A cog that provides various NationStates related functionality.
 
     Attributes:
         ns_client: The ns_client used for ns-api queries.
+        ingest_progress: How far along the current ingest of the data dumps is.
+        dump_archive: The archive of daily nation snapshots, if archiving is turned on.
     """
     user_agent: Optional[str]
     ns_client: ns.NationStates_Client
+    ingest_progress: ingest.IngestProgress
+    dump_archive: Optional[DumpArchive]
     is_processing = False
 
     def __init__(self, bot, ns_client):
@@ -44,6 +53,11 @@ class NationStates(commands.Cog):
         self.update_nations.start()
         self.update_nations_on_start.start()
         self.ns_client = ns_client
+        self.ingest_progress = ingest.IngestProgress()
+        self.dump_archive = None
+        if archive_days := self.scout.config.get("DUMP_ARCHIVE_DAYS", 0):
+            self.dump_archive = DumpArchive(os.path.join(self.scout.config.get("DUMP_DIRECTORY", None) or ".",
+                                                         "archive"), archive_days)
 
     @tasks.loop(count=1)
     async def update_nations_on_start(self):
@@ -73,66 +87,186 @@ class NationStates(commands.Cog):
             await self.process_data_dump()
             logger.info("Nightly update completed!")
 
+    @staticmethod
+    def download_progress_logger(dump_type: str):
+        """Creates a progress callback that logs the download progress of a data dump every 10%.
+
+        Args:
+            dump_type: The dump being downloaded, used in the log message.
+        """
+        last_logged = 0
+
+        def log_progress(downloaded: int, total: Optional[int]):
+            nonlocal last_logged
+            if not total:
+                return
+            percent = downloaded * 100 // total
+            if percent >= last_logged + 10:
+                last_logged = percent - percent % 10
+                logger.debug("Downloaded %d%% of the %s dump (%d/%d bytes)", percent, dump_type, downloaded, total)
+
+        return log_progress
+
     async def process_data_dump(self):
         """Handle the automatic update of nations.
         """
         self.is_processing = True
+        try:
+            await self._process_data_dump()
+        finally:
+            # A failed update must not stop the next one from running.
+            self.is_processing = False
+
+    async def _process_data_dump(self):
         logger.debug("Downloading Data Dumps")
         async with asyncio.TaskGroup() as tg:
-            tg.create_task(self.ns_client.get_daily_dump("regions", user_agent=self.user_agent))
-            tg.create_task(self.ns_client.get_daily_dump("nations", user_agent=self.user_agent))
+            regions_changed = tg.create_task(self.ns_client.get_daily_dump(
+                "regions", user_agent=self.user_agent, progress=self.download_progress_logger("regions")))
+            nations_changed = tg.create_task(self.ns_client.get_daily_dump(
+                "nations", user_agent=self.user_agent, progress=self.download_progress_logger("nations")))
         logger.debug("Data Dumps Downloaded!")
 
-        dd = ns.NationStates_DataDump_Client()
-
-        def add_regions(regions: OrderedDict[str, Any]):
-            regions = regions["REGIONS"]["REGION"]
-            with Session(self.scout.engine) as session:
-                known_regions = {region.name: region.id for region in session.scalars(select(Region))}
-                new_regions = ({'name': r["NAME"].casefold(), 'data': r} for r in regions if
-                               r["NAME"].casefold() not in list(known_regions.keys()))
-                old_regions = [{'id': known_regions[r["NAME"].casefold()], 'data': r,
-                                'last_updated': datetime.datetime.now(datetime.UTC)}
-                               for r in regions if r["NAME"].casefold() in list(known_regions.keys())]
-                logger.debug("Adding regions")
-                session.execute(insert(Region), new_regions)
-                logger.debug("Updating regions")
-                session.execute(update(Region), old_regions)
-                session.commit()
-
-        def add_nations(nations: OrderedDict[str, Any]):
-            nations = nations["NATIONS"]["NATION"]
-            with Session(self.scout.engine) as session:
-                regions = {region.name: region.id for region in session.scalars(select(Region)).all()}
-                known_nations = {nation.name: nation.id for nation in session.scalars(select(Nation)).all()}
-                new_nations = ({'name': n["NAME"].casefold(), 'data': n,
-                                'region_id': regions[n.data["REGION"].casefold()]}
-                               for n in nations if n["NAME"].casefold() not in list(known_nations.keys()))
-                old_nations = [{'id': known_nations[n["NAME"].casefold()], 'data': n,
-                                'region_id': regions[n.data["REGION"].casefold()],
-                                'last_updated': datetime.datetime.now(datetime.UTC)}
-                               for n in nations if n["NAME"].casefold() in list(known_nations.keys())]
-                logger.debug("Adding nations")
-                session.execute(insert(Nation), new_nations)
-                logger.debug("Updating nations")
-                session.execute(update(Nation), old_nations)
-                session.commit()
-
-        logger.debug("Parsing Data Dumps...")
-        async with asyncio.TaskGroup() as tg:
-            regions = tg.create_task(dd.get_all_regions())
-            nations = tg.create_task(dd.get_all_nations())
-        logger.debug("Data Dumps Parsed...")
-        regions = regions.result()
-        nations = nations.result()
-
-        logger.debug("Adding data to database")
-        await asyncio.to_thread(add_regions,regions)
-        await asyncio.to_thread(add_nations,nations)
+        dd = ns.NationStates_DataDump_Client(self.scout.config.get("DUMP_DIRECTORY", None),
+                                             processes=self.scout.config.get("DUMP_PROCESSES", 1))
+        # The memory budget is shared between the batches parsed ahead and the loader working on the current one.
+        memory_budget = self.scout.config.get("DUMP_MEMORY_BUDGET", 0) * 1024 * 1024
+        if memory_budget:
+            dd.batch_bytes = memory_budget // (dd.batches_in_flight + ingest.LOADER_BATCHES)
+        dumps_changed = regions_changed.result() or nations_changed.result()
+        if (dumps_changed or not await asyncio.to_thread(dd.nation_index.is_current)
+                or not await asyncio.to_thread(dd.region_index.is_current)):
+            logger.debug("Indexing Data Dumps")
+            await dd.build_indexes()
+            logger.debug("Data Dumps Indexed!")
+
+        manifest = self.ns_client.dump_manifest
+        if not dumps_changed and manifest.is_ingested("regions") and manifest.is_ingested("nations"):
+            logger.info("Data Dumps have not changed since they were last processed, skipping.")
+            return
+
+        regions = ingest.make_loader(self.scout.engine, Region, dumps.dump_identity(dd.region_index.dump_file),
+                                     bounded=bool(memory_budget))
+        nations = ingest.make_loader(self.scout.engine, Nation, dumps.dump_identity(dd.nation_index.dump_file),
+                                     bounded=bool(memory_budget))
+        snapshot = None
+        if self.dump_archive is not None:
+            # The snapshot is taken from the same batches as the ingest, so the dump is only parsed once.
+            snapshot_date = datetime.datetime.fromtimestamp(
+                await asyncio.to_thread(os.path.getmtime, dd.nation_dump_file), datetime.UTC).date()
+            if not await asyncio.to_thread(self.dump_archive.has, snapshot_date):
+                snapshot = self.dump_archive.writer(snapshot_date)
+        verified_before = await asyncio.to_thread(ingest.verified_nations, self.scout.engine)
+        try:
+            for kind, loader, index, records, writer in (
+                    ("regions", regions, dd.region_index, dd.iter_regions, None),
+                    ("nations", nations, dd.nation_index, dd.iter_nations, snapshot)):
+                await asyncio.to_thread(loader.open)
+                if loader.phase == "done":
+                    logger.info("The {} Data Dump has already been ingested".format(kind))
+                elif loader.resumed:
+                    logger.info("Resuming the ingest of {} after {} records".format(kind, loader.resumed))
+                self.ingest_progress.start("Staging {}".format(kind), await asyncio.to_thread(index.count),
+                                           loader.resumed)
+                async for batch in records():
+                    if writer is not None:
+                        await asyncio.to_thread(writer.add, batch)
+                    if self.ingest_progress.advance(await asyncio.to_thread(loader.stage, batch)):
+                        logger.info(str(self.ingest_progress))
+                self.ingest_progress.start("Merging {}".format(kind))
+                await asyncio.to_thread(loader.merge)
+
+            # Nations go first, so regions that every nation moved out of can be removed in the same run.
+            logger.debug("Removing nations and regions no longer in the Data Dumps")
+            self.ingest_progress.start("Removing missing nations and regions")
+            await asyncio.to_thread(nations.remove_missing)
+            await asyncio.to_thread(regions.remove_missing)
+        finally:
+            self.ingest_progress.start("idle")
+            await asyncio.to_thread(nations.close)
+            await asyncio.to_thread(regions.close)
         logger.debug("Data added to database")
+        for kind, loader in (("Regions", regions), ("Nations", nations)):
+            logger.info("{}: {} inserted, {} updated, {} unchanged, {} removed".format(
+                kind, loader.counts["inserted"], loader.counts["updated"], loader.counts["unchanged"],
+                loader.counts["removed"]))
+        if nations.counts["orphaned"]:
+            logger.warning("{} nations are in a region that is not in the region Data Dump".format(
+                nations.counts["orphaned"]))
+
+        moves = await self.find_region_moves(dd, verified_before, tracked=not nations.resumed)
+
+        if snapshot is not None:
+            await asyncio.to_thread(snapshot.finish)
+            removed = await asyncio.to_thread(self.dump_archive.prune)
+            logger.info("Archived the nation Data Dump of {}, removed {} old snapshots".format(snapshot.date, removed))
+
+        manifest.mark_ingested("regions")
+        manifest.mark_ingested("nations")
+        await self.ns_client.save_dump_manifest()
+        self.scout.dispatch("nation_moves", moves)
+
+    async def find_region_moves(self, dd: ns.NationStates_DataDump_Client,
+                                verified_before: dict[int, tuple[str, Optional[int]]], *, tracked: bool
+                                ) -> Optional[dict[int, tuple[Optional[int], Optional[int]]]]:
+        """Finds the verified nations that moved region or ceased to exist during the ingest.
+
+        Verified nations that are no longer in the nation dump are taken out of their region.
+
+        Args:
+            dd: The data dump client the ingest used.
+            verified_before: The verified nations before the ingest, from ingest.verified_nations.
+            tracked: If the whole ingest happened after verified_before was taken. An ingest resumed after a restart
+                may have moved nations before it.
+
+        Returns:
+            The region id each nation was in and is in now, keyed by the nation's id, see ingest.region_moves. None if
+            the moves could not be tracked and every verified user should be checked instead.
+        """
+        verified_after = await asyncio.to_thread(ingest.verified_nations, self.scout.engine)
+
+        def ceased() -> list[int]:
+            if not dd.nation_index.is_current():
+                return []
+            return [id for id, (name, region_id) in verified_after.items()
+                    if region_id is not None and not dd.nation_index.contains(name)]
 
-        self.is_processing = False
+        if ceased_ids := await asyncio.to_thread(ceased):
+            ceased_ids = await self.confirm_ceased({id: verified_after[id][0] for id in ceased_ids})
+        if ceased_ids:
+            await asyncio.to_thread(ingest.detach_nations, self.scout.engine, ceased_ids)
+            for id in ceased_ids:
+                verified_after[id] = (verified_after[id][0], None)
 
+        if not tracked:
+            logger.info("The ingest was resumed, so every verified user's roles will be checked")
+            return None
+        moves = ingest.region_moves(verified_before, verified_after)
+        ceased_count = sum(1 for _, region_id in moves.values() if region_id is None)
+        logger.info("{} verified nations moved region, {} no longer exist".format(len(moves) - ceased_count,
+                                                                                  ceased_count))
+        return moves
+
+    async def confirm_ceased(self, nations: dict[int, str]) -> list[int]:
+        """Checks with the API which of the nations missing from the nation dump no longer exist.
+
+        A nation founded after the dump was made is not in it yet, so only the nations the API can not find are taken
+        to have ceased. Nations that could not be checked are left as they are until the next ingest.
+
+        Args:
+            nations: The names of the nations, keyed by their id.
+
+        Returns:
+            The ids of the nations that no longer exist.
+        """
+        ids = {name: id for id, name in nations.items()}
+        ceased = []
+        async for name, result in self.ns_client.get_nations(ids, shards=["name"], user_agent=self.user_agent,
+                                                             priority=Priority.BACKGROUND):
+            if isinstance(result, NotFound):
+                ceased.append(ids[name])
+            elif isinstance(result, Exception):
+                logger.warning("Could not check if {} still exists: {}".format(name, result))
+        return ceased
 
     async def cog_load(self):
         """The function that the bot runs when the Cog is loaded.
@@ -148,15 +282,83 @@ class NationStates(commands.Cog):
         self.update_nations.stop()
         self.update_nations_on_start.stop()
 
+    @commands.hybrid_command()  # type: ignore
+    @commands.is_owner()
+    async def nsapi_status(self, ctx: Context):
+        """An owner-command to show the state of the NationStates API rate limit and request queue.
+
+        Parameters:
+            ctx: The context of the command.
+        """
+        scheduler = self.ns_client.scheduler
+        limiter = self.ns_client.limiter.stats()
+        lines = ["Budget: {} of {} requests per {}s".format(limiter["budget"], self.ns_client.limiter.max_rate,
+                                                             self.ns_client.limiter.time_period),
+                 "Waits: {} ({:.1f}s average), 429s: {}".format(limiter["waits"], limiter["average_wait"],
+                                                                 limiter["rate_limited"])]
+        for priority in Priority:
+            lines.append("{}: {} queued, ~{:.1f}s wait".format(priority.name.title(), scheduler.queue_depth(priority),
+                                                               scheduler.estimated_wait(priority)))
+        await ctx.send("\n".join(lines))
+
+    @commands.hybrid_command()  # type: ignore
+    @commands.is_owner()
+    async def ingest_status(self, ctx: Context):
+        """An owner-command to show how far along the ingest of the data dumps is.
+
+        Parameters:
+            ctx: The context of the command.
+        """
+        lines = [str(self.ingest_progress)]
+        async with self.scout.async_session() as session:
+            for checkpoint in await session.scalars(select(IngestCheckpoint).order_by(IngestCheckpoint.dump_type)):
+                lines.append("{}: {}, {} records staged, last updated {}".format(
+                    checkpoint.dump_type.title(), checkpoint.phase, checkpoint.records, checkpoint.last_updated))
+        await ctx.send("\n".join(lines))
+
+    @commands.hybrid_command()  # type: ignore
+    async def dump_changes(self, ctx: Context, days: int, region: Optional[str] = None):
+        """Shows what changed in the nation data dumps over the last few days.
+
+        Parameters:
+            ctx: The context of the command.
+            days: How many days to look back.
+            region: If given, only the nations that moved into or out of this region are shown.
+        """
+        if self.dump_archive is None:
+            await ctx.send("The Data Dumps are not being archived.")
+            return
+        changes = await asyncio.to_thread(self.dump_archive.changes_since, days)
+        if changes is None:
+            await ctx.send("There are no archived Data Dumps from {} days ago.".format(days))
+            return
+
+        lines = ["Changes from {} to {}:".format(changes.old.date, changes.new.date)]
+        if region is None:
+            lines.append("{} new nations, {} nations ceased to exist, {} nations moved regions".format(
+                len(changes.added), len(changes.removed), len(changes.moved)))
+        else:
+            arrived, left = changes.region(region)
+            for label, names in (("Arrived", arrived), ("Left", left)):
+                shown = ", ".join(name.decode() for name in names[:CHANGES_SHOWN])
+                more = " and {} more".format(len(names) - CHANGES_SHOWN) if len(names) > CHANGES_SHOWN else ""
+                lines.append("{} ({}): {}{}".format(label, len(names), shown or "none", more))
+        await ctx.send("\n".join(lines))
+
     @commands.hybrid_command()  # type: ignore
     @commands.is_owner()
     async def dump(self, ctx: Context, nation_name: str):
         if self.is_processing:
             await ctx.send("Currently processing the data dumps...please wait")
             return
-        with Session(self.scout.engine) as session:
-            nation_data = session.scalar(select(Nation).where(Nation.name == nation_name.casefold()))
-            await ctx.send("```json\n{}```".format(json.dumps(nation_data.data)))
+        async with self.scout.async_session() as session:
+            # The data is deferred, so it is selected on its own instead of being lazy loaded.
+            nation_data = await session.scalar(select(Nation.data)
+                                               .where(Nation.canonical_name == canonicalize(nation_name)))
+        if nation_data is None:
+            await ctx.send("I couldn't find that nation...")
+            return
+        await ctx.send("```json\n{}```".format(json.dumps(nation_data)))
 
 
 async def setup(bot):
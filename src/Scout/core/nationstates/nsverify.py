@@ -8,17 +8,23 @@ from typing import Optional, Any
 
 import discord
 from discord.ext import commands, tasks
-from sqlalchemy import select
+from sqlalchemy import select, exists
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import Scout.exceptions
 from Scout.database import db, models
 import Scout.nsapi.ns as ns
-from Scout.core.nationstates import __VERSION__
-from Scout.database.models import Region, User, Nation, user_nation
+from Scout.core.nationstates import __VERSION__, ingest, roles
+from Scout.core.nationstates.role_jobs import RoleJobQueue
+from Scout.core.nationstates.roles import VERIFIED, RESIDENT
+from Scout.nsapi.scheduler import Priority
+from Scout.database.models import Region, User, Nation, user_nation, guild_region
+from Scout.nsapi.cache import canonicalize
 
-VERIFIED = "NSVerify:user-verified"
-RESIDENT = "NSVerify:user-resident"
+QUEUE_NOTICE_THRESHOLD = 3
+MEMBER_FETCH_CONCURRENCY = 4
+ROLE_EDIT_REASON = "NSVerify: verified nation roles"
 
 utc = datetime.timezone.utc
 time = datetime.time(hour=8, minute=00, tzinfo=utc)
@@ -31,8 +37,10 @@ class NSVerify(commands.Cog):
     Attributes:
         ns_client: The ns_client used for ns-api queries.
         users_verifying: The users currently attempting to verify themselves.
+        role_jobs: The queue of role changes to make.
     """
     ns_client: ns.NationStates_Client
+    role_jobs: RoleJobQueue
     user_agent: Optional[str]
     users_verifying: dict[Any, Any] = {}
 
@@ -45,6 +53,8 @@ class NSVerify(commands.Cog):
         self.scout = bot
         self.scout.register_association(VERIFIED)
         self.scout.register_association(RESIDENT)
+        self.role_jobs = RoleJobQueue(self.scout.async_engine, self.apply_role_job,
+                                      workers=self.scout.config.get("ROLE_JOB_WORKERS", 4))
         self.update_nations.start()
         self.ns_client = ns_client
 
@@ -53,10 +63,158 @@ class NSVerify(commands.Cog):
     async def update_nations(self):
         """Handle the automatic update of nations.
         """
-        with Session(self.scout.engine) as session:
-            for user in self.scout.get_all_members():
-                if session.scalar(select(User).where(User.snowflake == user.id).join(user_nation)) is not None:
-                    await self.give_verified_roles(user, None, session=session)
+        await self.update_all_roles()
+
+    async def update_all_roles(self):
+        """Updates the roles of every member the bot can see.
+
+        Everything needed is loaded in a few bulk queries, and only the members whose roles are not what they should
+        be are changed.
+        """
+        reconciler = roles.RoleReconciler(self.scout.role_index)
+        async with self.scout.async_session() as session:
+            await session.run_sync(reconciler.load)
+        changes = reconciler.plan((guild.id, ((member.id, {role.id for role in member.roles})
+                                              for member in guild.members))
+                                  for guild in self.scout.guilds)
+        logger.info("Queued role changes for {} members".format(await self.role_jobs.enqueue(changes)))
+
+    @staticmethod
+    async def edit_roles(member: discord.Member, add: set[int], remove: set[int]) -> bool:
+        """Adds and removes the roles of a member with a single edit, if their roles would change at all.
+
+        Parameters:
+            member: The discord member.
+            add: The snowflakes of the roles to add.
+            remove: The snowflakes of the roles to remove.
+
+        Returns:
+            If the member was edited, False means their roles were already right and no call was made.
+        """
+        current = {role.id for role in member.roles if not role.is_default()}
+        desired = (current - remove) | add
+        if desired == current:
+            return False
+        await member.edit(roles=[discord.Object(role) for role in desired], reason=ROLE_EDIT_REASON)
+        return True
+
+    async def apply_role_job(self, guild_snowflake: int, member_snowflake: int, add: set[int], remove: set[int]
+                             ) -> bool:
+        """Applies a queued role change, this is what the role job queue calls.
+
+        Parameters:
+            guild_snowflake: The snowflake of the guild.
+            member_snowflake: The snowflake of the member.
+            add: The snowflakes of the roles to add.
+            remove: The snowflakes of the roles to remove.
+
+        Returns:
+            If a request was made, the change is dropped without one if the bot is no longer in the guild.
+
+        Raises:
+            discord.HTTPException: Fetching or editing the member failed.
+        """
+        guild = self.scout.get_guild(guild_snowflake)
+        if guild is None:
+            return False
+        member = guild.get_member(member_snowflake) or await guild.fetch_member(member_snowflake)
+        return await self.edit_roles(member, add, remove)
+
+    async def queue_guild_roles(self, guild: discord.Guild) -> int:
+        """Queues role changes for every member of a guild whose roles are not what they should be.
+
+        Parameters:
+            guild: The discord guild.
+
+        Returns:
+            The amount of members that changes were queued for.
+        """
+        reconciler = roles.RoleReconciler(self.scout.role_index)
+        async with self.scout.async_session() as session:
+            await session.run_sync(reconciler.load)
+        return await self.role_jobs.enqueue(reconciler.diff(guild.id, ((member.id, {role.id for role in member.roles})
+                                                                       for member in guild.members)))
+
+    @staticmethod
+    def moved_members(session: Session, moves: dict[int, tuple[Optional[int], Optional[int]]]
+                      ) -> set[tuple[int, int]]:
+        """Finds the members whose roles may have changed because their nations moved.
+
+        Parameters:
+            session: The database session to use.
+            moves: The region id each nation was in and is in now, keyed by the nation's id.
+
+        Returns:
+            The snowflakes of the guild and user of each member, for the owners of the nations in the guilds linked
+            to the region the nation was in or the region it is in now.
+        """
+        if not moves:
+            return set()
+        owners: dict[int, set[int]] = {}
+        for nation_id, snowflake in session.execute(select(user_nation.c.nation_id, User.snowflake)
+                                                    .join(User, User.id == user_nation.c.user_id)
+                                                    .where(user_nation.c.nation_id.in_(moves.keys()))):
+            owners.setdefault(nation_id, set()).add(snowflake)
+
+        region_ids = {region_id for regions in moves.values() for region_id in regions if region_id is not None}
+        guilds: dict[int, set[int]] = {}
+        for region_id, snowflake in session.execute(select(guild_region.c.region_id, models.Guild.snowflake)
+                                                    .join(models.Guild, models.Guild.id == guild_region.c.guild_id)
+                                                    .where(guild_region.c.region_id.in_(region_ids))):
+            guilds.setdefault(region_id, set()).add(snowflake)
+
+        return {(guild, user)
+                for nation_id, regions in moves.items()
+                for region_id in regions if region_id is not None
+                for guild in guilds.get(region_id, ())
+                for user in owners.get(nation_id, ())}
+
+    @commands.Cog.listener('on_nation_moves')
+    async def update_moved_roles(self, moves: Optional[dict[int, tuple[Optional[int], Optional[int]]]]):
+        """Updates the roles of the members whose verified nations moved region or ceased to exist.
+
+        This is dispatched after every ingest of the data dumps, so only the members that may be affected are checked
+        instead of every member the bot can see. Members that are not in the member cache are fetched over REST, unless
+        the cache of their guild is complete, with at most MEMBER_FETCH_CONCURRENCY requests made at once.
+
+        Parameters:
+            moves: The region id each nation was in and is in now, keyed by the nation's id. If None, every verified
+                member is checked.
+        """
+        if moves is None:
+            await self.update_all_roles()
+            return
+
+        reconciler = roles.RoleReconciler(self.scout.role_index)
+        async with self.scout.async_session() as session:
+            members = await session.run_sync(self.moved_members, moves)
+            await session.run_sync(reconciler.load, users={user for _, user in members})
+
+        semaphore = asyncio.Semaphore(MEMBER_FETCH_CONCURRENCY)
+
+        async def fetch(guild: discord.Guild, user_snowflake: int) -> Optional[discord.Member]:
+            async with semaphore:
+                try:
+                    return await guild.fetch_member(user_snowflake)
+                except discord.HTTPException:
+                    return None
+
+        found, cold = [], []
+        for guild_snowflake, user_snowflake in members:
+            if (guild := self.scout.get_guild(guild_snowflake)) is None:
+                continue
+            if (member := guild.get_member(user_snowflake)) is not None:
+                found.append((guild, member))
+            elif not guild.chunked:
+                cold.append((guild, user_snowflake))
+        fetched = await asyncio.gather(*(fetch(guild, user_snowflake) for guild, user_snowflake in cold))
+        found += [(guild, member) for (guild, _), member in zip(cold, fetched) if member is not None]
+
+        changes = []
+        for guild, member in found:
+            changes += reconciler.diff(guild.id, [(member.id, {role.id for role in member.roles})])
+        logger.info("Queued role changes for {} of {} members after {} nations moved".format(
+            await self.role_jobs.enqueue(changes), len(members), len(moves)))
 
     async def cog_load(self):
         """The function that the bot runs when the Cog is loaded.
@@ -65,13 +223,15 @@ class NSVerify(commands.Cog):
                                           self.scout.config["NATION"],
                                           self.scout.config["REGION"])
         self.user_agent = "NSVerify-Cog/{} {}".format(__VERSION__, user_agent)
+        await self.role_jobs.start()
 
     async def cog_unload(self) -> None:
         """Things to do when the cog is unloaded/at bot shutdown.
         """
         self.update_nations.stop()
+        self.role_jobs.stop()
 
-    def _link_roles(self, verified_role: Optional[discord.Role], resident_role: Optional[discord.Role],
+    async def _link_roles(self, verified_role: Optional[discord.Role], resident_role: Optional[discord.Role],
                     guild: discord.Guild, overwrite: Optional[bool] = False) -> str:
         """Links the discord roles to the actual association for a server.
 
@@ -93,54 +253,27 @@ class NSVerify(commands.Cog):
         if verified_role is None and resident_role is None:
             raise Scout.exceptions.NoRoles()
 
-        with Session(self.scout.engine) as session:
-            guild = session.scalar(select(models.Guild).where(models.Guild.snowflake == guild.id))
-            # noinspection DuplicatedCode
-            if resident_role is not None:
-                association = session.scalar(select(models.Association)
-                                             .where(models.Association.id == self.scout.associations[RESIDENT]))
-
-                role = models.Role(snowflake=resident_role.id, guild_id=guild.id)
-
-                associated_role = session.scalar(select(models.Role)
-                                                 .join(models.role_associations)
-                                                 .join(models.Association)
-                                                 .where(models.Association.id == self.scout.associations[RESIDENT])
-                                                 .where(models.Role.guild_id == guild.id))
-
-                if associated_role is not None and not overwrite:
-                    raise Scout.exceptions.RoleOverwrite()
-                elif associated_role is not None and overwrite:
-                    role.associations.add(association)
-                    session.delete(associated_role)
-                    session.add(role)
-                else:
-                    role.associations.add(association)
-                    session.add(role)
-            # noinspection DuplicatedCode
-            if verified_role is not None:
-                association = session.scalar(select(models.Association)
-                                             .where(models.Association.id == self.scout.associations[VERIFIED]))
-
-                role = models.Role(snowflake=verified_role.id, guild_id=guild.id)
-
-                associated_role = session.scalar(select(models.Role)
-                                                 .join(models.role_associations)
-                                                 .join(models.Association)
-                                                 .where(models.Association.id == self.scout.associations[VERIFIED])
-                                                 .where(models.Role.guild_id == guild.id))
-
-                if associated_role is not None and not overwrite:
-                    raise Scout.exceptions.RoleOverwrite()
-                elif associated_role is not None and overwrite:
-                    role.associations.add(association)
-                    session.delete(associated_role)
-                    session.add(role)
-                else:
-                    role.associations.add(association)
-                    session.add(role)
-
-            session.commit()
+        index = self.scout.role_index
+        linked = [(association, role) for association, role in ((RESIDENT, resident_role), (VERIFIED, verified_role))
+                  if role is not None]
+        if not overwrite and any(index.get(guild.id, association) is not None for association, _ in linked):
+            raise Scout.exceptions.RoleOverwrite()
+
+        async with self.scout.async_session() as session:
+            guild_db = await session.scalar(select(models.Guild).where(models.Guild.snowflake == guild.id))
+            for association, discord_role in linked:
+                associated_role = index.get(guild.id, association)
+                if associated_role is not None:
+                    await db.remove_role_async(associated_role, snowflake_only=True, session=session)
+
+                role = models.Role(snowflake=discord_role.id, guild_id=guild_db.id, associations=set())
+                role.associations.add(await session.get(models.Association, self.scout.associations[association]))
+                session.add(role)
+            await session.commit()
+
+        for association, discord_role in linked:
+            index.set(guild.id, association, discord_role.id)
+
         if verified_role is not None and resident_role is not None:
             return ("A Natural 20, a critical success! I've obtained the mythical +1 roles of {} and {}!"
                     ).format(verified_role.name, resident_role.name)
@@ -166,25 +299,20 @@ class NSVerify(commands.Cog):
             verified_role: The discord role to use as the verified with the bot role.
             resident_role: The discord role to use as the resident bot role.
         """
-        with Session(self.scout.engine) as session:
-            region = session.scalar(select(Region).where(Region.name == region_name.casefold()))
-            new_guild = session.scalar(select(models.Guild).where(models.Guild.snowflake == ctx.guild.id))
+        async with self.scout.async_session() as session:
+            region = await session.scalar(select(Region).where(Region.canonical_name == canonicalize(region_name)))
+            new_guild = await session.scalar(select(models.Guild).where(models.Guild.snowflake == ctx.guild.id))
             if new_guild is None:
-                new_guild = models.Guild(snowflake=ctx.guild.id)
+                new_guild = models.Guild(snowflake=ctx.guild.id, regions=set())
                 session.add(new_guild)
-            if region not in new_guild.regions:
+            if region not in await new_guild.awaitable_attrs.regions:
                 new_guild.regions.add(region)
-            session.commit()  # flush?
+            await session.commit()  # flush?
 
             try:
-                self._link_roles(verified_role, resident_role, ctx.guild)
+                await self._link_roles(verified_role, resident_role, ctx.guild)
                 await ctx.send("The region has been registered to this server along with the roles!")
-
-                users = session.scalars(select(User.snowflake)).all()
-                if users:
-                    members = await ctx.guild.query_members(user_ids=users)
-                    for member in members:
-                        await self.give_verified_roles(member, ctx.guild, session=session)
+                await self.queue_guild_roles(ctx.guild)
 
             except Scout.exceptions.NoRoles:
                 await ctx.send("I've added that world to my maps!")
@@ -209,14 +337,14 @@ class NSVerify(commands.Cog):
             ctx: The message context
             region_name: The name of the region to unlink from the server.
         """
-        with Session(self.scout.engine) as session:
-            region = db.get_region(region_name.casefold(), session=session)
-            guild = db.get_guild(ctx.guild.id, session=session)
+        async with self.scout.async_session() as session:
+            region = await db.get_region_async(region_name.casefold(), session=session)
+            guild = await db.get_guild_async(ctx.guild.id, session=session)
 
             if region is not None and guild is not None:
-                if region in guild.regions:
+                if region in await guild.awaitable_attrs.regions:
                     guild.regions.remove(region)
-                    session.commit()
+                    await session.commit()
                     return await ctx.send("I've removed this region from my maps!")
                 return await ctx.send("I couldn't find that region...")
             await ctx.send("I couldn't find that region or guild...")
@@ -244,6 +372,17 @@ class NSVerify(commands.Cog):
                 "Oh, you didn't want to verify? That's fine. If you change your mind just `/verify_nation` again!"))
             del self.users_verifying[ctx.message.author.name]
 
+    async def queue_notice(self, ctx):
+        """Lets the user know if verification is going to take a while because of the NationStates rate limit.
+
+        Parameters:
+            ctx: The message context to respond to.
+        """
+        wait = self.ns_client.scheduler.estimated_wait(Priority.INTERACTIVE)
+        if wait >= QUEUE_NOTICE_THRESHOLD:
+            await ctx.send("There's a bit of a line at the Scout's table, this might take about {} seconds..."
+                           .format(round(wait)), ephemeral=True)
+
     @commands.hybrid_command()  # type: ignore
     @commands.guild_only()
     async def verify_nation(self, ctx, code: Optional[str], nation: str):
@@ -254,11 +393,12 @@ class NSVerify(commands.Cog):
             code: If you know what you are doing you can provide the NS Verification Code to directly verify with one command.
             nation: The name of the nation you are verifying with.
         """
-        with Session(self.scout.engine) as session:
-            if db.get_nation(nation, session=session):
+        async with self.scout.async_session() as session:
+            if await db.get_nation_async(nation, session=session):
                 await ctx.send("That nation has a character sheet already, silly!", ephemeral=True)
                 return
 
+        await self.queue_notice(ctx)
         if code is None:
             await self.verify_dm_flow(ctx, nation)
         else:
@@ -276,7 +416,7 @@ class NSVerify(commands.Cog):
                              ).format(code, ns_nation.name),
                             ephemeral=True)
 
-                with Session(self.scout.engine) as session:
+                async with self.scout.async_session() as session:
                     await self.register_nation(ns_nation, ctx.message, session=session)
                     await message.edit(content="There we go! I'll give you roles now...")
 
@@ -306,7 +446,7 @@ class NSVerify(commands.Cog):
             await _message.edit(content=res)
 
             async with message.channel.typing():
-                with Session(self.scout.engine) as session:
+                async with self.scout.async_session() as session:
                     res = await self.register_nation(nation, message, session=session)
             await _message.edit(content=res)
 
@@ -333,11 +473,11 @@ class NSVerify(commands.Cog):
             ctx: The message context
             nation_name: The name of the nation to remove.
         """
-        with Session(self.scout.engine) as session:
-            user = db.get_user(ctx.author.id, session=session)
-            nation = db.get_nation(nation_name, session=session)
+        async with self.scout.async_session() as session:
+            user = await db.get_user_async(ctx.author.id, session=session)
+            nation = await db.get_nation_async(nation_name, session=session)
 
-            if nation is None or user is None or nation not in user.nations:
+            if nation is None or user is None or nation not in await user.awaitable_attrs.nations:
                 return
 
             try:
@@ -346,7 +486,7 @@ class NSVerify(commands.Cog):
                 pass
             await self.give_verified_roles(ctx.author, session=session)
 
-            session.commit()
+            await session.commit()
         await ctx.send("I've removed your character sheet from my campaign notes.")
 
     @commands.hybrid_command()  # type: ignore
@@ -364,14 +504,9 @@ class NSVerify(commands.Cog):
             overwrite_roles: If this is set, then the bot will replace any previously configured roles.
         """
         try:
-            await ctx.send(self._link_roles(verified_role, resident_role, ctx.guild, overwrite=overwrite_roles))
-
-            with Session(self.scout.engine) as session:
-                users = session.scalars(select(User.snowflake)).all()
-                if users:
-                    members = await ctx.guild.query_members(user_ids=users)
-                    for member in members:
-                        await self.give_verified_roles(member, ctx.guild, session=session)
+            await ctx.send(await self._link_roles(verified_role, resident_role, ctx.guild,
+                                                  overwrite=overwrite_roles))
+            await self.queue_guild_roles(ctx.guild)
 
         except Scout.exceptions.NoRoles:
             await ctx.send("I don't know why you're trying to add roles without giving me any...")
@@ -399,41 +534,28 @@ class NSVerify(commands.Cog):
 
             remove_roles: If set to True, it will also remove the roles from any users with the role set.
         """
-        unlinked_roles: list[discord.Role] = []
-
         # Note: Check the remove_role function
-        with Session(self.scout.engine) as session:
-            guild_id = session.scalar(select(models.Guild).where(models.Guild.snowflake == ctx.guild.id)).id
-            if verified_role:
-                unlinked_roles.append(verified_role)
-                role = session.scalar(select(models.Role)
-                                      .join(models.role_associations)
-                                      .join(models.Association)
-                                      .where(models.Association.id == self.scout.associations[VERIFIED])
-                                      .where(models.Role.guild_id == guild_id))
+        unlinked = [association for association, role in ((VERIFIED, verified_role), (RESIDENT, resident_role))
+                    if role]
+        unlinked_roles = [role for role in (verified_role, resident_role) if role]
+        async with self.scout.async_session() as session:
+            for association in unlinked:
+                role = self.scout.role_index.get(ctx.guild.id, association)
                 if role is not None:
-                    session.delete(role)
-            if resident_role:
-                unlinked_roles.append(resident_role)
-                role = session.scalar(select(models.Role)
-                                      .join(models.role_associations)
-                                      .join(models.Association)
-                                      .where(models.Association.id == self.scout.associations[RESIDENT])
-                                      .where(models.Role.guild_id == guild_id))
-                if role is not None:
-                    session.delete(role)
-            session.commit()
+                    await db.remove_role_async(role, snowflake_only=True, session=session)
+            await session.commit()
+        for association in unlinked:
+            self.scout.role_index.discard(ctx.guild.id, association)
 
         if remove_roles:
-            for role in unlinked_roles:
-                for member in role.members:
-                    await member.remove_roles(role)
+            await self.role_jobs.enqueue(roles.RoleChange(ctx.guild.id, member.id, set(), {role.id})
+                                         for role in unlinked_roles for member in role.members)
         if unlinked_roles:
             await ctx.send("I've gone ahead and removed that role from my notes!")
         else:
             await ctx.send("You didn't give me any valid roles to remove from notes!...")
 
-    async def register_nation(self, nation_name: str, message: discord.Message, *, session: Session) -> str:
+    async def register_nation(self, nation_name: str, message: discord.Message, *, session: AsyncSession) -> str:
         """Actually register the 'nation' to the bot.
 
         Parameters:
@@ -444,29 +566,34 @@ class NSVerify(commands.Cog):
         Returns:
             A string to send to user.
         """
-        nation = db.get_nation(nation_name.casefold(), session=session)
+        nation = await db.get_nation_async(nation_name.casefold(), session=session)
 
         if nation is None:
-            nation = await self.ns_client.get_nation(nation_name, shards=None, user_agent=self.user_agent)
-            region = db.get_region(nation["REGION"].casefold(), session=session)
+            # The user is waiting on their roles, so these are interactive rather than queued behind the dumps.
+            nation = await self.ns_client.get_nation(nation_name, shards=None, user_agent=self.user_agent,
+                                                     priority=Priority.INTERACTIVE)
+            region = await db.get_region_async(nation["REGION"].casefold(), session=session)
 
             if region is None:
-                region = await self.ns_client.get_region(nation["REGION"], shards=None, user_agent=self.user_agent)
-                region = Region(name=region["NAME"].casefold(), data=region)
+                region = await self.ns_client.get_region(nation["REGION"], shards=None, user_agent=self.user_agent,
+                                                         priority=Priority.INTERACTIVE)
+                region = Region(name=region["NAME"].casefold(), data=region,
+                                **ingest.record_columns(Region, region))
                 session.add(region)
 
             nation = Nation(name=nation["NAME"].casefold(),
                             data=nation,
-                            region=region)
+                            region=region,
+                            **ingest.record_columns(Nation, nation))
             session.add(nation)
 
-        user = db.register_user(message.author.id, session=session)
-        db.link_user_nation(user, nation, session=session)
-        session.commit()
+        user = await db.register_user_async(message.author.id, session=session)
+        await db.link_user_nation_async(user, nation, session=session)
+        await session.commit()
         return "There we go! I'll see if I can get you some roles..."
 
     @staticmethod
-    async def eligible_nsv_role(user: discord.Member, guild: models.Guild, session: Session) -> str | None:
+    async def eligible_nsv_role(user: discord.Member, guild: models.Guild, session: AsyncSession) -> str | None:
         """Determine what roles the user is eligible for in the given server.
 
         Parameters:
@@ -475,7 +602,7 @@ class NSVerify(commands.Cog):
             session: The database session to use.
         """
         eligible_role = None
-        user_db = db.get_user(user.id, session=session)
+        user_db = await db.get_user_async(user.id, session=session)
 
         if guild is None or user_db is None:
             return None
@@ -483,7 +610,11 @@ class NSVerify(commands.Cog):
         if user is not None:
             eligible_role = VERIFIED
 
-        if guild.regions & {n.region for n in user_db.nations}:
+        if await session.scalar(select(exists()
+                                       .where(user_nation.c.user_id == user_db.id)
+                                       .where(Nation.id == user_nation.c.nation_id)
+                                       .where(guild_region.c.region_id == Nation.region_id)
+                                       .where(guild_region.c.guild_id == guild.id))):
             eligible_role = RESIDENT
 
         return eligible_role
@@ -502,64 +633,101 @@ class NSVerify(commands.Cog):
         else:
             return [RESIDENT, VERIFIED]
 
+    @staticmethod
+    async def mutual_members(user: discord.User | discord.Member, guilds: list[discord.Guild]
+                             ) -> dict[discord.Guild, discord.Member]:
+        """Finds the member of a user in each of the given guilds that they are in.
+
+        The member cache is checked first, a guild is only asked over REST if the user is not in its cache and the
+        cache is not complete, and at most MEMBER_FETCH_CONCURRENCY of those requests are made at once.
+
+        Parameters:
+            user: The discord user.
+            guilds: The guilds to look in.
+
+        Returns:
+            The member of the user in each guild they are in.
+        """
+        mutual = {guild.id for guild in user.mutual_guilds}
+        members = {}
+        cold = []
+        for guild in guilds:
+            if guild.id in mutual and (member := guild.get_member(user.id)) is not None:
+                members[guild] = member
+            elif not guild.chunked:
+                cold.append(guild)
+
+        semaphore = asyncio.Semaphore(MEMBER_FETCH_CONCURRENCY)
+
+        async def fetch(guild: discord.Guild) -> Optional[discord.Member]:
+            async with semaphore:
+                try:
+                    return await guild.fetch_member(user.id)
+                except discord.HTTPException:
+                    return None
+
+        for guild, member in zip(cold, await asyncio.gather(*(fetch(guild) for guild in cold))):
+            if member is not None:
+                members[guild] = member
+        return members
+
     async def give_verified_roles(self, user: discord.User | discord.Member, guild: Optional[discord.Guild] = None,
-                                  *, session: Session):
-        if not session.scalars(select(models.Role)).all():
+                                  *, session: Optional[AsyncSession] = None):
+        if not self.scout.role_index:
             return
 
-        user_db = db.get_user(user.id, session=session)
-        if user_db is None or not user_db.nations:
+        if session is None:
+            async with self.scout.async_session() as session:
+                return await self.give_verified_roles(user, guild, session=session)
+
+        user_db = await db.get_user_async(user.id, session=session)
+        if user_db is None or not await user_db.awaitable_attrs.nations:
             return
 
         mutual_guilds = {}
         active_guilds = []
         if guild is None:
-            mutual_guilds = {g.id: (g, m) for g in self.scout.guilds if (m := await g.fetch_member(user.id))}
-            active_guilds = session.scalars(
-                select(models.Guild).where(models.Guild.snowflake.in_(mutual_guilds.keys()))).all()
+            guilds = [g for snowflake in self.scout.role_index.guilds()
+                      if (g := self.scout.get_guild(snowflake)) is not None]
+            mutual_guilds = {g.id: (g, m) for g, m in (await self.mutual_members(user, guilds)).items()}
+            active_guilds = (await session.scalars(
+                select(models.Guild).where(models.Guild.snowflake.in_(mutual_guilds.keys())))).all()
             if not active_guilds:
                 return
 
         else:
             mutual_guilds[guild.id] = (guild, user)
-            active_guilds = [session.scalar(select(models.Guild).where(models.Guild.snowflake == guild.id))]
+            active_guilds = [await session.scalar(select(models.Guild).where(models.Guild.snowflake == guild.id))]
             active_guilds = [g for g in active_guilds if g is not None]
             if not active_guilds:
                 return
 
+        skipped = 0
         for active_guild in active_guilds:
-            if mutual_guilds[active_guild.snowflake][1] is None or not active_guild.roles:
+            index = self.scout.role_index
+            if mutual_guilds[active_guild.snowflake][1] is None or not index.roles(active_guild.snowflake):
                 continue
 
             user = mutual_guilds[active_guild.snowflake][1]
 
             eligible_roles = await self.eligible_nsv_role(user, active_guild, session=session)
             ineligible_roles = await self.ineligible_nsv_roles(eligible_roles)
-            eligible_guild_role = session.scalar(select(models.Role)
-                                        .join(models.role_associations)
-                                        .join(models.Association)
-                                        .where(models.Role.guild_id == active_guild.id)
-                                        .where(models.Association.id == self.scout.associations[eligible_roles]))
-
-            ineligible_guild_role = lambda a: (select(models.Role)
-                                               .join(models.role_associations)
-                                               .join(models.Association)
-                                               .where(models.Role.guild_id == active_guild.id)
-                                               .where(models.Association.id == self.scout.associations[a]))
-            ineligible_db = [session.scalar(ineligible_guild_role(r))
-                             for r in ineligible_roles if r is not None]
-            discord_roles = [discord.Object(r.snowflake) for r in ineligible_db if r is not None]
-
-            if eligible_guild_role is not None:
-                eligible_discord = discord.Object(eligible_guild_role.snowflake)
-                await user.add_roles(eligible_discord)
-            await user.remove_roles(*discord_roles)
+            eligible_guild_role = index.get(active_guild.snowflake, eligible_roles) if eligible_roles else None
+            ineligible_guild_roles = {role for r in ineligible_roles
+                                      if (role := index.get(active_guild.snowflake, r)) is not None}
+
+            add = {eligible_guild_role} if eligible_guild_role is not None else set()
+            if not await self.edit_roles(user, add, ineligible_guild_roles):
+                skipped += 1
+
+        logger.debug("Gave roles to {} in {} guilds, skipped {}".format(user.id, len(active_guilds), skipped))
 
     async def _verify_nation(self, nation: str, code: Optional[str]) -> tuple[str]:
         if code is None:
             raise Scout.exceptions.NoCode_NSVerify()
 
-        response = await self.ns_client.get_verify(nation, code, user_agent=self.user_agent)
+        response = await self.ns_client.get_verify(nation, code, user_agent=self.user_agent,
+                                                   priority=Priority.INTERACTIVE)
         if not response:
             raise Scout.exceptions.InvalidCode_NSVerify(code)
 
@@ -570,16 +738,20 @@ class NSVerify(commands.Cog):
         """
         Displays Verified Nations of a given user.
         """
-        with Session(self.scout.engine) as session:
-            user = db.get_user(ctx.message.author.id, snowflake_only=True, session=session)
+        async with self.scout.async_session() as session:
+            user = await db.get_user_async(ctx.message.author.id, snowflake_only=True, session=session)
+            if user is not None:
+                await user.awaitable_attrs.nations
         if user is not None and user.nations:
             await ctx.send('\n'.join([n.name for n in user.nations]), ephemeral=private_response)
         await ctx.send("I don't have any nations for you!")
 
     @commands.Cog.listener('on_member_join')
     async def verify_on_join(self, member: discord.Member):
-        with Session(self.scout.engine) as session:
-            await self.give_verified_roles(member, member.guild, session=session)
+        reconciler = roles.RoleReconciler(self.scout.role_index)
+        async with self.scout.async_session() as session:
+            await session.run_sync(reconciler.load, users=[member.id])
+        await self.role_jobs.enqueue(reconciler.diff(member.guild.id, [(member.id, {role.id for role in member.roles})]))
 
 
 async def setup(bot):
@@ -0,0 +1,306 @@
+"""
+This module contains the persistent queue of role changes, and the workers that apply them.
+"""
+import asyncio
+import datetime
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterable
+
+import discord
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from Scout.core.nationstates.roles import RoleChange
+from Scout.database.models import RoleJob
+
+GUILD_EDIT_RATE = 1.0
+"""How many member edits are made per second in each guild, Discord allows about 10 every 10 seconds."""
+GUILD_EDIT_BURST = 10
+GLOBAL_EDIT_RATE = 40.0
+"""How many member edits are made per second over every guild, under Discord's global limit of 50 requests."""
+GLOBAL_EDIT_BURST = 40
+RETRY_DELAY = 5
+MAX_ATTEMPTS = 5
+JOB_CHUNK_SIZE = 500
+
+logger = logging.getLogger("discord.cogs.core.nationstates.role_jobs")
+
+
+def _now() -> datetime.datetime:
+    # The database stores naive datetimes, so jobs are timed in naive UTC.
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _merge(add: set[int], remove: set[int], new_add: set[int], new_remove: set[int]) -> tuple[set[int], set[int]]:
+    # The newer change wins for any role both of them touch.
+    return (add - new_remove) | new_add, (remove - new_add) | new_remove
+
+
+class TokenBucket:
+    """A token bucket, to keep requests under a rate limit while still allowing short bursts.
+
+    Attributes:
+        rate: How many tokens are added every second.
+        capacity: The most tokens the bucket can hold.
+        tokens: How many tokens the bucket has, this goes negative if more are taken than there are.
+    """
+    rate: float
+    capacity: float
+    tokens: float
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def wait(self):
+        """Waits until there is a token, without taking it."""
+        self._refill()
+        while self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+
+    def take(self):
+        """Takes a token, for a request that was made."""
+        self._refill()
+        self.tokens -= 1
+
+
+class RoleJobQueue:
+    """A queue of role changes that is kept in the database, so none are lost if the bot restarts.
+
+    Each member has at most one job, so queueing a change for a member that already has one merges the two. Guilds
+    are worked on in turn by a pool of workers, one guild at a time per worker, and each guild has a token bucket so
+    its edits stay under Discord's per-guild rate limit, with another bucket shared by every guild for the global
+    limit. Jobs that fail are retried with an exponential backoff, up to MAX_ATTEMPTS times.
+
+    Attributes:
+        engine: The database engine.
+        apply: Applies a job, given the guild and member snowflake and the roles to add and remove. It returns if a
+            request was made, and raises discord.HTTPException if the request failed.
+        workers: The amount of workers.
+        applied: How many jobs have been applied.
+        skipped: How many jobs needed no request.
+        failed: How many jobs were given up on.
+    """
+    engine: AsyncEngine
+    apply: Callable[[int, int, set[int], set[int]], Awaitable[bool]]
+    workers: int
+    applied: int
+    skipped: int
+    failed: int
+
+    def __init__(self, engine: AsyncEngine, apply: Callable[[int, int, set[int], set[int]], Awaitable[bool]],
+                 workers: int = 4):
+        self.engine = engine
+        self.apply = apply
+        self.workers = workers
+        self.applied = 0
+        self.skipped = 0
+        self.failed = 0
+        self._members: dict[int, deque[int]] = {}
+        self._queued: set[tuple[int, int]] = set()
+        self._ready: asyncio.Queue[int] = asyncio.Queue()
+        self._buckets: dict[int, TokenBucket] = {}
+        self._global = TokenBucket(GLOBAL_EDIT_RATE, GLOBAL_EDIT_BURST)
+        self._tasks: list[asyncio.Task] = []
+        self._retries: list[asyncio.TimerHandle] = []
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    async def start(self):
+        """Starts the workers, and queues every job left in the database from before a restart."""
+        async with AsyncSession(self.engine) as session:
+            jobs = (await session.execute(select(RoleJob.guild_snowflake, RoleJob.member_snowflake,
+                                                 RoleJob.not_before))).all()
+        now = _now()
+        for guild, member, not_before in jobs:
+            if not_before is not None and not_before > now:
+                self._later((not_before - now).total_seconds(), guild, member)
+            else:
+                self._push(guild, member)
+        if jobs:
+            logger.info("Resuming {} queued role changes".format(len(jobs)))
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def stop(self):
+        """Stops the workers, the jobs they did not get to stay in the database."""
+        for task in self._tasks:
+            task.cancel()
+        for retry in self._retries:
+            retry.cancel()
+        self._tasks = []
+        self._retries = []
+
+    async def enqueue(self, changes: Iterable[RoleChange]) -> int:
+        """Queues role changes, merging them into the jobs already queued for the same members.
+
+        Args:
+            changes: The role changes to make.
+
+        Returns:
+            The amount of members that changes were queued for.
+        """
+        guilds: dict[int, dict[int, tuple[set[int], set[int]]]] = {}
+        for change in changes:
+            members = guilds.setdefault(change.guild, {})
+            add, remove = members.get(change.member, (set(), set()))
+            members[change.member] = _merge(add, remove, change.add, change.remove)
+
+        async with AsyncSession(self.engine) as session:
+            for guild, members in guilds.items():
+                snowflakes = list(members)
+                for start in range(0, len(snowflakes), JOB_CHUNK_SIZE):
+                    chunk = snowflakes[start:start + JOB_CHUNK_SIZE]
+                    jobs = {job.member_snowflake: job
+                            for job in await session.scalars(select(RoleJob)
+                                                             .where(RoleJob.guild_snowflake == guild)
+                                                             .where(RoleJob.member_snowflake.in_(chunk)))}
+                    for member in chunk:
+                        add, remove = members[member]
+                        job = jobs.get(member, None)
+                        if job is None:
+                            session.add(RoleJob(guild_snowflake=guild, member_snowflake=member, add=sorted(add),
+                                                remove=sorted(remove), revision=0, attempts=0))
+                            continue
+                        add, remove = _merge(set(job.add), set(job.remove), add, remove)
+                        job.add, job.remove = sorted(add), sorted(remove)
+                        job.revision += 1
+                        job.attempts = 0
+                        job.not_before = None
+            await session.commit()
+
+        for guild, members in guilds.items():
+            for member in members:
+                self._push(guild, member)
+        return sum(len(members) for members in guilds.values())
+
+    def _push(self, guild: int, member: int):
+        if (guild, member) in self._queued:
+            return
+        self._queued.add((guild, member))
+        if guild not in self._members:
+            self._members[guild] = deque()
+            self._ready.put_nowait(guild)
+        self._members[guild].append(member)
+
+    async def _work(self):
+        while True:
+            guild = await self._ready.get()
+            members = self._members[guild]
+            member = None
+            try:
+                bucket = self._buckets.setdefault(guild, TokenBucket(GUILD_EDIT_RATE, GUILD_EDIT_BURST))
+                await bucket.wait()
+                await self._global.wait()
+                member = members.popleft()
+                self._queued.discard((guild, member))
+                await self._run(guild, member, bucket)
+            except Exception as e:
+                logger.exception("Could not run a role change in {}".format(guild))
+                if member is not None:
+                    await self._fail(guild, member, e)
+            finally:
+                # A guild is only ever held by one worker, so its edits are made one after another.
+                if members:
+                    self._ready.put_nowait(guild)
+                else:
+                    del self._members[guild]
+                    if not self._members:
+                        logger.info("Role changes done, {} applied, {} skipped, {} failed".format(
+                            self.applied, self.skipped, self.failed))
+
+    async def _run(self, guild: int, member: int, bucket: TokenBucket):
+        async with AsyncSession(self.engine) as session:
+            job = await session.get(RoleJob, (guild, member))
+            if job is None:
+                return
+            add, remove, revision, attempts = set(job.add), set(job.remove), job.revision, job.attempts
+
+        try:
+            edited = await self.apply(guild, member, add, remove)
+        except (discord.NotFound, discord.Forbidden) as e:
+            bucket.take()
+            self._global.take()
+            self.failed += 1
+            logger.warning("Could not change the roles of {} in {}: {}".format(member, guild, e))
+            await self._finish(guild, member, revision)
+            return
+        except discord.HTTPException as e:
+            bucket.take()
+            self._global.take()
+            await self._retry(guild, member, revision, attempts + 1, e)
+            return
+        except Exception as e:
+            logger.exception("Could not change the roles of {} in {}".format(member, guild))
+            await self._retry(guild, member, revision, attempts + 1, e)
+            return
+
+        if edited:
+            bucket.take()
+            self._global.take()
+            self.applied += 1
+        else:
+            self.skipped += 1
+        await self._finish(guild, member, revision)
+
+    async def _finish(self, guild: int, member: int, revision: int):
+        async with AsyncSession(self.engine) as session:
+            done = (await session.execute(delete(RoleJob)
+                                          .where(RoleJob.guild_snowflake == guild)
+                                          .where(RoleJob.member_snowflake == member)
+                                          .where(RoleJob.revision == revision))).rowcount
+            await session.commit()
+        if not done:
+            # The job was merged with a newer change while it was being applied.
+            self._push(guild, member)
+
+    async def _fail(self, guild: int, member: int, error: Exception):
+        # Counts a failure outside of applying the job, such as a database error, as an attempt of the job.
+        try:
+            async with AsyncSession(self.engine) as session:
+                job = await session.get(RoleJob, (guild, member))
+                if job is None:
+                    return
+                revision, attempts = job.revision, job.attempts
+            await self._retry(guild, member, revision, attempts + 1, error)
+        except Exception:
+            # The job stays in the database, so it is tried again after a restart.
+            logger.exception("Could not retry the role change of {} in {}".format(member, guild))
+
+    async def _retry(self, guild: int, member: int, revision: int, attempts: int, error: Exception):
+        if attempts >= MAX_ATTEMPTS:
+            self.failed += 1
+            logger.warning("Gave up changing the roles of {} in {} after {} attempts: {}".format(
+                member, guild, attempts, error))
+            await self._finish(guild, member, revision)
+            return
+
+        delay = RETRY_DELAY * 2 ** (attempts - 1)
+        async with AsyncSession(self.engine) as session:
+            retrying = (await session.execute(update(RoleJob)
+                                              .where(RoleJob.guild_snowflake == guild)
+                                              .where(RoleJob.member_snowflake == member)
+                                              .where(RoleJob.revision == revision)
+                                              .values(attempts=attempts,
+                                                      not_before=_now() + datetime.timedelta(seconds=delay)))).rowcount
+            await session.commit()
+        if not retrying:
+            self._push(guild, member)
+            return
+        logger.debug("Retrying the roles of {} in {} in {} seconds: {}".format(member, guild, delay, error))
+        self._later(delay, guild, member)
+
+    def _later(self, delay: float, guild: int, member: int):
+        loop = asyncio.get_running_loop()
+        self._retries = [retry for retry in self._retries if retry.when() > loop.time()]
+        self._retries.append(loop.call_later(delay, self._push, guild, member))
@@ -0,0 +1,136 @@
+"""
+This module contains the reconciliation of the roles NSVerify manages.
+"""
+from collections.abc import Iterable
+from typing import Optional
+
+from sqlalchemy import select, exists, true
+from sqlalchemy.orm import Session
+
+from Scout.database.models import User, Nation, Guild, user_nation, guild_region
+from Scout.database.role_index import GuildRoleIndex
+
+VERIFIED = "NSVerify:user-verified"
+RESIDENT = "NSVerify:user-resident"
+
+
+class RoleChange:
+    """The roles that have to be added to and removed from a member.
+
+    Attributes:
+        guild: The snowflake of the guild.
+        member: The snowflake of the member.
+        add: The snowflakes of the roles to add.
+        remove: The snowflakes of the roles to remove.
+    """
+    guild: int
+    member: int
+    add: set[int]
+    remove: set[int]
+
+    def __init__(self, guild: int, member: int, add: set[int], remove: set[int]):
+        self.guild = guild
+        self.member = member
+        self.add = add
+        self.remove = remove
+
+    def __repr__(self) -> str:
+        return "RoleChange(guild={}, member={}, add={}, remove={})".format(self.guild, self.member, self.add,
+                                                                          self.remove)
+
+
+class RoleReconciler:
+    """Works out which roles every member should have, from a few bulk queries.
+
+    The managed roles of every guild come from the role index, and the verified users and the guilds each user is a
+    resident of are loaded with one query each. The roles of each member are then compared with what they
+    should be in memory, and only the roles that differ are changed.
+
+    A verified member is given the resident role of a guild if one of their nations is in a region linked to it, and
+    the verified role otherwise. Members that are not verified should have neither.
+
+    Attributes:
+        index: The index of the roles of every guild.
+        roles: The snowflake of each managed role, keyed by guild snowflake and then by association name.
+        verified: The snowflakes of the users that have verified a nation.
+        residents: The snowflakes of the users that are residents of each guild's regions, keyed by guild snowflake.
+    """
+    index: GuildRoleIndex
+    roles: dict[int, dict[str, int]]
+    verified: set[int]
+    residents: dict[int, set[int]]
+
+    def __init__(self, index: GuildRoleIndex):
+        self.index = index
+        self.roles = {}
+        self.verified = set()
+        self.residents = {}
+
+    def load(self, session: Session, users: Optional[Iterable[int]] = None):
+        """Loads everything needed to reconcile roles.
+
+        Args:
+            session: The database session to use.
+            users: If given, only these users are loaded, by snowflake.
+        """
+        self.roles = {}
+        for association in (VERIFIED, RESIDENT):
+            for guild, role in self.index.with_association(association):
+                self.roles.setdefault(guild, {})[association] = role
+
+        user_filter = User.snowflake.in_(list(users)) if users is not None else true()
+        self.verified = set(session.scalars(select(User.snowflake)
+                                            .where(exists().where(user_nation.c.user_id == User.id))
+                                            .where(user_filter)))
+        self.residents = {}
+        for guild, user in session.execute(select(Guild.snowflake, User.snowflake).distinct()
+                                           .join(user_nation, user_nation.c.user_id == User.id)
+                                           .join(Nation, Nation.id == user_nation.c.nation_id)
+                                           .join(guild_region, guild_region.c.region_id == Nation.region_id)
+                                           .join(Guild, Guild.id == guild_region.c.guild_id)
+                                           .where(user_filter)):
+            self.residents.setdefault(guild, set()).add(user)
+
+    def desired(self, guild: int, member: int) -> set[int]:
+        """Gets the managed roles a member should have.
+
+        Args:
+            guild: The snowflake of the guild.
+            member: The snowflake of the member.
+        """
+        if member not in self.verified:
+            return set()
+        role = self.roles.get(guild, {}).get(RESIDENT if member in self.residents.get(guild, ()) else VERIFIED, None)
+        return {role} if role is not None else set()
+
+    def diff(self, guild: int, members: Iterable[tuple[int, set[int]]]) -> list[RoleChange]:
+        """Compares the roles of a guild's members with the roles they should have.
+
+        Args:
+            guild: The snowflake of the guild.
+            members: The snowflake and current role snowflakes of each member.
+
+        Returns:
+            The changes for the members whose managed roles are not what they should be.
+        """
+        managed = set(self.roles.get(guild, {}).values())
+        if not managed:
+            return []
+        changes = []
+        for member, current in members:
+            desired = self.desired(guild, member)
+            add, remove = desired - current, (managed - desired) & current
+            if add or remove:
+                changes.append(RoleChange(guild, member, add, remove))
+        return changes
+
+    def plan(self, guilds: Iterable[tuple[int, Iterable[tuple[int, set[int]]]]]) -> list[RoleChange]:
+        """Compares the roles of the members of every guild with the roles they should have.
+
+        Args:
+            guilds: The snowflake of each guild, and the snowflake and current role snowflakes of its members.
+
+        Returns:
+            The changes for every member whose managed roles are not what they should be.
+        """
+        return [change for guild, members in guilds for change in self.diff(guild, members)]
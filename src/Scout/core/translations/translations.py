@@ -6,7 +6,7 @@ from typing import Optional
 import discord.ext.commands
 from discord.ext import commands
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import Scout.exceptions
 from Scout.database import db, models
@@ -30,27 +30,27 @@ class Translations(commands.Cog):
 
     @staticmethod
     async def update_locale(obj: models.Guild | models.User, priority: int, language: str | None,
-                            *, get_locale_priority, add_locale, get_locale_language, session: Session):
+                            *, get_locale_priority, add_locale, get_locale_language, session: AsyncSession):
         """Provides a general interface for updating locale between servers and guilds.
 
         Arguments:
             obj: The database object to use that represents the guild/user.
             priority: the priority to put the locale/language at
             language: the locale/language to use.
-            get_locale_priority: The function to use to get a locale for the obj at the specified priority.
-            add_locale: The function to use to create the locale.
-            get_locale_language: The function to use to get a UserLocale/GuildLocale for the specified language.
+            get_locale_priority: The async function to use to get a locale for the obj at the specified priority.
+            add_locale: The async function to use to create the locale.
+            get_locale_language: The async function to use to get a UserLocale/GuildLocale for the specified language.
             session: DB Session.
         """
-        lang = get_locale_priority(obj, priority, session=session)
+        lang = await get_locale_priority(obj, priority, session=session)
         if language is None and lang is not None:
-            session.delete(lang)
+            await session.delete(lang)
         elif language is not None and lang is None:
-            locale = add_locale(obj, language, priority, session=session)
+            locale = await add_locale(obj, language, priority, session=session)
             session.add(locale)
         elif language is not None and lang is not None:
-            if other := get_locale_language(obj, language, session=session):
-                session.delete(lang)
+            if other := await get_locale_language(obj, language, session=session):
+                await session.delete(lang)
                 other.priority = priority
             else:
                 lang.locale = language
@@ -82,12 +82,12 @@ class Translations(commands.Cog):
             await ctx.send(f"Language {language} not supported!")
             return
 
-        with Session(self.scout.engine) as session:
-            guild = db.get_guild(ctx.guild.id, snowflake_only=True, session=session)
+        async with self.scout.async_session() as session:
+            guild = await db.get_guild_async(ctx.guild.id, snowflake_only=True, session=session)
             if guild is None:
-                guild = db.register_guild(ctx.guild.id, session=session)
+                guild = await db.register_guild_async(ctx.guild.id, session=session)
                 session.add(guild)
-                session.commit()
+                await session.commit()
 
             original_discord = guild.override_discord_locale
             original_user = guild.override_user_locales
@@ -106,36 +106,36 @@ class Translations(commands.Cog):
             #     else:
             #         lang.locale = language
 
-            current_primary = session.scalar(select(GuildLocale)
-                                             .where(GuildLocale.guild_id == guild.id)
-                                             .where(GuildLocale.priority == PRIMARY))
+            current_primary = await session.scalar(select(GuildLocale)
+                                                         .where(GuildLocale.guild_id == guild.id)
+                                                         .where(GuildLocale.priority == PRIMARY))
             if language is None and current_primary is not None:
-                session.delete(current_primary)
+                await session.delete(current_primary)
             elif language is not None and current_primary is None:
                 new_locale = GuildLocale(guild_id=guild.id, priority=PRIMARY, locale=language)
                 session.add(new_locale)
             elif language is not None and current_primary is not None:
-                if other := session.scalar(select(GuildLocale).where(GuildLocale.guild_id == guild.id).where(GuildLocale.locale == language)):
-                    session.delete(current_primary)
+                if other := await session.scalar(select(GuildLocale).where(GuildLocale.guild_id == guild.id).where(GuildLocale.locale == language)):
+                    await session.delete(current_primary)
                     other.priority = PRIMARY
                 else:
                     current_primary.locale = language
 
-            current_fallback = session.scalar(select(GuildLocale)
-                                             .where(GuildLocale.guild_id == guild.id)
-                                             .where(GuildLocale.priority == SECONDARY))
+            current_fallback = await session.scalar(select(GuildLocale)
+                                                          .where(GuildLocale.guild_id == guild.id)
+                                                          .where(GuildLocale.priority == SECONDARY))
             if language is None and current_fallback is not None:
-                session.delete(current_fallback)
+                await session.delete(current_fallback)
             elif language is not None and current_fallback is None:
                 new_locale = GuildLocale(guild_id=guild.id, priority=SECONDARY, locale=language)
                 session.add(new_locale)
             elif language is not None and current_fallback is not None:
-                if other := session.scalar(select(GuildLocale).where(GuildLocale.guild_id == guild.id).where(GuildLocale.locale == language)):
-                    session.delete(current_fallback)
+                if other := await session.scalar(select(GuildLocale).where(GuildLocale.guild_id == guild.id).where(GuildLocale.locale == language)):
+                    await session.delete(current_fallback)
                     other.priority = SECONDARY
                 else:
                     current_fallback.locale = language
-            session.commit()
+            await session.commit()
             await ctx.send("Updated guild information!")
 
     @commands.hybrid_command()  # type: ignore
@@ -163,49 +163,49 @@ class Translations(commands.Cog):
             await ctx.send(f"Language {fallback_language} not supported!")
             return
 
-        with Session(self.scout.engine) as session:
-            user = db.get_user(ctx.user.id, session=session)
+        async with self.scout.async_session() as session:
+            user = await db.get_user_async(ctx.user.id, session=session)
             if user is None:
-                user = db.register_user(ctx.user.id, session=session)
+                user = await db.register_user_async(ctx.user.id, session=session)
                 session.add(user)
-                session.commit()
+                await session.commit()
 
             original_discord = user.override_discord_locale
             original_server = user.use_locales_in_server
             user.override_discord_locale = original_discord if override_locale is None else override_locale
             user.restrict_server_locale = original_server if use_in_servers is None else use_in_servers
 
-            current_primary = session.scalar(select(UserLocale)
-                                             .where(UserLocale.user_id == user.id)
-                                             .where(UserLocale.priority == PRIMARY))
+            current_primary = await session.scalar(select(UserLocale)
+                                                         .where(UserLocale.user_id == user.id)
+                                                         .where(UserLocale.priority == PRIMARY))
             if language is None and current_primary is not None:
-                session.delete(current_primary)
+                await session.delete(current_primary)
             elif language is not None and current_primary is None:
                 new_locale = UserLocale(user_id=user.id, priority=PRIMARY, locale=language)
                 session.add(new_locale)
             elif language is not None and current_primary is not None:
-                if other := session.scalar(select(UserLocale).where(UserLocale.user_id == user.id).where(UserLocale.locale == language)):
-                    session.delete(current_primary)
+                if other := await session.scalar(select(UserLocale).where(UserLocale.user_id == user.id).where(UserLocale.locale == language)):
+                    await session.delete(current_primary)
                     other.priority = PRIMARY
                 else:
                     current_primary.locale = language
 
-            current_fallback = session.scalar(select(UserLocale)
-                                              .where(UserLocale.user_id == user.id)
-                                              .where(UserLocale.priority == SECONDARY))
+            current_fallback = await session.scalar(select(UserLocale)
+                                                          .where(UserLocale.user_id == user.id)
+                                                          .where(UserLocale.priority == SECONDARY))
             if language is None and current_fallback is not None:
-                session.delete(current_fallback)
+                await session.delete(current_fallback)
             elif language is not None and current_fallback is None:
                 new_locale = UserLocale(user_id=user.id, priority=SECONDARY, locale=language)
                 session.add(new_locale)
             elif language is not None and current_fallback is not None:
-                if other := session.scalar(select(UserLocale).where(UserLocale.user_id == user.id).where(UserLocale.locale == language)):
-                    session.delete(current_fallback)
+                if other := await session.scalar(select(UserLocale).where(UserLocale.user_id == user.id).where(UserLocale.locale == language)):
+                    await session.delete(current_fallback)
                     other.priority = SECONDARY
                 else:
                     current_fallback.locale = language
             await ctx.send("Updated user information!")
-            session.commit()
+            await session.commit()
 
 
 async def setup(bot):
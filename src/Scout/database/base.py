@@ -1,10 +1,12 @@
 from typing import Any
 
-from sqlalchemy import JSON
+from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase
 
+from Scout.database.types import CompressedJSON
 
-class Base(DeclarativeBase):
+
+class Base(AsyncAttrs, DeclarativeBase):
     type_annotation_map = {
-        dict[str, Any]: JSON
+        dict[str, Any]: CompressedJSON
     }
@@ -2,39 +2,79 @@
 This is a more 'high level' of sorts DB interface.
 """
 from functools import wraps
-from typing import Optional, cast, Any
+from typing import Optional, cast, Any, Callable, Awaitable
 
 from sqlalchemy import create_engine, select, or_, inspect, StaticPool
-from sqlalchemy.engine import URL
+from sqlalchemy.engine import URL, Engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import Session
 
 import Scout.database.exceptions
+import Scout.database.types
 import Scout.database.models as models
 
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "psycopg"}
+"""The driver used for each dialect by db_connect_async, if no driver is given."""
 
-def db_connect(dialect: str, driver: Optional[str], table: Optional[str], login: dict[str, Optional[str]],
-               connect: dict[str, Optional[str | int]]):
-    """
-    Handles database connection stuff
-    """
+# An in-memory database is shared by name, so the sync and async engines of the bot see the same database.
+MEMORY_DATABASE = "file:scout?mode=memory&cache=shared&uri=true"
+
+
+def _database_url(dialect: str, driver: Optional[str], table: Optional[str], login: dict[str, Optional[str]],
+                  connect: dict[str, Optional[str | int]]) -> str | URL:
     driver_name = dialect
     if driver:
         driver_name = "{}+{}".format(driver_name, driver)
 
-    uri = URL.create(driver_name,
-                     username=login.get('user', None),
-                     password=login.get('password', None),
-                     host=cast(Optional[str], connect.get('host', None)),
-                     port=cast(Optional[int], connect.get('port', None)),
-                     database=table)
     if dialect.casefold() == "sqlite" and (table is None or not table):
-        return create_engine("sqlite://",
+        return "{}:///{}".format(driver_name, MEMORY_DATABASE)
+    return URL.create(driver_name,
+                      username=login.get('user', None),
+                      password=login.get('password', None),
+                      host=cast(Optional[str], connect.get('host', None)),
+                      port=cast(Optional[int], connect.get('port', None)),
+                      database=table)
+
+
+def db_connect(dialect: str, driver: Optional[str], table: Optional[str], login: dict[str, Optional[str]],
+               connect: dict[str, Optional[str | int]], compression: str = "zlib") -> Engine:
+    """
+    Handles database connection stuff
+    """
+    Scout.database.types.set_compression(compression)
+    uri = _database_url(dialect, driver, table, login, connect)
+    if dialect.casefold() == "sqlite" and (table is None or not table):
+        return create_engine(uri,
                              connect_args={'check_same_thread': False},
                              poolclass=StaticPool)
     else:
         return create_engine(uri)
 
 
+def db_connect_async(dialect: str, driver: Optional[str], table: Optional[str], login: dict[str, Optional[str]],
+                     connect: dict[str, Optional[str | int]], compression: str = "zlib") -> AsyncEngine:
+    """
+    Handles database connection stuff for AsyncSessions, the driver defaults to one from ASYNC_DRIVERS.
+    """
+    Scout.database.types.set_compression(compression)
+    uri = _database_url(dialect, driver or ASYNC_DRIVERS.get(dialect.casefold(), None), table, login, connect)
+    if dialect.casefold() == "sqlite" and (table is None or not table):
+        return create_async_engine(uri, poolclass=StaticPool)
+    return create_async_engine(uri)
+
+
+def run_async(helper: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    """Makes an async version of a helper, that takes an AsyncSession instead of a Session.
+
+    The helper is run with the AsyncSession's own Session, so everything it does, including lazy loads, is done
+    without blocking the event loop.
+    """
+    @wraps(helper)
+    async def wrapper(*args, session: AsyncSession, **kwargs):
+        return await session.run_sync(lambda sync_session: helper(*args, session=sync_session, **kwargs))
+    return wrapper
+
+
 def readd(obj: Any, session: Session) -> object:
     if inspect(obj).detached:
         session.add(session)
@@ -323,3 +363,34 @@ def get_server_locale_with_language(guild: int | models.Guild, locale: str,
                           .where(models.GuildLocale.guild_id == guild.id)
                           .where(models.GuildLocale.locale == locale)
                           .distinct())
+
+
+register_user_async = run_async(register_user)
+register_nation_async = run_async(register_nation)
+remove_nation_async = run_async(remove_nation)
+link_user_nation_async = run_async(link_user_nation)
+unlink_user_nation_async = run_async(unlink_user_nation)
+register_guild_async = run_async(register_guild)
+remove_guild_async = run_async(remove_guild)
+register_region_async = run_async(register_region)
+link_guild_region_async = run_async(link_guild_region)
+unlink_guild_region_async = run_async(unlink_guild_region)
+register_role_async = run_async(register_role)
+remove_role_async = run_async(remove_role)
+add_role_association_async = run_async(add_role_association)
+register_role_association_async = run_async(register_role_association)
+link_role_association_async = run_async(link_role_association)
+get_user_async = run_async(get_user)
+get_guild_async = run_async(get_guild)
+get_region_async = run_async(get_region)
+get_nation_async = run_async(get_nation)
+get_role_async = run_async(get_role)
+get_association_async = run_async(get_association)
+update_role_async = run_async(update_role)
+get_guildrole_with_association_async = run_async(get_guildrole_with_association)
+add_user_locale_async = run_async(add_user_locale)
+get_user_locale_with_priority_async = run_async(get_user_locale_with_priority)
+get_user_locale_with_language_async = run_async(get_user_locale_with_language)
+add_server_locale_async = run_async(add_server_locale)
+get_server_locale_with_priority_async = run_async(get_server_locale_with_priority)
+get_server_locale_with_language_async = run_async(get_server_locale_with_language)
@@ -3,7 +3,7 @@ from typing import Optional, Any
 
 import sqlalchemy.sql.functions
 from datetime import datetime
-from sqlalchemy import Table, Column, ForeignKey, Identity, Text
+from sqlalchemy import Table, Column, ForeignKey, Identity, Text, JSON
 from sqlalchemy.orm import Mapped, relationship, mapped_column
 #
 from Scout.database.base import Base
@@ -150,8 +150,15 @@ class Nation(Base):
         id: The primary key and id of the Nation in our database.
         name: The name of the Nation in our database.
         last_updated: The timestamp of when the nation information was last updated.
-        data: NationStates data in JSON form.
-        region_id: The id of the Region in the database the nation is in.
+        data: NationStates data in JSON form. This is only loaded when it is accessed.
+        data_hash: A hash of the data, used to skip nations that have not changed when ingesting the data dump.
+        region_id: The id of the Region in the database the nation is in, None if the nation no longer exists.
+        canonical_name: The name of the nation in the form NationStates uses in URLs.
+        wa_status: The World Assembly status of the nation.
+        endorsement_count: The amount of endorsements the nation has.
+        influence: The influence level of the nation.
+        last_login: The timestamp of when the nation last logged in.
+        last_activity: How long ago the nation was last active, as NationStates gives it.
 
         users: The users that have identified as this nation.
         region: The region that the nation is in.
@@ -162,11 +169,18 @@ class Nation(Base):
     id: Mapped[int] = mapped_column(Identity(increment=1), primary_key=True)
     name: Mapped[str] = mapped_column(index=True, unique=True)
     last_updated: Mapped[datetime] = mapped_column(server_default=sqlalchemy.sql.functions.now())
-    data: Mapped[dict[str, Any]]
-    region_id: Mapped[int] = mapped_column(ForeignKey("regions.id"))
+    data: Mapped[dict[str, Any]] = mapped_column(deferred=True)
+    data_hash: Mapped[Optional[str]]
+    region_id: Mapped[Optional[int]] = mapped_column(ForeignKey("regions.id"), index=True)
+    canonical_name: Mapped[Optional[str]] = mapped_column(index=True)
+    wa_status: Mapped[Optional[str]] = mapped_column(index=True)
+    endorsement_count: Mapped[Optional[int]]
+    influence: Mapped[Optional[str]]
+    last_login: Mapped[Optional[int]]
+    last_activity: Mapped[Optional[str]]
 
     users: Mapped[set["User"]] = relationship(secondary=user_nation, back_populates="nations")
-    region: Mapped["Region"] = relationship(back_populates="nations")
+    region: Mapped[Optional["Region"]] = relationship(back_populates="nations")
     verify_information: Mapped["NationOwnershipInformation"] = relationship(back_populates="nation")
 
 
@@ -177,7 +191,11 @@ class Region(Base):
         id: The primary key and id of the region in our database.
         name: The name of the region in our database.
         last_updated: The timestamp of when the region information was last updated.
-        data: The nationstates data of that region.
+        data: The nationstates data of that region. This is only loaded when it is accessed.
+        data_hash: A hash of the data, used to skip regions that have not changed when ingesting the data dump.
+        canonical_name: The name of the region in the form NationStates uses in URLs.
+        delegate: The canonical name of the region's World Assembly delegate, if it has one.
+        founder: The canonical name of the region's founder, if it has one.
         nations: The set of nations that the bot knows about that are in the region.
         guilds: The set of guilds that a region is associated with.
     """
@@ -186,13 +204,64 @@ class Region(Base):
     id: Mapped[int] = mapped_column(Identity(increment=1), primary_key=True)
     name: Mapped[str] = mapped_column(index=True, unique=True)
     last_updated: Mapped[datetime] = mapped_column(server_default=sqlalchemy.sql.functions.now())
-    data: Mapped[dict[str, Any]]
+    data: Mapped[dict[str, Any]] = mapped_column(deferred=True)
+    data_hash: Mapped[Optional[str]]
+    canonical_name: Mapped[Optional[str]] = mapped_column(index=True)
+    delegate: Mapped[Optional[str]] = mapped_column(index=True)
+    founder: Mapped[Optional[str]] = mapped_column(index=True)
 
     nations: Mapped[set["Nation"]] = relationship(back_populates="region",
                                                         cascade="save-update, merge, delete, delete-orphan")
     guilds: Mapped[set["Guild"]] = relationship(secondary=guild_region, back_populates="regions")
 
 
+class IngestCheckpoint(Base):
+    """Representation of how far the ingest of a data dump got, so it can be resumed after a restart.
+
+    Attributes:
+        dump_type: The data dump, either regions or nations.
+        identity: The identity of the data dump file the checkpoint is for.
+        phase: How far the ingest got, either staging, merged or done.
+        records: The amount of records from the data dump that have been staged.
+        last_updated: When the checkpoint was last written.
+    """
+    __tablename__ = "ingest_checkpoints"
+
+    dump_type: Mapped[str] = mapped_column(primary_key=True)
+    identity: Mapped[str]
+    phase: Mapped[str]
+    records: Mapped[int]
+    last_updated: Mapped[datetime] = mapped_column(server_default=sqlalchemy.sql.functions.now(),
+                                                   onupdate=sqlalchemy.sql.functions.now())
+
+
+class RoleJob(Base):
+    """Representation of a pending change to a member's roles, so role changes survive a restart.
+
+    There is at most one job per member of a guild, a newer change for the same member is merged into it.
+
+    Attributes:
+        guild_snowflake: The snowflake of the guild.
+        member_snowflake: The snowflake of the member.
+        add: The snowflakes of the roles to add.
+        remove: The snowflakes of the roles to remove.
+        revision: How many times the job has been changed, so a worker can tell if it changed while being applied.
+        attempts: How many times applying the job has failed.
+        not_before: When the job may next be tried, if it is waiting to be retried.
+        created: When the job was first queued.
+    """
+    __tablename__ = "role_jobs"
+
+    guild_snowflake: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    member_snowflake: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    add: Mapped[list[int]] = mapped_column(JSON)
+    remove: Mapped[list[int]] = mapped_column(JSON)
+    revision: Mapped[int] = mapped_column(default=0)
+    attempts: Mapped[int] = mapped_column(default=0)
+    not_before: Mapped[Optional[datetime]]
+    created: Mapped[datetime] = mapped_column(server_default=sqlalchemy.sql.functions.now())
+
+
 class UserNames(Base):
     """Representation of a log of every username that someone has gone by that the bot knows about.
 
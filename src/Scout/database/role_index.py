@@ -0,0 +1,120 @@
+"""This contains the in-memory index of the roles that are associated with something in each guild."""
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from Scout.database.models import Guild, Role, Association, role_associations
+
+
+class GuildRoleIndex:
+    """The snowflake of every associated role, keyed by guild snowflake and then by association.
+
+    The index is loaded from the database once, and is then kept up to date by whatever links, unlinks, changes or
+    removes roles, so finding a guild's roles is a dict access instead of a query. Associations are casefolded, the
+    same as they are stored in the database.
+    """
+
+    def __init__(self):
+        self._guilds: dict[int, dict[str, int]] = {}
+        self._role_guilds: dict[int, int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._role_guilds)
+
+    def __contains__(self, role: int) -> bool:
+        return role in self._role_guilds
+
+    def load(self, session: Session):
+        """Loads every associated role from the database, replacing what the index had.
+
+        Args:
+            session: The database session to use.
+        """
+        self._guilds = {}
+        self._role_guilds = {}
+        for guild, association, role in session.execute(
+                select(Guild.snowflake, Association.association, Role.snowflake)
+                .join(Guild, Guild.id == Role.guild_id)
+                .join(role_associations, role_associations.c.role_id == Role.id)
+                .join(Association, Association.id == role_associations.c.association_id)):
+            self.set(guild, association, role)
+
+    def get(self, guild: int, association: str) -> Optional[int]:
+        """Gets the snowflake of the role a guild has for an association, or None if it has none.
+
+        Args:
+            guild: The snowflake of the guild.
+            association: The association.
+        """
+        return self._guilds.get(guild, {}).get(association.casefold(), None)
+
+    def guilds(self) -> list[int]:
+        """Gets the snowflake of every guild that has an associated role."""
+        return list(self._guilds)
+
+    def roles(self, guild: int) -> dict[str, int]:
+        """Gets the snowflake of every associated role in a guild, keyed by association."""
+        return dict(self._guilds.get(guild, {}))
+
+    def with_association(self, association: str) -> list[tuple[int, int]]:
+        """Gets the snowflake of every guild that has a role for an association, along with that role's snowflake."""
+        association = association.casefold()
+        return [(guild, roles[association]) for guild, roles in self._guilds.items() if association in roles]
+
+    def set(self, guild: int, association: str, role: int):
+        """Sets the role a guild has for an association, replacing any role it had.
+
+        Args:
+            guild: The snowflake of the guild.
+            association: The association.
+            role: The snowflake of the role.
+        """
+        self.discard(guild, association)
+        self._guilds.setdefault(guild, {})[association.casefold()] = role
+        self._role_guilds[role] = guild
+
+    def discard(self, guild: int, association: str) -> Optional[int]:
+        """Removes the role a guild has for an association.
+
+        Args:
+            guild: The snowflake of the guild.
+            association: The association.
+
+        Returns:
+            The snowflake of the role that was removed, or None if the guild had none.
+        """
+        roles = self._guilds.get(guild, {})
+        role = roles.pop(association.casefold(), None)
+        if role is not None and role not in roles.values():
+            self._role_guilds.pop(role, None)
+        if not roles:
+            self._guilds.pop(guild, None)
+        return role
+
+    def remove_role(self, role: int):
+        """Removes a role from every association it has."""
+        guild = self._role_guilds.pop(role, None)
+        if guild is None:
+            return
+        roles = self._guilds[guild]
+        for association in [association for association, snowflake in roles.items() if snowflake == role]:
+            del roles[association]
+        if not roles:
+            del self._guilds[guild]
+
+    def replace_role(self, old: int, new: int):
+        """Moves every association of a role to another role of the same guild."""
+        guild = self._role_guilds.pop(old, None)
+        if guild is None:
+            return
+        roles = self._guilds[guild]
+        for association, snowflake in roles.items():
+            if snowflake == old:
+                roles[association] = new
+        self._role_guilds[new] = guild
+
+    def remove_guild(self, guild: int):
+        """Removes every role of a guild."""
+        for role in self._guilds.pop(guild, {}).values():
+            self._role_guilds.pop(role, None)
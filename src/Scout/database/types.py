@@ -0,0 +1,95 @@
+"""This contains the custom column types for Scout's database."""
+import json
+import zlib
+from typing import Any, Optional
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_PLAIN = b"j"
+_ZLIB = b"z"
+_ZSTD = b"s"
+
+_compression = "zlib"
+
+
+def set_compression(compression: str):
+    """Sets how new values are compressed, this does not affect reading values already stored.
+
+    Args:
+        compression: Either "none", "zlib" or "zstd". zstd needs the zstandard package to be installed.
+
+    Raises:
+        ValueError: The compression is unknown, or zstd was asked for and zstandard is not installed.
+    """
+    global _compression
+    compression = compression.casefold()
+    if compression not in ("none", "zlib", "zstd"):
+        raise ValueError("Unknown compression {}, use none, zlib or zstd".format(compression))
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package, install Scout[zstd]")
+    _compression = compression
+
+
+def encode(value: Any) -> bytes:
+    """Serializes a value to JSON and compresses it with the configured compression.
+
+    The first byte of the result says how it was compressed, so values written with any compression can be read back.
+    """
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+    match _compression:
+        case "zlib":
+            return _ZLIB + zlib.compress(data, ZLIB_LEVEL)
+        case "zstd":
+            return _ZSTD + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        case _:
+            return _PLAIN + data
+
+
+def decode(value: bytes | str) -> Any:
+    """Decompresses and deserializes a value made by encode.
+
+    Plain JSON without a header, as stored before compression was added, is also accepted.
+    """
+    if isinstance(value, str):
+        return json.loads(value)
+    value = bytes(value)
+    match value[:1]:
+        case b"z":
+            return json.loads(zlib.decompress(value[1:]))
+        case b"s":
+            if zstandard is None:
+                raise ValueError("This value is compressed with zstd, but the zstandard package is not installed")
+            return json.loads(zstandard.ZstdDecompressor().decompress(value[1:]))
+        case b"j":
+            return json.loads(value[1:])
+        case _:
+            return json.loads(value)
+
+
+class CompressedJSON(TypeDecorator):
+    """A JSON column that is stored as compressed binary.
+
+    Values are serialized to JSON and compressed when written, and decompressed when read. The compression used for
+    new values is set with set_compression.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return encode(value)
+
+    def process_result_value(self, value: Optional[bytes | str], dialect) -> Any:
+        if value is None:
+            return None
+        return decode(value)
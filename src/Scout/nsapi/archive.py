@@ -0,0 +1,352 @@
+"""
+This module contains the archive of columnar snapshots of the nation data dump.
+"""
+import datetime
+import json
+import os
+import shutil
+from collections.abc import Iterable
+from typing import Any, Optional
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .constants import ARCHIVE_CENSUS_SCALES
+
+SNAPSHOT_VERSION = 1
+_DATE_FORMAT = "%Y-%m-%d"
+
+
+def _strings(values: Iterable[str]) -> "numpy.ndarray":
+    # A string table is a sorted array of fixed width UTF-8, so it can be searched and compared without Python loops.
+    encoded = [value.encode() for value in values]
+    width = max((len(value) for value in encoded), default=1) or 1
+    return numpy.array(encoded, dtype="S{}".format(width))
+
+
+def _count(value: Any) -> int:
+    if isinstance(value, list):
+        return len(value)
+    if isinstance(value, str):
+        return len([item for item in value.split(",") if item])
+    return 0
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _census(value: Any) -> dict[int, float]:
+    # Dump records have a SCALE element per census, a single one is not wrapped in a list.
+    if not isinstance(value, dict):
+        return {}
+    scales = value.get("SCALE", [])
+    if isinstance(scales, dict):
+        scales = [scales]
+    census = {}
+    for scale in scales:
+        try:
+            census[int(scale["@id"])] = float(scale["SCORE"])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return census
+
+
+class Snapshot:
+    """A columnar snapshot of the nation data dump on one day.
+
+    Every column is a NumPy array that is memory-mapped from disk, so opening a snapshot is cheap and only the parts
+    that are used are read. Row i of every column belongs to the nation at names[i].
+
+    Attributes:
+        date: The day the snapshot was taken.
+        names: The casefolded names of the nations, sorted.
+        regions: The casefolded names of the regions, sorted.
+        region: The index in regions of the region each nation is in.
+        wa_member: If each nation is in the World Assembly.
+        endorsements: The amount of endorsements each nation has.
+        last_login: When each nation last logged in, as a Unix timestamp.
+        census_scales: The ids of the census scales that were kept.
+        census: The census scores of each nation, with a column per scale in census_scales. Missing scores are NaN.
+    """
+    date: datetime.date
+    names: "numpy.ndarray"
+    regions: "numpy.ndarray"
+    region: "numpy.ndarray"
+    wa_member: "numpy.ndarray"
+    endorsements: "numpy.ndarray"
+    last_login: "numpy.ndarray"
+    census_scales: "numpy.ndarray"
+    census: "numpy.ndarray"
+
+    columns = ("names", "regions", "region", "wa_member", "endorsements", "last_login", "census_scales", "census")
+
+    def __init__(self, date: datetime.date, **columns: "numpy.ndarray"):
+        self.date = date
+        for column in self.columns:
+            setattr(self, column, columns[column])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def load(cls, path: str) -> "Snapshot":
+        """Opens a snapshot written by SnapshotWriter.
+
+        Args:
+            path: The directory of the snapshot.
+        """
+        with open(os.path.join(path, "meta.json"), 'r') as meta_file:
+            meta = json.load(meta_file)
+        return cls(datetime.datetime.strptime(meta["date"], _DATE_FORMAT).date(),
+                   **{column: numpy.load(os.path.join(path, "{}.npy".format(column)), mmap_mode="r")
+                      for column in cls.columns})
+
+    def find(self, name: str) -> Optional[int]:
+        """Gets the row of a nation, or None if it is not in the snapshot.
+
+        Args:
+            name: The name of the nation, this is case-insensitive.
+        """
+        key = name.casefold().encode()
+        row = int(numpy.searchsorted(self.names, key))
+        if row < len(self.names) and self.names[row] == key:
+            return row
+        return None
+
+    def region_names(self, rows: Optional["numpy.ndarray"] = None) -> "numpy.ndarray":
+        """Gets the name of the region of every nation, or of the nations in the given rows."""
+        return self.regions[self.region if rows is None else self.region[rows]]
+
+
+class SnapshotChanges:
+    """The changes between two snapshots of the nation data dump.
+
+    Attributes:
+        old: The older snapshot.
+        new: The newer snapshot.
+        added: The names of the nations that are only in the newer snapshot.
+        removed: The names of the nations that are only in the older snapshot.
+        common: The names of the nations in both snapshots.
+        moved: The names of the nations in both snapshots that are in a different region in the newer one.
+        moved_from: The region each of the moved nations was in.
+        moved_to: The region each of the moved nations is in now.
+        endorsements: The change in endorsements of every nation in common.
+        census_scales: The census scales that are in both snapshots.
+        census: The change in census score of every nation in common, with a column per scale in census_scales.
+    """
+
+    def __init__(self, old: Snapshot, new: Snapshot):
+        self.old = old
+        self.new = new
+        self.common, old_rows, new_rows = numpy.intersect1d(old.names, new.names, assume_unique=True,
+                                                            return_indices=True)
+        self.added = numpy.setdiff1d(new.names, old.names, assume_unique=True)
+        self.removed = numpy.setdiff1d(old.names, new.names, assume_unique=True)
+
+        old_regions, new_regions = old.region_names(old_rows), new.region_names(new_rows)
+        moved = old_regions != new_regions
+        self.moved = self.common[moved]
+        self.moved_from = old_regions[moved]
+        self.moved_to = new_regions[moved]
+
+        self.endorsements = (new.endorsements[new_rows].astype(numpy.int64)
+                             - old.endorsements[old_rows].astype(numpy.int64))
+        self.census_scales, old_scales, new_scales = numpy.intersect1d(old.census_scales, new.census_scales,
+                                                                       return_indices=True)
+        self.census = new.census[new_rows][:, new_scales] - old.census[old_rows][:, old_scales]
+
+    def region(self, region_name: str) -> tuple["numpy.ndarray", "numpy.ndarray"]:
+        """Gets the nations that moved into and out of a region.
+
+        Args:
+            region_name: The name of the region, this is case-insensitive.
+
+        Returns:
+            The names of the nations that arrived and the names of the nations that left.
+        """
+        key = region_name.casefold().encode()
+        return self.moved[self.moved_to == key], self.moved[self.moved_from == key]
+
+
+class SnapshotWriter:
+    """Turns the records of a nation data dump into a snapshot.
+
+    The records are given in batches with add, and finish sorts them by name and writes every column to disk. The
+    snapshot is written to a temporary directory and renamed into place, so a snapshot is never left half written.
+
+    Attributes:
+        path: The directory the snapshot is written to.
+        date: The day the snapshot was taken.
+        census_scales: The ids of the census scales to keep.
+    """
+    path: str
+    date: datetime.date
+    census_scales: tuple[int, ...]
+
+    def __init__(self, path: str, date: datetime.date, census_scales: Iterable[int] = ARCHIVE_CENSUS_SCALES):
+        self.path = path
+        self.date = date
+        self.census_scales = tuple(census_scales)
+        self._names: list[str] = []
+        self._regions: list[str] = []
+        self._wa_member: list[bool] = []
+        self._endorsements: list[int] = []
+        self._last_login: list[int] = []
+        self._census: list[list[float]] = []
+
+    def add(self, records: list[dict[str, Any]]):
+        """Adds a batch of records from the nation data dump.
+
+        Args:
+            records: The records, as given by the data dump client.
+        """
+        for record in records:
+            self._names.append(record["NAME"].casefold())
+            self._regions.append((record.get("REGION", None) or "").casefold())
+            self._wa_member.append(record.get("UNSTATUS", None) not in (None, "Non-member"))
+            self._endorsements.append(_count(record.get("ENDORSEMENTS", None)))
+            self._last_login.append(_int(record.get("LASTLOGIN", None)))
+            census = _census(record.get("CENSUS", None))
+            self._census.append([census.get(scale, numpy.nan) for scale in self.census_scales])
+
+    def finish(self) -> Snapshot:
+        """Writes the snapshot to disk.
+
+        Returns:
+            The written snapshot, opened from disk.
+        """
+        names = _strings(self._names)
+        order = numpy.argsort(names, kind="stable")
+        regions = _strings(sorted(set(self._regions)))
+        columns = {
+            "names": names[order],
+            "regions": regions,
+            "region": numpy.searchsorted(regions, _strings(self._regions)).astype(numpy.int32)[order],
+            "wa_member": numpy.array(self._wa_member, dtype=numpy.bool_)[order],
+            "endorsements": numpy.array(self._endorsements, dtype=numpy.int32)[order],
+            "last_login": numpy.array(self._last_login, dtype=numpy.int64)[order],
+            "census_scales": numpy.array(self.census_scales, dtype=numpy.int16),
+            "census": numpy.array(self._census, dtype=numpy.float32).reshape(len(names), len(self.census_scales))[order],
+        }
+
+        path_tmp = "{}.tmp".format(self.path)
+        shutil.rmtree(path_tmp, ignore_errors=True)
+        os.makedirs(path_tmp)
+        for column, values in columns.items():
+            numpy.save(os.path.join(path_tmp, "{}.npy".format(column)), values)
+        with open(os.path.join(path_tmp, "meta.json"), 'w') as meta:
+            json.dump({"version": SNAPSHOT_VERSION, "date": self.date.strftime(_DATE_FORMAT), "nations": len(names)},
+                      meta)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(path_tmp, self.path)
+        return Snapshot.load(self.path)
+
+
+class DumpArchive:
+    """Keeps a snapshot of the nation data dump for every day, for as many days as the retention allows.
+
+    Each snapshot holds the nations' names and regions as string tables, and their numeric fields as NumPy arrays,
+    which take up far less space than the dumps themselves and can be compared without parsing any XML.
+
+    Attributes:
+        directory: The directory the snapshots are kept in, with a directory per day.
+        retention_days: How many days of snapshots are kept.
+    """
+    directory: str
+    retention_days: int
+
+    def __init__(self, directory: str, retention_days: int):
+        """Initializes the archive.
+
+        Raises:
+            ValueError: numpy is not installed.
+        """
+        if numpy is None:
+            raise ValueError("The dump archive needs the numpy package, install Scout[archive]")
+        self.directory = directory
+        self.retention_days = retention_days
+
+    def _path(self, date: datetime.date) -> str:
+        return os.path.join(self.directory, date.strftime(_DATE_FORMAT))
+
+    def dates(self) -> list[datetime.date]:
+        """Gets the days that there is a snapshot for, oldest first."""
+        try:
+            entries = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        dates = []
+        for entry in entries:
+            try:
+                date = datetime.datetime.strptime(entry, _DATE_FORMAT).date()
+            except ValueError:
+                continue
+            if os.path.exists(os.path.join(self.directory, entry, "meta.json")):
+                dates.append(date)
+        return sorted(dates)
+
+    def has(self, date: datetime.date) -> bool:
+        """Checks if there is a snapshot for the given day."""
+        return os.path.exists(os.path.join(self._path(date), "meta.json"))
+
+    def writer(self, date: datetime.date) -> SnapshotWriter:
+        """Makes a writer for the snapshot of the given day, replacing any snapshot already taken that day."""
+        os.makedirs(self.directory, exist_ok=True)
+        return SnapshotWriter(self._path(date), date)
+
+    def get(self, date: datetime.date) -> Optional[Snapshot]:
+        """Opens the snapshot of the given day, or the closest one before it.
+
+        Args:
+            date: The day to get the snapshot of.
+
+        Returns:
+            The snapshot, or None if there are no snapshots that old.
+        """
+        dates = [snapshot_date for snapshot_date in self.dates() if snapshot_date <= date]
+        if not dates:
+            return None
+        return Snapshot.load(self._path(dates[-1]))
+
+    def changes_since(self, days: int) -> Optional[SnapshotChanges]:
+        """Compares the newest snapshot with the one from the given amount of days before it.
+
+        Args:
+            days: How many days to look back.
+
+        Returns:
+            The changes, or None if there are not two snapshots to compare.
+        """
+        dates = self.dates()
+        if not dates:
+            return None
+        old = self.get(dates[-1] - datetime.timedelta(days=days))
+        if old is None or old.date == dates[-1]:
+            return None
+        return SnapshotChanges(old, Snapshot.load(self._path(dates[-1])))
+
+    def prune(self, today: Optional[datetime.date] = None) -> int:
+        """Removes the snapshots that are older than the retention allows.
+
+        Args:
+            today: The day to count from, defaults to the newest snapshot.
+
+        Returns:
+            The amount of snapshots removed.
+        """
+        dates = self.dates()
+        if not dates:
+            return 0
+        cutoff = (today or dates[-1]) - datetime.timedelta(days=self.retention_days)
+        removed = 0
+        for date in dates:
+            if date < cutoff:
+                shutil.rmtree(self._path(date), ignore_errors=True)
+                removed += 1
+        return removed
@@ -0,0 +1,140 @@
+"""
+This module contains the response cache for the NationStates API.
+"""
+import asyncio
+import copy
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional, Any
+
+from .constants import CACHE_DEFAULT_TTL, CACHE_SHARD_TTLS, CACHE_MAX_ENTRIES
+
+
+def canonicalize(name: str) -> str:
+    """Turns a nation or region name into the canonical form NationStates uses."""
+    return name.strip().casefold().replace(" ", "_")
+
+
+class ResponseCache:
+    """A two-tier cache for parsed NationStates API responses.
+
+    Responses are keyed on the kind of request, the canonical name and the sorted set of shards requested. Recently used
+    responses are kept in an in-memory LRU, and if a path is given they are also kept in a SQLite database so that they
+    survive restarts.
+
+    Responses are copied into and out of the cache, so callers are free to modify what they are given.
+
+    Attributes:
+        max_entries: The maximum amount of responses kept in memory.
+        path: The path to the SQLite database for the disk tier, if there is one.
+        default_ttl: How long, in seconds, a response is kept when no shard specific TTL applies.
+        shard_ttls: How long, in seconds, a response with a given shard is kept. The shortest TTL of the requested
+            shards is used.
+        hits: The amount of requests served from memory.
+        disk_hits: The amount of requests served from disk.
+        misses: The amount of requests that were not cached.
+    """
+    max_entries: int
+    path: Optional[str]
+    default_ttl: float
+    shard_ttls: dict[str, float]
+
+    def __init__(self, *, max_entries: int = CACHE_MAX_ENTRIES, path: Optional[str] = None,
+                 default_ttl: float = CACHE_DEFAULT_TTL, shard_ttls: Optional[dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.default_ttl = default_ttl
+        self.shard_ttls = CACHE_SHARD_TTLS if shard_ttls is None else shard_ttls
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @staticmethod
+    def key(kind: str, name: str, shards: Optional[list[str]]) -> str:
+        return "{}:{}:{}".format(kind, canonicalize(name), "+".join(sorted({s.casefold() for s in shards or []})))
+
+    def ttl(self, shards: Optional[list[str]]) -> float:
+        if not shards:
+            return self.default_ttl
+        return min(self.shard_ttls.get(shard.casefold(), self.default_ttl) for shard in shards)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "entries": len(self._memory)}
+
+    def _disk(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                                     "(key TEXT PRIMARY KEY, expires REAL, value TEXT)")
+        return self._connection
+
+    def _disk_get(self, key: str) -> Optional[tuple[float, Any]]:
+        row = self._disk().execute("SELECT expires, value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[0] <= time.time():
+            with self._disk() as connection:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_set(self, key: str, expires: float, value: str):
+        with self._disk() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, expires, value))
+
+    def _remember(self, key: str, expires: float, value: Any):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, kind: str, name: str, shards: Optional[list[str]]) -> Optional[Any]:
+        """Gets a cached response.
+
+        Args:
+            kind: The kind of request, such as "nation" or "region".
+            name: The name of the nation or region.
+            shards: The shards that were requested.
+
+        Returns:
+            The cached response, or None if there is no fresh response cached.
+        """
+        key = self.key(kind, name, shards)
+        if (entry := self._memory.get(key, None)) is not None:
+            if entry[0] > time.time():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            del self._memory[key]
+
+        if self.path is not None and (entry := await asyncio.to_thread(self._disk_get, key)) is not None:
+            self._remember(key, *entry)
+            self.disk_hits += 1
+            return copy.deepcopy(entry[1])
+
+        self.misses += 1
+        return None
+
+    async def set(self, kind: str, name: str, shards: Optional[list[str]], value: Any):
+        """Caches a response.
+
+        Args:
+            kind: The kind of request, such as "nation" or "region".
+            name: The name of the nation or region.
+            shards: The shards that were requested.
+            value: The parsed response.
+        """
+        key = self.key(kind, name, shards)
+        expires = time.time() + self.ttl(shards)
+        self._remember(key, expires, copy.deepcopy(value))
+        if self.path is not None:
+            await asyncio.to_thread(self._disk_set, key, expires, json.dumps(value))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
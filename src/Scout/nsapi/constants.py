@@ -1,2 +1,36 @@
 BASE_REQUESTS_AMOUNT = 50
 BASE_TIME_PERIOD = 30
+MAX_RETRIES = 5
+BATCH_CONCURRENCY = 10
+PARSE_WORKERS = 2
+RETRY_BACKOFF_BASE = 1
+RETRY_BACKOFF_MAX = 30
+DUMP_CHUNK_SIZE = 64 * 1024
+DUMP_BATCH_SIZE = 1000
+DUMP_QUEUE_SIZE = 4
+DUMP_PARSED_SIZE_RATIO = 7
+ARCHIVE_CENSUS_SCALES = (0, 1, 2, 65, 66, 80)  # Civil Rights, Economy, Political Freedom, Influence, Endorsements, Residency
+NATION_DUMP_PATH = [("NATIONS", None), ("NATION", None)]
+REGION_DUMP_PATH = [("REGIONS", None), ("REGION", None)]
+CACHE_MAX_ENTRIES = 1024
+CACHE_DEFAULT_TTL = 5 * 60
+CACHE_SHARD_TTLS = {
+    "name": 24 * 60 * 60,
+    "fullname": 24 * 60 * 60,
+    "type": 24 * 60 * 60,
+    "flag": 60 * 60,
+    "motto": 60 * 60,
+    "founder": 24 * 60 * 60,
+    "founded": 24 * 60 * 60,
+    "foundedtime": 24 * 60 * 60,
+    "firstlogin": 24 * 60 * 60,
+    "embassies": 60 * 60,
+    "census": 60 * 60,
+    "region": 5 * 60,
+    "wa": 5 * 60,
+    "unstatus": 5 * 60,
+    "endorsements": 2 * 60,
+    "delegate": 5 * 60,
+    "numnations": 5 * 60,
+    "nations": 5 * 60,
+}
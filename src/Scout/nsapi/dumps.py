@@ -0,0 +1,323 @@
+"""
+This module contains the bookkeeping for the NationStates daily data dumps.
+"""
+import gzip
+import html
+import json
+import mmap
+import os
+import sqlite3
+import tempfile
+from collections.abc import Iterator
+from typing import Optional, Any
+from xml.etree import ElementTree
+
+from .parsing import element_to_dict
+
+INDEX_CHUNK_SIZE = 1024 * 1024
+
+
+class DumpManifest:
+    """Keeps track of the data dumps that have been downloaded, and what state they are in.
+
+    The manifest is stored as a small JSON file next to the dumps and records the ETag, Last-Modified and size of each
+    dump so that unchanged dumps can be skipped with a conditional request, and so interrupted downloads can be
+    resumed with a Range request.
+
+    Attributes:
+        path: The path of the manifest file.
+        entries: The manifest entries, keyed by dump type.
+    """
+    path: str
+    entries: dict[str, dict[str, Any]]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+
+    def load(self) -> "DumpManifest":
+        """Loads the manifest from disk, if it exists.
+
+        Returns:
+            The manifest itself.
+        """
+        try:
+            with open(self.path, 'r') as manifest:
+                self.entries = json.load(manifest)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+        return self
+
+    def dumps(self) -> str:
+        """Serializes the manifest, so it can be written without the entries changing while they are written."""
+        return json.dumps(self.entries, indent=2)
+
+    def write(self, contents: str):
+        """Writes a serialized manifest to disk.
+
+        The manifest is written to a temporary file of its own and renamed into place, so a crash never leaves a
+        corrupt manifest and writes from several threads never share a temporary file.
+
+        Args:
+            contents: The manifest, as serialized by dumps.
+        """
+        directory, name = os.path.split(os.path.abspath(self.path))
+        descriptor, temporary_path = tempfile.mkstemp(prefix="{}.".format(name), suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(descriptor, 'w') as manifest:
+                manifest.write(contents)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    def save(self):
+        """Writes the manifest to disk."""
+        self.write(self.dumps())
+
+    def get(self, dump_type: str) -> dict[str, Any]:
+        return self.entries.setdefault(dump_type, {})
+
+    def validators(self, dump_type: str, *, partial: bool = False) -> tuple[Optional[str], Optional[str]]:
+        """Gets the ETag and Last-Modified values for a dump.
+
+        Args:
+            dump_type: The dump to get the values for.
+            partial: If set, the values for the partially downloaded dump are returned instead.
+        """
+        entry = self.get(dump_type).get("partial", {}) if partial else self.get(dump_type)
+        return entry.get("etag", None), entry.get("last_modified", None)
+
+    def start_download(self, dump_type: str, etag: Optional[str], last_modified: Optional[str]):
+        """Records the validators of a download that has been started, so it can be resumed later."""
+        self.get(dump_type)["partial"] = {"etag": etag, "last_modified": last_modified}
+
+    def finish_download(self, dump_type: str, size: int):
+        """Records a finished download, replacing the previous entry for the dump."""
+        partial = self.get(dump_type).get("partial", {})
+        self.entries[dump_type] = {"etag": partial.get("etag", None),
+                                   "last_modified": partial.get("last_modified", None),
+                                   "size": size,
+                                   "ingested": False}
+
+    def is_ingested(self, dump_type: str) -> bool:
+        return self.get(dump_type).get("ingested", False)
+
+    def mark_ingested(self, dump_type: str):
+        self.get(dump_type)["ingested"] = True
+
+
+def dump_identity(dump_file: str) -> Optional[str]:
+    """Identifies the version of a data dump on disk by its size and modification time."""
+    try:
+        stat = os.stat(dump_file)
+    except FileNotFoundError:
+        return None
+    return "{}:{}".format(stat.st_size, stat.st_mtime_ns)
+
+
+def scan_records(chunks: Iterator[bytes], record_tag: str) -> Iterator[tuple[str, int, int]]:
+    """Finds the records in a stream of decompressed dump data.
+
+    Args:
+        chunks: The decompressed dump, in chunks.
+        record_tag: The tag of the records, either NATION or REGION.
+
+    Returns:
+        An iterator of the casefolded record name, the offset of the record, and the length of the record.
+    """
+    start_tag = "<{}>".format(record_tag).encode()
+    end_tag = "</{}>".format(record_tag).encode()
+    buffer = b""
+    buffer_offset = 0
+
+    for chunk in chunks:
+        buffer += chunk
+        position = 0
+        while (start := buffer.find(start_tag, position)) != -1:
+            end = buffer.find(end_tag, start)
+            if end == -1:
+                break
+            end += len(end_tag)
+            name_start = buffer.find(b"<NAME>", start, end) + len(b"<NAME>")
+            name_end = buffer.find(b"</NAME>", name_start, end)
+            name = html.unescape(buffer[name_start:name_end].decode("utf-8")).casefold()
+            yield name, buffer_offset + start, end - start
+            position = end
+
+        keep = start if start != -1 else max(position, len(buffer) - len(start_tag) + 1)
+        buffer_offset += keep
+        buffer = buffer[keep:]
+
+
+class DumpIndex:
+    """An on-disk index of the records in a data dump.
+
+    The dump is decompressed once into a plain XML file that is memory-mapped, and a small SQLite database maps every
+    record's casefolded name to its offset and length within that file. This lets a single record be found without
+    parsing the dump from the beginning.
+
+    Attributes:
+        dump_file: The path of the gzipped data dump the index was built from.
+        record_tag: The tag of the records in the dump.
+    """
+    dump_file: str
+    record_tag: str
+
+    def __init__(self, dump_file: str, record_tag: str):
+        self.dump_file = dump_file
+        self.record_tag = record_tag
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data: Optional[mmap.mmap] = None
+
+    @property
+    def data_file(self) -> str:
+        return self.dump_file.removesuffix(".gz")
+
+    @property
+    def index_file(self) -> str:
+        return "{}.idx".format(self.data_file)
+
+    def build(self) -> int:
+        """Builds the index for the data dump, replacing any existing index.
+
+        Returns:
+            The amount of records in the index.
+        """
+        self.close()
+        identity = dump_identity(self.dump_file)
+        data_tmp = "{}.tmp".format(self.data_file)
+        index_tmp = "{}.tmp".format(self.index_file)
+        if os.path.exists(index_tmp):
+            os.remove(index_tmp)
+
+        def decompress(dump, data) -> Iterator[bytes]:
+            while chunk := dump.read(INDEX_CHUNK_SIZE):
+                data.write(chunk)
+                yield chunk
+
+        connection = sqlite3.connect(index_tmp)
+        try:
+            connection.execute("CREATE TABLE records (name TEXT PRIMARY KEY, offset INTEGER, length INTEGER)")
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            with gzip.open(self.dump_file) as dump, open(data_tmp, 'wb') as data:
+                connection.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?)",
+                                       scan_records(decompress(dump, data), self.record_tag))
+            connection.execute("INSERT INTO meta VALUES ('identity', ?)", (identity,))
+            count = connection.execute("SELECT count(*) FROM records").fetchone()[0]
+            connection.commit()
+        finally:
+            connection.close()
+
+        os.replace(data_tmp, self.data_file)
+        os.replace(index_tmp, self.index_file)
+        return count
+
+    def is_current(self) -> bool:
+        """Checks if the index exists and was built from the data dump currently on disk."""
+        # An index that has been rebuilt since it was opened is reopened once before giving up.
+        for _ in range(2):
+            if self._connection is None and not self._open():
+                return False
+            identity = self._connection.execute("SELECT value FROM meta WHERE key = 'identity'").fetchone()
+            if identity is not None and identity[0] == dump_identity(self.dump_file):
+                return True
+            self.close()
+        return False
+
+    def _open(self) -> bool:
+        try:
+            self._connection = sqlite3.connect("file:{}?mode=ro".format(self.index_file), uri=True,
+                                               check_same_thread=False)
+            with open(self.data_file, 'rb') as data:
+                self._data = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+        except (sqlite3.Error, FileNotFoundError, ValueError):
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    def get(self, name: str) -> Optional[bytes]:
+        """Gets the raw XML of a record in the dump.
+
+        Args:
+            name: The name of the record, this is case-insensitive.
+        """
+        row = self._connection.execute("SELECT offset, length FROM records WHERE name = ?",
+                                       (name.casefold(),)).fetchone()
+        if row is None:
+            return None
+        return self._data[row[0]:row[0] + row[1]]
+
+    def contains(self, name: str) -> bool:
+        """Checks if a record is in the dump.
+
+        Args:
+            name: The name of the record, this is case-insensitive.
+        """
+        return self._connection.execute("SELECT 1 FROM records WHERE name = ?", (name.casefold(),)).fetchone() is not None
+
+    def count(self) -> Optional[int]:
+        """Gets the amount of records in the dump, or None if the index is not current."""
+        if not self.is_current():
+            return None
+        return self._connection.execute("SELECT count(*) FROM records").fetchone()[0]
+
+    def batch_ranges(self, batch_size: int, max_bytes: Optional[int] = None) -> Iterator[tuple[int, int]]:
+        """Splits the decompressed dump into ranges that each hold a batch of whole records.
+
+        Args:
+            batch_size: The most records in each range.
+            max_bytes: If given, a range is also ended before it grows past this many bytes of XML. A range always
+                holds at least one record.
+
+        Returns:
+            An iterator of the start and end offset of each range, in the order they appear in the dump.
+        """
+        rows = self._connection.execute("SELECT offset, length FROM records ORDER BY offset")
+        start = end = None
+        count = 0
+        for offset, length in rows:
+            if start is not None and (count >= batch_size or
+                                      (max_bytes is not None and offset + length - start > max_bytes)):
+                yield start, end
+                start = None
+            if start is None:
+                start, count = offset, 0
+            end = offset + length
+            count += 1
+        if start is not None:
+            yield start, end
+
+    def names(self) -> Iterator[str]:
+        """Iterates over the casefolded names of every record in the dump."""
+        for (name,) in self._connection.execute("SELECT name FROM records"):
+            yield name
+
+
+def parse_records(data_file: str, start: int, end: int, record_tag: str) -> list[dict[str, Any]]:
+    """Parses the records in a range of a decompressed dump.
+
+    This is run in worker processes, so it only takes and returns picklable values.
+
+    Args:
+        data_file: The path of the decompressed dump.
+        start: The offset of the first record in the range.
+        end: The offset just past the last record in the range.
+        record_tag: The tag of the records, either NATION or REGION.
+
+    Returns:
+        The records, in the same layout xmltodict gives.
+    """
+    with open(data_file, 'rb') as data:
+        data.seek(start)
+        records = data.read(end - start)
+    root = ElementTree.fromstring(b"<RECORDS>" + records + b"</RECORDS>")
+    return [element_to_dict(record) for record in root if record.tag == record_tag]
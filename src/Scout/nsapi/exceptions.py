@@ -0,0 +1,19 @@
+class NSAPIError(Exception):
+    """
+    This represents all errors that can occur when talking to the NationStates API.
+    """
+    pass
+
+
+class RateLimited(NSAPIError):
+    """
+    This is raised when a request is still rate limited after being retried as many times as allowed.
+    """
+    pass
+
+
+class NotFound(NSAPIError):
+    """
+    This is raised when the nation or region requested does not exist.
+    """
+    pass
@@ -1,17 +1,27 @@
 import asyncio
+import functools
 import gzip
+import multiprocessing
+import os
+import threading
 import urllib.parse
 import typing
-from collections import OrderedDict
-from collections.abc import Callable
+from collections import OrderedDict, deque
+from collections.abc import Callable, AsyncIterator, Hashable, Iterable, Awaitable
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from typing import Optional, Literal, Any
 
 import aiohttp
-import aiolimiter
 import xmltodict
 
 import Scout
 from .constants import *
+from .cache import ResponseCache
+from .dumps import DumpManifest, DumpIndex, parse_records
+from .exceptions import RateLimited, NotFound
+from .parsing import parse_response, estimated_size
+from .ratelimit import RateLimiter
+from .scheduler import Priority, RequestScheduler
 
 
 def create_user_agent(contact_info: str, nation: str, region: Optional[str] = None) -> str:
@@ -29,11 +39,12 @@ def create_user_agent(contact_info: str, nation: str, region: Optional[str] = No
 
 class NS_API_Client(typing.Protocol):
     async def get_nation(self, nation: str, shards: Optional[list[str]],
-                         *, checksum: Optional[str] = None, user_agent: Optional[str] = None) -> OrderedDict[str, Any] | Any:
+                         *, checksum: Optional[str] = None, user_agent: Optional[str] = None,
+                         priority: Optional[Priority] = None) -> OrderedDict[str, Any] | Any:
         pass
 
-    async def get_region(self, region: str, shards: Optional[list[str]], *, user_agent: Optional[str] = None
-                         ) -> OrderedDict[str, Any] | Any:
+    async def get_region(self, region: str, shards: Optional[list[str]], *, user_agent: Optional[str] = None,
+                         priority: Priority = Priority.USER) -> OrderedDict[str, Any] | Any:
         pass
 
 
@@ -42,47 +53,120 @@ class NationStates_Client:
 
     Attributes:
         api_version: The API Version the API Supports. This should not be changed.
+        dump_directory: The directory that daily data dumps are downloaded to.
+        dump_manifest: The manifest of the downloaded daily data dumps. This is loaded on the first dump download, and
+            is shared by every download.
+        cache: The cache used for nation and region lookups, if any. Verification requests are never cached.
+        limiter: The rate limiter all requests go through.
+        scheduler: The scheduler that orders requests waiting on the rate limiter by priority.
+        max_retries: How many times a rate limited request is retried before giving up.
+        batch_concurrency: How many requests a batch fetch keeps queued at once.
     """
-    limiter: aiolimiter
+    limiter: RateLimiter
+    scheduler: RequestScheduler
+    dump_manifest: Optional[DumpManifest]
+    cache: Optional[ResponseCache]
     nationstates_api_url = "https://nationstates.net/cgi-bin/api.cgi?"
+    nationstates_dump_url = "https://nationstates.net/pages/{}.xml.gz"
 
-    def __init__(self, user_agent: str, session: aiohttp.ClientSession):
+    def __init__(self, user_agent: str, session: aiohttp.ClientSession, *, dump_directory: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None):
         self.api_version = 12
-        self.limiter = aiolimiter.AsyncLimiter(BASE_REQUESTS_AMOUNT, BASE_TIME_PERIOD)
+        self.cache = cache
+        self.limiter = RateLimiter(BASE_REQUESTS_AMOUNT, BASE_TIME_PERIOD)
+        self.scheduler = RequestScheduler(self.limiter)
+        self.max_retries = MAX_RETRIES
+        self.batch_concurrency = BATCH_CONCURRENCY
         self.headers = {'User-Agent': user_agent}
+        self.dump_directory = dump_directory if dump_directory else "."
+        self.dump_manifest = None
+        self._manifest_lock = asyncio.Lock()
         self._session = session
-
-    async def _make_request(self, url, *, limiter: aiolimiter.AsyncLimiter,
-                            return_raw=False, headers: Optional[dict[str, str]] = None) -> str | aiohttp.ClientResponse:
-        headers = headers if not None else self.headers
-        async with limiter:
+        self._in_flight: dict[tuple[str, Optional[str], Priority], asyncio.Future] = {}
+        self._parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="nsapi-parse")
+
+    def close(self):
+        """Stops the scheduler and the parse workers."""
+        self.scheduler.close()
+        self._parse_executor.shutdown(wait=False)
+
+    async def _make_request(self, url, *, priority: Priority = Priority.USER, requester: Optional[Hashable] = None,
+                            return_raw=False, headers: Optional[dict[str, str]] = None,
+                            root: Optional[str] = None) -> str | aiohttp.ClientResponse | OrderedDict[str, Any] | Any:
+        """Makes a GET request against the API.
+
+        Identical requests made while one is already in flight are not sent again, and instead wait for the request
+        in flight and share its result.
+
+        Args:
+            url: The url to request.
+            priority: The priority class of the request.
+            requester: Who is making the request, used to share the rate limit fairly. Defaults to the user agent.
+            return_raw: If set, the response object is returned and the request is never shared.
+            headers: The headers to use, if not provided the client's headers are used.
+            root: If provided, the response is parsed and the element with this name is returned.
+        """
+        headers = headers if headers is not None else self.headers
+        requester = requester if requester is not None else headers.get("User-Agent", None)
+        if return_raw:
+            return await self._send_request(url, priority=priority, requester=requester, return_raw=True,
+                                            headers=headers)
+
+        # Requests of different priorities are not shared, so an interactive request never waits behind a queued
+        # background one.
+        key = (url, root, priority)
+        if (in_flight := self._in_flight.get(key, None)) is None:
+            in_flight = asyncio.ensure_future(self._send_request(url, priority=priority, requester=requester,
+                                                                 headers=headers, root=root))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(in_flight)
+
+    async def _send_request(self, url, *, priority: Priority, requester: Optional[Hashable], return_raw=False,
+                            headers: dict[str, str],
+                            root: Optional[str] = None) -> str | aiohttp.ClientResponse | OrderedDict[str, Any] | Any:
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire(priority, requester)
             async with self._session.get(url, headers=headers) as api_response:
+                self.limiter.update(api_response.headers)
                 if api_response.status == 429:
-                    return await self._make_request(url, return_raw=return_raw, limiter=limiter)
-
-                try:
-                    limiter.max_rate = int(api_response.headers.get("RateLimit-Policy").split(";")[0])
-                    limiter.time_period = int(api_response.headers.get("RateLimit-Policy").split("=")[1])
-                except AttributeError:
-                    pass
-                return api_response if return_raw else await api_response.text()
+                    # The limiter holds back every request, including the retry, until the server allows it.
+                    self.limiter.back_off(api_response.headers, attempt)
+                    continue
+
+                if return_raw:
+                    return api_response
+                if api_response.status == 404:
+                    raise NotFound("Not found: {}".format(url))
+                response = await api_response.text()
+
+            if root is None:
+                return response
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._parse_executor, parse_response, response, root)
+        raise RateLimited("Still rate limited after {} retries: {}".format(self.max_retries, url))
 
     async def get_nation(self, nation_name: str, shards: Optional[list[str]], *,
-                         checksum: Optional[str] = None, user_agent: Optional[str] = None) -> OrderedDict[str, Any] | Any:
+                         checksum: Optional[str] = None, user_agent: Optional[str] = None,
+                         priority: Optional[Priority] = None) -> OrderedDict[str, Any] | Any:
         headers = {"User-Agent": user_agent} if user_agent is not None else None
+        use_cache = self.cache is not None and checksum is None
+        if use_cache and (cached := await self.cache.get("nation", nation_name, shards)) is not None:
+            return cached
+
         if (shards is not None and "verify" not in shards) or checksum is None:
+            priority = Priority.USER if priority is None else priority
             response = await self._make_request("{}nation={}{}&v={}".format(self.nationstates_api_url,
                                                                             nation_name,
                                                                             "" if shards is None or len(shards) == 0
                                                                             else "&q={}".format("+".join(shards)),
                                                                             self.api_version),
                                                 headers=headers,
-                                                limiter=self.limiter)
+                                                priority=priority,
+                                                root="NATION")
         else:
-            try:
-                shards.remove("verify")
-            except (ValueError, AttributeError):
-                pass
+            if shards is not None:
+                shards = [shard for shard in shards if shard != "verify"]
 
             response = await self._make_request(
                 "{}a=verify&nation={}&checksum={}{}&v={}".format(self.nationstates_api_url,
@@ -92,69 +176,293 @@ class NationStates_Client:
                                                                  else "&q={}".format("+".join(shards)),
                                                                  self.api_version),
                 headers=headers,
-                limiter=self.limiter)
-        return (await asyncio.to_thread(xmltodict.parse,xml_input=response))["NATION"]
-
-    async def get_region(self, region_name: str, shards: Optional[list[str]], *, user_agent: Optional[str] = None) -> OrderedDict[str, Any] | Any:
+                priority=Priority.INTERACTIVE if priority is None else priority,
+                root="NATION")
+        if use_cache:
+            await self.cache.set("nation", nation_name, shards, response)
+        return response
+
+    async def get_region(self, region_name: str, shards: Optional[list[str]], *, user_agent: Optional[str] = None,
+                         priority: Priority = Priority.USER) -> OrderedDict[str, Any] | Any:
         headers = {"User-Agent": user_agent} if user_agent is not None else None
+        if self.cache is not None and (cached := await self.cache.get("region", region_name, shards)) is not None:
+            return cached
+
         response = await self._make_request("{}region={}{}&v={}".format(self.nationstates_api_url,
                                                                         region_name,
                                                                         "" if shards is None or len(shards) == 0
                                                                         else "&q={}".format("+".join(shards)),
                                                                         self.api_version),
                                             headers=headers,
-                                            limiter=self.limiter)
-        return (await asyncio.to_thread(xmltodict.parse, xml_input=response))["REGION"]
+                                            priority=priority,
+                                            root="REGION")
+        if self.cache is not None:
+            await self.cache.set("region", region_name, shards, response)
+        return response
+
+    async def get_nations(self, nation_names: Iterable[str], shards: Optional[list[str]], *,
+                          user_agent: Optional[str] = None, priority: Priority = Priority.BACKGROUND,
+                          concurrency: Optional[int] = None) -> AsyncIterator[tuple[str, OrderedDict[str, Any] | Exception]]:
+        """Gets many nations, yielding each one as soon as it arrives.
+
+        Requests are queued back to back so the batch uses as much of the rate limit as its priority allows. A failed
+        lookup does not stop the batch, and the exception is yielded in place of the nation instead, NotFound if the
+        nation does not exist.
+
+        Args:
+            nation_names: The names of the nations to get.
+            shards: The shards to get for every nation.
+            user_agent: The user agent to use, if not the client's.
+            priority: The priority class of the requests.
+            concurrency: How many requests to keep queued at once, defaults to the client's batch_concurrency.
+
+        Returns:
+            An async iterator of the nation name and either the nation or the exception raised while getting it, in
+            the order they complete.
+        """
+        async for result in self._get_many(functools.partial(self.get_nation, shards=shards, user_agent=user_agent,
+                                                             priority=priority),
+                                           nation_names, concurrency):
+            yield result
+
+    async def get_regions(self, region_names: Iterable[str], shards: Optional[list[str]], *,
+                          user_agent: Optional[str] = None, priority: Priority = Priority.BACKGROUND,
+                          concurrency: Optional[int] = None) -> AsyncIterator[tuple[str, OrderedDict[str, Any] | Exception]]:
+        """Gets many regions, yielding each one as soon as it arrives.
+
+        This works the same as get_nations.
+        """
+        async for result in self._get_many(functools.partial(self.get_region, shards=shards, user_agent=user_agent,
+                                                             priority=priority),
+                                           region_names, concurrency):
+            yield result
+
+    async def _get_many(self, fetch: Callable[[str], Awaitable[Any]], names: Iterable[str],
+                        concurrency: Optional[int]) -> AsyncIterator[tuple[str, Any]]:
+        names = iter(names)
+        concurrency = concurrency if concurrency is not None else self.batch_concurrency
+        results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+        async def worker():
+            # The workers share one iterator, so every name is only taken by a single worker.
+            for name in names:
+                try:
+                    result = await fetch(name)
+                except Exception as e:
+                    result = e
+                await results.put((name, result))
+            await results.put(None)
 
-    async def get_world(self, shards: list[str], *, user_agent: Optional[str]) -> OrderedDict[str, Any] | Any:
+        workers = [asyncio.create_task(worker()) for _ in range(max(concurrency, 1))]
+        try:
+            finished = 0
+            while finished < len(workers):
+                if (result := await results.get()) is None:
+                    finished += 1
+                    continue
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+
+    async def get_world(self, shards: list[str], *, user_agent: Optional[str] = None,
+                        priority: Priority = Priority.USER) -> OrderedDict[str, Any] | Any:
         headers = {"User-Agent": user_agent} if user_agent is not None else None
         response = await self._make_request("{}q={}&v={}".format(self.nationstates_api_url,
                                                                  "+".join(shards),
                                                                  self.api_version),
                                             headers=headers,
-                                            limiter=self.limiter)
-        return await asyncio.to_thread(xmltodict.parse, xml_input=response)["WORLD"]
+                                            priority=priority,
+                                            root="WORLD")
+        return response
 
-    async def get_world_assembly(self, council_id: Literal[1, 2], shards: list[str], *, user_agent: Optional[str]) -> OrderedDict[
-                                                                                            str, Any] | Any:
+    async def get_world_assembly(self, council_id: Literal[1, 2], shards: list[str], *, user_agent: Optional[str] = None,
+                                 priority: Priority = Priority.USER) -> OrderedDict[str, Any] | Any:
         headers = {"User-Agent": user_agent} if user_agent is not None else None
         response = await self._make_request("{}wa={}{}&v={}".format(self.nationstates_api_url,
                                                                     council_id,
                                                                     "&q={}".format("+".join(shards)),
                                                                     self.api_version),
                                             headers=headers,
-                                            limiter=self.limiter)
-        return await asyncio.to_thread(xmltodict.parse, xml_input=response)["WA"]
+                                            priority=priority,
+                                            root="WA")
+        return response
 
-    async def get_verify(self, nation_name: str, code: str, *, user_agent: Optional[str] = None) -> bool:
+    async def get_verify(self, nation_name: str, code: str, *, user_agent: Optional[str] = None,
+                         priority: Priority = Priority.INTERACTIVE) -> bool:
         headers = {"User-Agent": user_agent} if user_agent is not None else None
-        response = await self._make_request("{}a=verify&nation={}&checksum={}".format(self.nationstates_api_url,
-                                                                                      urllib.parse.quote(nation_name), code),
-                                            headers=headers,
-                                            limiter=self.limiter)
+        try:
+            response = await self._make_request("{}a=verify&nation={}&checksum={}".format(
+                self.nationstates_api_url, urllib.parse.quote(nation_name), code), headers=headers, priority=priority)
+        except NotFound:
+            # A nation that does not exist can not be verified.
+            return False
         try:
             return bool(int(response.strip()))
         except (TypeError, ValueError):
             return False
 
-    async def get_daily_dump(self, dump_type: Literal["regions", "nations"], *, user_agent: Optional[str] = None):
-        # TODO: Make this do something better and probably asyncly.
-        headers = {"User-Agent": user_agent} if user_agent is not None else self.headers
-        url = "https://nationstates.net/pages/{}.xml.gz".format(dump_type)
-        async with self.limiter:
-            async with self._session.get(url, headers=headers) as api_response:
-                with open("{}.xml.gz".format(dump_type), 'wb') as compressed_dump:
-                    await asyncio.to_thread(compressed_dump.write, await api_response.read())
+    async def get_daily_dump(self, dump_type: Literal["regions", "nations"], *, user_agent: Optional[str] = None,
+                             progress: Optional[Callable[[int, Optional[int]], Any]] = None) -> bool:
+        """Downloads the daily data dump into the dump directory.
+
+        The dump is streamed to a temporary file in fixed-size chunks and then renamed into place, so memory use does
+        not grow with the size of the dump and a failed download never replaces a good dump.
+
+        If the dump has been downloaded before, a conditional request is made and nothing is downloaded if the dump
+        has not changed. If a previous download was interrupted, it is resumed from where it stopped when possible.
+
+        Args:
+            dump_type: The dump to download, either "regions" or "nations".
+            user_agent: The user agent to use, if not provided the client's user agent is used.
+            progress: A callback that is given the amount of bytes downloaded and the total size (if known) after
+                every chunk.
+
+        Returns:
+            True if a new dump was downloaded, False if the dump on disk is already up to date.
+        """
+        headers = {"User-Agent": user_agent} if user_agent is not None else dict(self.headers)
+        url = self.nationstates_dump_url.format(dump_type)
+        dump_path = os.path.join(self.dump_directory, "{}.xml.gz".format(dump_type))
+        partial_path = "{}.part".format(dump_path)
+
+        manifest = await self.load_dump_manifest()
+
+        etag, last_modified = manifest.validators(dump_type)
+        if await asyncio.to_thread(os.path.exists, dump_path) and (etag or last_modified):
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        partial_etag, partial_last_modified = manifest.validators(dump_type, partial=True)
+        resume_from = 0
+        if await asyncio.to_thread(os.path.exists, partial_path) and (partial_etag or partial_last_modified):
+            resume_from = await asyncio.to_thread(os.path.getsize, partial_path)
+            headers["Range"] = "bytes={}-".format(resume_from)
+            headers["If-Range"] = partial_etag if partial_etag else partial_last_modified
+
+        await self.scheduler.acquire(Priority.BACKGROUND, headers.get("User-Agent", None))
+        async with self._session.get(url, headers=headers) as api_response:
+            if api_response.status == 304:
+                return False
+            if api_response.status == 416:
+                await asyncio.to_thread(os.remove, partial_path)
+                manifest.get(dump_type).pop("partial", None)
+                return await self.get_daily_dump(dump_type, user_agent=user_agent, progress=progress)
+            api_response.raise_for_status()
+
+            if api_response.status != 206:
+                resume_from = 0
+                manifest.start_download(dump_type, api_response.headers.get("ETag", None),
+                                        api_response.headers.get("Last-Modified", None))
+                await self.save_dump_manifest()
+
+            total = None
+            if api_response.content_length is not None:
+                total = resume_from + api_response.content_length
+            downloaded = resume_from
+            compressed_dump = await asyncio.to_thread(open, partial_path, 'ab' if resume_from else 'wb')
+            try:
+                async for chunk in api_response.content.iter_chunked(DUMP_CHUNK_SIZE):
+                    await asyncio.to_thread(compressed_dump.write, chunk)
+                    downloaded += len(chunk)
+                    if progress is not None:
+                        progress(downloaded, total)
+            finally:
+                await asyncio.to_thread(compressed_dump.close)
+
+        await asyncio.to_thread(os.replace, partial_path, dump_path)
+        manifest.finish_download(dump_type, downloaded)
+        await self.save_dump_manifest()
+        return True
+
+    async def load_dump_manifest(self) -> DumpManifest:
+        """Gets the manifest of the daily data dumps, loading it from the dump directory the first time.
+
+        The manifest is only loaded once, so downloads made at the same time all record into the same manifest.
+        """
+        async with self._manifest_lock:
+            if self.dump_manifest is None:
+                await asyncio.to_thread(os.makedirs, self.dump_directory, exist_ok=True)
+                self.dump_manifest = await asyncio.to_thread(DumpManifest(os.path.join(self.dump_directory,
+                                                                                      "dumps.json")).load)
+        return self.dump_manifest
+
+    async def save_dump_manifest(self):
+        """Writes the manifest of the daily data dumps to disk, one save at a time."""
+        manifest = await self.load_dump_manifest()
+        async with self._manifest_lock:
+            await asyncio.to_thread(manifest.write, manifest.dumps())
 
 
 class NationStates_DataDump_Client:
-    # TODO make this actually async.
+    """Represents the NationStates daily data dumps and operations we can take against them.
+
+    Attributes:
+        nation_index: The index for looking up nations in the nation dump.
+        region_index: The index for looking up regions in the region dump.
+        processes: How many worker processes parse the dumps. With more than one, the dumps are split on record
+            boundaries using the index and the parts are parsed in parallel.
+        batch_bytes: If set, batches are also ended once their records are estimated to take up this many bytes of
+            memory, so a dump with unusually large records can not grow a batch past it.
+    """
     region_dump_file = "regions.xml.gz"
     nation_dump_file = "nations.xml.gz"
 
-    async def get_nation(self, nation_name: str, shards: Optional[list[str]],
-                         checksum: Optional[str] = None) -> OrderedDict[str, Any] | Any:
-        # TODO: Respect shards
+    def __init__(self, dump_directory: Optional[str] = None, *, processes: int = 1,
+                 batch_bytes: Optional[int] = None):
+        self.processes = processes if processes > 0 else os.cpu_count() or 1
+        self.batch_bytes = batch_bytes
+        if dump_directory:
+            self.region_dump_file = os.path.join(dump_directory, self.region_dump_file)
+            self.nation_dump_file = os.path.join(dump_directory, self.nation_dump_file)
+        self.nation_index = DumpIndex(self.nation_dump_file, "NATION")
+        self.region_index = DumpIndex(self.region_dump_file, "REGION")
+
+    @property
+    def batches_in_flight(self) -> int:
+        """The most batches that are held in memory at once while iterating over a dump.
+
+        This counts the batches parsed ahead of the consumer, the one being parsed and the one the consumer holds.
+        """
+        if self.processes > 1:
+            return self.processes * 2 + 1
+        return DUMP_QUEUE_SIZE + 2
+
+    async def build_indexes(self) -> None:
+        """Builds the lookup indexes for both data dumps.
+
+        This should be done once after every dump download, until then lookups fall back to scanning the dump.
+        """
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(asyncio.to_thread(self.nation_index.build))
+            tg.create_task(asyncio.to_thread(self.region_index.build))
+
+    @staticmethod
+    def _find_indexed(index: DumpIndex, name: str) -> tuple[bool, Optional[bytes]]:
+        if not index.is_current():
+            return False, None
+        return True, index.get(name)
+
+    @staticmethod
+    def _select_shards(record: Optional[OrderedDict[str, Any]], shards: Optional[list[str]]
+                       ) -> Optional[OrderedDict[str, Any]]:
+        if record is None or not shards:
+            return record
+        shards = [shard.upper() for shard in shards]
+        return OrderedDict((key, value) for key, value in record.items() if key in shards)
+
+    async def get_nation(self, nation_name: str, shards: Optional[list[str]], *, checksum: Optional[str] = None,
+                         user_agent: Optional[str] = None, priority: Optional[Priority] = None
+                         ) -> OrderedDict[str, Any] | Any:
+        indexed, record = await asyncio.to_thread(self._find_indexed, self.nation_index, nation_name)
+        if indexed:
+            if record is None:
+                return None
+            nation = await asyncio.to_thread(xmltodict.parse, record)
+            return self._select_shards(nation["NATION"], shards)
+
         nation_requested = None
 
         def find_nation(_, nation):
@@ -168,16 +476,17 @@ class NationStates_DataDump_Client:
             await asyncio.to_thread(xmltodict.parse,gzip.GzipFile(self.nation_dump_file), item_depth=2, item_callback=find_nation)
         except xmltodict.ParsingInterrupted:
             pass
-        return nation_requested
+        return self._select_shards(nation_requested, shards)
 
-    async def get_all_regions(self) -> OrderedDict[str, Any] | Any:
-        return await asyncio.to_thread(xmltodict.parse, gzip.GzipFile(self.region_dump_file))
+    async def get_region(self, region_name: str, shards: Optional[list[str]], *, user_agent: Optional[str] = None,
+                         priority: Priority = Priority.USER) -> OrderedDict[str, Any] | Any:
+        indexed, record = await asyncio.to_thread(self._find_indexed, self.region_index, region_name)
+        if indexed:
+            if record is None:
+                return None
+            region = await asyncio.to_thread(xmltodict.parse, record)
+            return self._select_shards(region["REGION"], shards)
 
-    async def get_all_nations(self) -> OrderedDict[str, Any] | Any:
-        return await asyncio.to_thread(xmltodict.parse, gzip.GzipFile(self.nation_dump_file))
-
-    async def get_region(self, region_name: str, shards: Optional[list[str]]) -> OrderedDict[str, Any] | Any:
-        # TODO: Respect shards
         region_requested = None
 
         def find_region(_, region):
@@ -191,17 +500,146 @@ class NationStates_DataDump_Client:
             await asyncio.to_thread(xmltodict.parse,gzip.GzipFile(self.region_dump_file), item_depth=2, item_callback=find_region)
         except xmltodict.ParsingInterrupted:
             pass
-        return region_requested
-
-    async def process_nation_data_dump(self, data_processor: Callable[[Any, Any], bool]) -> None:
+        return self._select_shards(region_requested, shards)
+
+    async def iter_nations(self, *, batch_size: int = DUMP_BATCH_SIZE) -> AsyncIterator[list[OrderedDict[str, Any]]]:
+        """Iterates over the nations in the nation dump, in batches.
+
+        Args:
+            batch_size: The most nations in each batch.
+        """
+        async for batch in self._iter_parsed(self.nation_index, batch_size=batch_size, batch_bytes=self.batch_bytes):
+            yield batch
+
+    async def iter_regions(self, *, batch_size: int = DUMP_BATCH_SIZE) -> AsyncIterator[list[OrderedDict[str, Any]]]:
+        """Iterates over the regions in the region dump, in batches.
+
+        Args:
+            batch_size: The most regions in each batch.
+        """
+        async for batch in self._iter_parsed(self.region_index, batch_size=batch_size, batch_bytes=self.batch_bytes):
+            yield batch
+
+    async def _iter_parsed(self, index: DumpIndex, *, batch_size: int,
+                           batch_bytes: Optional[int]) -> AsyncIterator[list[dict[str, Any]]]:
+        if self.processes > 1 and await asyncio.to_thread(index.is_current):
+            iterator = self._iter_dump_parallel(index, batch_size=batch_size, batch_bytes=batch_bytes,
+                                                processes=self.processes)
+        else:
+            iterator = self._iter_dump(index.dump_file, batch_size=batch_size, batch_bytes=batch_bytes)
+        async for batch in iterator:
+            yield batch
+
+    @staticmethod
+    async def _iter_dump_parallel(index: DumpIndex, *, batch_size: int, batch_bytes: Optional[int] = None,
+                                  processes: int) -> AsyncIterator[list[dict[str, Any]]]:
+        """Parses a data dump in worker processes and yields the records in batches, in dump order.
+
+        Every batch is a range of whole records found through the index. At most two batches per process are parsed
+        ahead of the consumer, so memory stays bounded the same as when parsing in a thread.
+
+        Args:
+            index: The current index of the data dump.
+            batch_size: The most records in each batch.
+            batch_bytes: If given, the most memory the records of a batch are estimated to take up, the estimate is
+                made from the length of their XML.
+            processes: The amount of worker processes.
+        """
+        loop = asyncio.get_running_loop()
+        max_bytes = batch_bytes // DUMP_PARSED_SIZE_RATIO if batch_bytes is not None else None
+        ranges = await asyncio.to_thread(lambda: list(index.batch_ranges(batch_size, max_bytes)))
+        # Forking a process that runs an event loop and threads can deadlock the child, so the workers are started
+        # fresh instead.
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(start_method))
+        pending: deque[asyncio.Future] = deque()
         try:
-            await asyncio.to_thread(xmltodict.parse,gzip.GzipFile(self.nation_dump_file), item_depth=2, item_callback=data_processor)
-        except xmltodict.ParsingInterrupted:
-            pass
+            for start, end in ranges:
+                pending.append(loop.run_in_executor(pool, parse_records, index.data_file, start, end,
+                                                    index.record_tag))
+                if len(pending) >= processes * 2:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+            await asyncio.to_thread(pool.shutdown, cancel_futures=True)
+
+    @staticmethod
+    async def _iter_dump(dump_file: str, *, batch_size: int,
+                         batch_bytes: Optional[int] = None) -> AsyncIterator[list[OrderedDict[str, Any]]]:
+        """Parses a data dump incrementally in a worker thread and yields the records in batches.
+
+        The worker hands batches over through a bounded queue and waits whenever the queue is full, so at most
+        DUMP_QUEUE_SIZE batches are held in memory no matter how large the dump is.
+
+        Args:
+            dump_file: The path to the gzipped data dump.
+            batch_size: The most records in each batch.
+            batch_bytes: If given, the most memory the records of a batch are estimated to take up.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[list[OrderedDict[str, Any]] | BaseException | None] = asyncio.Queue(DUMP_QUEUE_SIZE)
+        stopped = threading.Event()
+        batch: list[OrderedDict[str, Any]] = []
+        batch_size_bytes = 0
+
+        def hand_over(item):
+            if not stopped.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def collect(_, record) -> bool:
+            nonlocal batch_size_bytes
+            if batch_bytes is not None:
+                record_bytes = estimated_size(record)
+                if batch and batch_size_bytes + record_bytes > batch_bytes:
+                    hand_over(batch.copy())
+                    batch.clear()
+                    batch_size_bytes = 0
+                batch_size_bytes += record_bytes
+            batch.append(record)
+            if len(batch) >= batch_size:
+                hand_over(batch.copy())
+                batch.clear()
+                batch_size_bytes = 0
+            return not stopped.is_set()
+
+        def parse():
+            try:
+                with gzip.open(dump_file) as dump:
+                    xmltodict.parse(dump, item_depth=2, item_callback=collect)
+                if batch:
+                    hand_over(batch.copy())
+            except xmltodict.ParsingInterrupted:
+                pass
+            except BaseException as e:
+                hand_over(e)
+            hand_over(None)
 
-    async def process_region_data_dump(self, data_processor: Callable[[Any, Any], bool]) -> None:
+        worker = asyncio.create_task(asyncio.to_thread(parse))
         try:
-            await asyncio.to_thread(xmltodict.parse, gzip.GzipFile(self.region_dump_file), item_depth=2, item_callback=data_processor)
-        except xmltodict.ParsingInterrupted:
-            pass
+            while (item := await queue.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+            while not worker.done():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.wait([worker], timeout=0.05)
+            await worker
+
+    async def process_nation_data_dump(self, data_processor: Callable[[Any, Any], bool]) -> None:
+        async for batch in self.iter_nations():
+            for nation in batch:
+                if not data_processor(NATION_DUMP_PATH, nation):
+                    return
 
+    async def process_region_data_dump(self, data_processor: Callable[[Any, Any], bool]) -> None:
+        async for batch in self.iter_regions():
+            for region in batch:
+                if not data_processor(REGION_DUMP_PATH, region):
+                    return
@@ -0,0 +1,130 @@
+"""
+This module contains the rate limiter for the NationStates API.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from collections.abc import Mapping
+from typing import Optional
+
+from .constants import BASE_REQUESTS_AMOUNT, BASE_TIME_PERIOD, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX
+
+
+class RateLimiter:
+    """A rate limiter that follows the rate limit headers sent by NationStates.
+
+    The limiter keeps its own sliding window of requests based on the RateLimit-Policy, and on top of that follows the
+    RateLimit-Remaining and RateLimit-Reset headers, and the Retry-After header that is sent with a 429. Waiting
+    requests are let through in the order they arrived.
+
+    Attributes:
+        max_rate: The amount of requests allowed per time period.
+        time_period: The length of the time period, in seconds.
+        remaining: The amount of requests the server last said we have left, if known.
+        requests: The amount of requests let through.
+        waits: The amount of times a request had to wait.
+        total_wait: The total amount of time, in seconds, requests spent waiting.
+        rate_limited: The amount of 429 responses received.
+    """
+    max_rate: int
+    time_period: float
+    remaining: Optional[int]
+
+    def __init__(self, max_rate: int = BASE_REQUESTS_AMOUNT, time_period: float = BASE_TIME_PERIOD):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self.remaining = None
+        self.requests = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.rate_limited = 0
+        self._reset_at = 0.0
+        self._blocked_until = 0.0
+        self._sent: deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    def wait_time(self) -> float:
+        """Returns how long, in seconds, the next request would have to wait."""
+        now = time.monotonic()
+        while self._sent and self._sent[0] <= now - self.time_period:
+            self._sent.popleft()
+
+        wait = self._blocked_until - now
+        if self.remaining is not None and self.remaining <= 0:
+            if self._reset_at > now:
+                wait = max(wait, self._reset_at - now)
+            else:
+                self.remaining = None
+        if len(self._sent) >= self.max_rate:
+            wait = max(wait, self._sent[0] + self.time_period - now)
+        return max(wait, 0.0)
+
+    @property
+    def budget(self) -> int:
+        """The amount of requests that can be made right now without waiting."""
+        if self.wait_time() > 0:
+            return 0
+        budget = self.max_rate - len(self._sent)
+        if self.remaining is not None:
+            budget = min(budget, self.remaining)
+        return max(budget, 0)
+
+    def stats(self) -> dict[str, int | float]:
+        return {"budget": self.budget, "requests": self.requests, "waits": self.waits,
+                "total_wait": self.total_wait, "average_wait": self.total_wait / self.waits if self.waits else 0.0,
+                "rate_limited": self.rate_limited}
+
+    async def acquire(self):
+        """Waits until a request can be made."""
+        async with self._lock:
+            while (wait := self.wait_time()) > 0:
+                self.waits += 1
+                self.total_wait += wait
+                await asyncio.sleep(wait)
+            self._sent.append(time.monotonic())
+            if self.remaining is not None:
+                self.remaining -= 1
+            self.requests += 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return None
+
+    def update(self, headers: Mapping[str, str]):
+        """Updates the limiter from the headers of a response."""
+        try:
+            limit, window = headers["RateLimit-Policy"].split(";w=")
+            self.max_rate, self.time_period = int(limit), int(window)
+        except (KeyError, ValueError):
+            pass
+
+        try:
+            self.remaining = int(headers["RateLimit-Remaining"])
+            self._reset_at = time.monotonic() + int(headers["RateLimit-Reset"])
+        except (KeyError, ValueError):
+            pass
+
+    def back_off(self, headers: Mapping[str, str], attempt: int) -> float:
+        """Blocks all requests after a 429 response.
+
+        The limiter waits as long as the Retry-After header says, and if the header is missing it backs off
+        exponentially with jitter.
+
+        Args:
+            headers: The headers of the 429 response.
+            attempt: How many times the request has been retried already.
+
+        Returns:
+            How long, in seconds, requests are blocked for.
+        """
+        self.rate_limited += 1
+        try:
+            delay = float(headers["Retry-After"])
+        except (KeyError, ValueError):
+            delay = min(RETRY_BACKOFF_BASE * 2 ** attempt, RETRY_BACKOFF_MAX) * random.uniform(0.5, 1.5)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        return delay
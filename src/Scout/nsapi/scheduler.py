@@ -0,0 +1,120 @@
+"""
+This module contains the request scheduler for the NationStates API.
+"""
+import asyncio
+import enum
+from collections import OrderedDict, deque
+from collections.abc import Hashable
+from typing import Optional
+
+from .ratelimit import RateLimiter
+
+
+class Priority(enum.IntEnum):
+    """The priority classes of NationStates API requests, the lower the value the sooner it is sent.
+
+    Attributes:
+        INTERACTIVE: Requests that a user is actively waiting on, such as verification.
+        USER: User-facing lookups.
+        BACKGROUND: Background refreshes, backfills and data dump downloads.
+    """
+    INTERACTIVE = 0
+    USER = 1
+    BACKGROUND = 2
+
+
+class RequestScheduler:
+    """Decides which waiting request gets the next slot from the rate limiter.
+
+    Requests are served by priority class first. Within a class every requester gets a turn in round-robin order, so
+    one requester queueing many requests can not starve the others in the same class.
+
+    Attributes:
+        limiter: The rate limiter the slots come from.
+    """
+    limiter: RateLimiter
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+        self._queues: dict[Priority, OrderedDict[Optional[Hashable], deque[asyncio.Future]]] = {
+            priority: OrderedDict() for priority in Priority}
+        self._waiting = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def queue_depth(self, priority: Optional[Priority] = None) -> int:
+        """Returns the amount of requests waiting.
+
+        Args:
+            priority: If given, only requests in this priority class are counted.
+        """
+        return sum(len(requests) for queue_priority, queue in self._queues.items()
+                   if priority is None or queue_priority == priority
+                   for requests in queue.values())
+
+    def estimated_wait(self, priority: Priority = Priority.USER) -> float:
+        """Estimates how long, in seconds, a new request with the given priority would wait before being sent."""
+        ahead = sum(self.queue_depth(p) for p in Priority if p <= priority) + 1 - self.limiter.budget
+        interval = self.limiter.time_period / self.limiter.max_rate
+        return self.limiter.wait_time() + max(ahead, 0) * interval
+
+    async def acquire(self, priority: Priority = Priority.USER, requester: Optional[Hashable] = None):
+        """Waits until the request is given a slot by the rate limiter.
+
+        Args:
+            priority: The priority class of the request.
+            requester: Who is making the request, used to share slots fairly within a priority class.
+        """
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        slot = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(requester, deque()).append(slot)
+        self._waiting.set()
+        try:
+            await slot
+        except asyncio.CancelledError:
+            self._discard(priority, requester, slot)
+            raise
+
+    def _discard(self, priority: Priority, requester: Optional[Hashable], slot: asyncio.Future):
+        requests = self._queues[priority].get(requester, None)
+        if requests is not None and slot in requests:
+            requests.remove(slot)
+            if not requests:
+                del self._queues[priority][requester]
+
+    def _next(self) -> Optional[asyncio.Future]:
+        for queue in self._queues.values():
+            while queue:
+                requester, requests = next(iter(queue.items()))
+                slot = requests.popleft()
+                if requests:
+                    queue.move_to_end(requester)
+                else:
+                    del queue[requester]
+                if not slot.done():
+                    return slot
+        return None
+
+    async def _dispatch(self):
+        has_slot = False
+        while True:
+            if not self.queue_depth():
+                self._waiting.clear()
+                await self._waiting.wait()
+                continue
+
+            if not has_slot:
+                await self.limiter.acquire()
+                has_slot = True
+
+            # The waiter is picked after the slot is given out, so a request that arrived while waiting on the limiter
+            # still goes ahead of lower priority requests.
+            if (slot := self._next()) is not None:
+                slot.set_result(None)
+                has_slot = False
+
+    def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
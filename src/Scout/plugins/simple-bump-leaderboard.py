@@ -5,7 +5,6 @@ import discord
 from discord import InteractionType, Embed
 from discord.ext import commands
 from sqlalchemy import select
-from sqlalchemy.orm import Session
 
 from Scout.database.base import Base
 from Scout.plugins.simple_bump_leaderboard_models import BumpLeaderBoard, BumpLog
@@ -26,19 +25,19 @@ class SimpleBumpLeaderboard(commands.Cog):
         if cant_run:
             return
 
-        with Session(self.scout.engine) as session:
+        async with self.scout.async_session() as session:
             author_id = message.interaction.user.id
             guild_id = message.guild.id
-            entry = session.scalar(select(BumpLeaderBoard).where(BumpLeaderBoard.user_snowflake == author_id).where(
-                BumpLeaderBoard.guild_snowflake == guild_id))
+            entry = await session.scalar(select(BumpLeaderBoard).where(BumpLeaderBoard.user_snowflake == author_id)
+                                         .where(BumpLeaderBoard.guild_snowflake == guild_id))
             if entry is None:
                 entry = BumpLeaderBoard(guild_snowflake=guild_id, user_snowflake=author_id)
                 session.add(entry)
-                session.commit()
+                await session.commit()
 
             entry.bump_count += 1
             session.add(BumpLog(guild_snowflake=guild_id, user_snowflake=author_id))
-            session.commit()
+            await session.commit()
 
     @commands.hybrid_command(name="bump-leaderboard")  # type: ignore
     async def show_leaderboard(self, ctx, limit: Optional[int] = 10):
@@ -46,9 +45,9 @@ class SimpleBumpLeaderboard(commands.Cog):
             await ctx.send("Limit can not be 0", ephemeral=True)
             return
 
-        with Session(self.scout.engine) as session:
-            top_bumpers = session.scalars(select(BumpLeaderBoard).order_by(BumpLeaderBoard.bump_count.desc()
-                                                                           ).limit(limit)).all()
+        async with self.scout.async_session() as session:
+            top_bumpers = (await session.scalars(select(BumpLeaderBoard).order_by(BumpLeaderBoard.bump_count.desc()
+                                                                                  ).limit(limit))).all()
             if top_bumpers is None or len(top_bumpers) == 0:
                 bumper_embed = Embed(title="Top Server Bumpers!", description="No one is on the leaderboard yet!")
                 await ctx.send(embed=bumper_embed)
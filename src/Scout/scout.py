@@ -12,15 +12,20 @@ from discord.ext import commands
 from discord.ext.commands import Context
 from returns.result import Result, Success, Failure, safe
 from sqlalchemy import Engine, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session
 
 import Scout
 from Scout import config
 from Scout.database import db, models
 from Scout.database.base import Base
+from Scout.database.exceptions import GuildNotFound
+from Scout.database.role_index import GuildRoleIndex
 from Scout.exceptions import *
 from Scout.localization import ScoutTranslator
 from Scout.nsapi import ns as ns
+from Scout.nsapi.cache import ResponseCache
+from Scout.nsapi.constants import CACHE_MAX_ENTRIES
 
 intents = discord.Intents.default()
 
@@ -35,8 +40,11 @@ class ScoutBot(commands.Bot):
     """
     config: dict[str, Any]
     engine: Engine
+    async_engine: AsyncEngine
+    async_session: async_sessionmaker[AsyncSession]
     reusable_session: aiohttp.ClientSession
     associations: dict[str, int] = {}
+    role_index: GuildRoleIndex
     ns_client: ns.NS_API_Client
     translator: ScoutTranslator
 
@@ -48,9 +56,20 @@ class ScoutBot(commands.Bot):
                                     driver=self.config.get("DB_DRIVER", None),
                                     table=self.config.get("DB_TABLE", None),
                                     login=self.config.get("DB_LOGIN", {'user': None, 'password': None}),
-                                    connect=self.config.get("DB_CONN", {'host': None, 'port': None}))
+                                    connect=self.config.get("DB_CONN", {'host': None, 'port': None}),
+                                    compression=self.config.get("DB_COMPRESSION", "zlib"))
+        self.async_engine = db.db_connect_async(dialect=self.config["DB_DIALECT"],
+                                                driver=self.config.get("DB_ASYNC_DRIVER", None),
+                                                table=self.config.get("DB_TABLE", None),
+                                                login=self.config.get("DB_LOGIN", {'user': None, 'password': None}),
+                                                connect=self.config.get("DB_CONN", {'host': None, 'port': None}),
+                                                compression=self.config.get("DB_COMPRESSION", "zlib"))
+        self.async_session = async_sessionmaker(self.async_engine, expire_on_commit=False)
         print("We are logged in as {}".format(self.user))
         Base.metadata.create_all(self.engine)
+        self.role_index = GuildRoleIndex()
+        async with self.async_session() as session:
+            await session.run_sync(self.role_index.load)
         self.translator = ScoutTranslator("scout")
         await self.tree.set_translator(self.translator)
         await self.load_extension("Scout.core.translations.translations")
@@ -59,7 +78,11 @@ class ScoutBot(commands.Bot):
             user_agent = ns.create_user_agent(self.config["CONTACT_INFO"],
                                               self.config["NATION"],
                                               self.config["REGION"])
-            self.ns_client = ns.NationStates_Client(user_agent, self.reusable_session)
+            cache = ResponseCache(max_entries=self.config.get("NS_CACHE_SIZE", CACHE_MAX_ENTRIES),
+                                  path=self.config.get("NS_CACHE_FILE", None))
+            self.ns_client = ns.NationStates_Client(user_agent, self.reusable_session,
+                                                    dump_directory=self.config.get("DUMP_DIRECTORY", None),
+                                                    cache=cache)
             await self.load_extension("Scout.core.nationstates.nationstates")
         except Exception as e:
             print(e)
@@ -90,8 +113,11 @@ class ScoutBot(commands.Bot):
         # Please note that this probably should be rewritten to be better, but until then here be dragons.
         # Abandon All Hope Yee Who Enter.
         if not is_in_server:
-            with Session(self.engine) as session:
-                user = db.get_user(ctx.author.id, session=session)
+            async with self.async_session() as session:
+                user = await db.get_user_async(ctx.author.id, session=session)
+                # Locales are loaded up front, so the relationship can be read below without awaiting it.
+                if user is not None:
+                    await user.awaitable_attrs.locales
                 if user is None or not user.locales and not is_interaction:
                     return await self.translator.translate_response(response, **kwargs)
 
@@ -108,14 +134,18 @@ class ScoutBot(commands.Bot):
                 return await self.translator.translate_response(response, **kwargs)
 
         elif is_in_server:
-            with Session(self.engine) as session:
+            async with self.async_session() as session:
                 guild_locale = ctx.guild.preferred_locale
-                guild_db = db.get_guild(guild=ctx.guild.id, snowflake_only=True, session=session)
+                guild_db = await db.get_guild_async(guild=ctx.guild.id, snowflake_only=True, session=session)
+                if guild_db is not None:
+                    await guild_db.awaitable_attrs.locales
 
                 if guild_db is None or not guild_db.locales:
                     prefer_user_locales = guild_db.override_user_locales if guild_db is not None else True
 
-                    user = db.get_user(user=ctx.author.id, snowflake_only=True, session=session)
+                    user = await db.get_user_async(user=ctx.author.id, snowflake_only=True, session=session)
+                    if user is not None:
+                        await user.awaitable_attrs.locales
                     use_user_locales = user.use_locales_in_server if user is not None else False
                     prefer_user_locales = prefer_user_locales and use_user_locales
 
@@ -146,7 +176,9 @@ class ScoutBot(commands.Bot):
                             return await self.translator.translate_response(response, locale=locale, **kwargs)
                     return await self.translator.translate_response(response, **kwargs)
                 else:
-                    user = db.get_user(user=ctx.author.id, snowflake_only=True, session=session)
+                    user = await db.get_user_async(user=ctx.author.id, snowflake_only=True, session=session)
+                    if user is not None:
+                        await user.awaitable_attrs.locales
 
                     use_user_locales = user.use_locales_in_server if user is not None else False
                     prefer_user_locales = guild_db.override_user_locales and use_user_locales
@@ -238,7 +270,11 @@ class ScoutBot(commands.Bot):
         """This is called when the bot is shutting down and closing connections.
         """
         await super().close(*args, **kwargs)
+        if (ns_client := getattr(self, "ns_client", None)) is not None:
+            ns_client.close()
         await self.reusable_session.close()
+        if (async_engine := getattr(self, "async_engine", None)) is not None:
+            await async_engine.dispose()
 
 
 _config = config.load_configuration()
@@ -254,11 +290,14 @@ async def update_stored_roles(before: discord.Role, after: discord.Role):
         before: The discord role before the update.
         after: The discord role after the update.
     """
-    with Session(scout.engine) as session:
-        role_db = db.get_role(before.id, snowflake_only=True, session=session)
-        if before.id != after.id and role_db:
+    if before.id == after.id or before.id not in scout.role_index:
+        return
+    async with scout.async_session() as session:
+        role_db = await db.get_role_async(before.id, snowflake_only=True, session=session)
+        if role_db:
             role_db.snowflake = after.id
-            session.commit()
+            await session.commit()
+    scout.role_index.replace_role(before.id, after.id)
 
 
 @scout.listen('on_guild_role_delete')
@@ -268,8 +307,12 @@ async def remove_stored_roles(role: discord.Role):
     Parameters:
         role: The role that has been removed.
     """
-    with Session(scout.engine) as session:
-        db.remove_role(role.id, snowflake_only=True, session=session)
+    if role.id not in scout.role_index:
+        return
+    async with scout.async_session() as session:
+        await db.remove_role_async(role.id, snowflake_only=True, session=session)
+        await session.commit()
+    scout.role_index.remove_role(role.id)
 
 
 @scout.listen('on_guild_remove')
@@ -279,8 +322,14 @@ async def remove_guild_info(guild: discord.Guild):
     Parameters:
         guild: The guild the bot was kicked from.
     """
-    with Session(scout.engine) as session:
-        db.remove_guild(guild.id, snowflake_only=True, session=session)
+    async with scout.async_session() as session:
+        try:
+            await db.remove_guild_async(guild.id, snowflake_only=True, session=session)
+        except GuildNotFound:
+            # The guild was never registered, so there is nothing stored for it.
+            return
+        await session.commit()
+    scout.role_index.remove_guild(guild.id)
 
 
 @scout.hybrid_command()  # type: ignore
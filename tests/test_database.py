@@ -0,0 +1,150 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine, select, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import Session
+
+from Scout.database import db, exceptions, types
+from Scout.database.base import Base
+from Scout.database.models import Nation, Region, Guild, Role, Association
+from Scout.database.role_index import GuildRoleIndex
+
+DATA = {"NAME": "Test Nation", "ENDORSEMENTS": "a,b", "MOTTO": "Ünïcode & <escapes>", "FREEDOM": {"CIVILRIGHTS": "Good"}}
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_engine():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def compression():
+    yield
+    types.set_compression("zlib")
+
+
+# Unit Tests
+class Test_Unit_CompressedJSON:
+    @pytest.mark.parametrize("compression, header", [("none", b"j"), ("zlib", b"z"), ("zstd", b"s")])
+    def test_round_trip(self, compression, header):
+        if compression == "zstd":
+            pytest.importorskip("zstandard")
+        types.set_compression(compression)
+        value = types.encode(DATA)
+        assert value[:1] == header
+        assert types.decode(value) == DATA
+
+    def test_legacy_values(self):
+        # Values stored before compression was added are plain JSON without a header.
+        assert types.decode('{"NAME": "Test"}') == {"NAME": "Test"}
+        assert types.decode(b'{"NAME": "Test"}') == {"NAME": "Test"}
+
+    def test_switch_compression(self, engine):
+        with Session(engine) as session:
+            types.set_compression("zlib")
+            session.add(Nation(name="zlib", data=DATA))
+            session.commit()
+            types.set_compression("none")
+            session.add(Nation(name="none", data=DATA))
+            session.commit()
+
+        # Rows written with the earlier compression are still read after it is changed.
+        types.set_compression("zlib")
+        with Session(engine) as session:
+            assert {name: data for name, data in session.execute(select(Nation.name, Nation.data))} == {
+                "zlib": DATA, "none": DATA}
+            headers = {name: data[:1] for name, data in session.execute(
+                select(Nation.name, Nation.__table__.c.data.cast(types.LargeBinary)))}
+        assert headers == {"zlib": b"z", "none": b"j"}
+
+    def test_zstd_unavailable(self, monkeypatch):
+        monkeypatch.setattr(types, "zstandard", None)
+        with pytest.raises(ValueError):
+            types.set_compression("zstd")
+        assert types.encode(DATA)[:1] == b"z"
+        with pytest.raises(ValueError):
+            types.decode(b"s" + b"\x28\xb5\x2f\xfd")
+
+    def test_unknown_compression(self):
+        with pytest.raises(ValueError):
+            types.set_compression("lzma")
+
+
+class Test_Unit_GuildRoleIndex:
+    def test_load(self, engine):
+        with Session(engine) as session:
+            verified, resident = Association(association="nsverify:user-verified"), Association(
+                association="nsverify:user-resident")
+            guild = Guild(snowflake=1)
+            session.add_all([guild, verified, resident])
+            session.flush()
+            session.add_all([Role(snowflake=100, guild_id=guild.id, associations={verified}),
+                             Role(snowflake=101, guild_id=guild.id, associations={resident})])
+            session.commit()
+
+            index = GuildRoleIndex()
+            index.set(2, "Stale", 200)
+            index.load(session)
+        assert index.roles(1) == {"nsverify:user-verified": 100, "nsverify:user-resident": 101}
+        assert index.get(1, "NSVerify:user-Verified") == 100
+        assert index.guilds() == [1] and 200 not in index
+
+    def test_add_and_remove(self):
+        index = GuildRoleIndex()
+        assert not index
+        index.set(1, "Verified", 100)
+        index.set(1, "Resident", 100)
+        index.set(2, "Verified", 200)
+        assert index.with_association("verified") == [(1, 100), (2, 200)]
+
+        # Linking another role replaces the old one, which is kept while it has another association.
+        index.set(1, "Verified", 101)
+        assert index.roles(1) == {"verified": 101, "resident": 100}
+        assert 100 in index and 101 in index
+        assert index.discard(1, "Resident") == 100
+        assert 100 not in index
+        assert index.discard(1, "Resident") is None
+
+        index.replace_role(101, 102)
+        assert index.get(1, "Verified") == 102 and 101 not in index and 102 in index
+        index.remove_role(102)
+        assert index.guilds() == [2] and 102 not in index
+        index.remove_role(102)
+
+        index.remove_guild(2)
+        assert not index and index.guilds() == []
+
+
+class Test_Unit_AsyncHelpers:
+    @pytest.mark.asyncio
+    async def test_run_async(self, async_engine):
+        assert db.link_guild_region_async.__name__ == "link_guild_region"
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            guild = await db.register_guild_async(1, session=session)
+            region = Region(name="test_region", data={})
+            session.add(region)
+            await session.commit()
+
+            # The helper lazy loads the guild's regions, which only works because it is run with run_sync.
+            await db.link_guild_region_async(guild, region, session=session)
+            await session.commit()
+
+        async with AsyncSession(async_engine) as session:
+            guild = await db.get_guild_async(1, session=session)
+            assert guild.snowflake == 1
+            assert await session.run_sync(lambda _: {region.name for region in guild.regions}) == {"test_region"}
+            assert await db.get_guild_async(2, session=session) is None
+            with pytest.raises(exceptions.GuildNotFound):
+                await db.remove_guild_async(2, snowflake_only=True, session=session)
@@ -0,0 +1,400 @@
+import datetime
+import gzip
+import os
+import types
+
+import pytest
+import xmltodict
+from sqlalchemy import create_engine, select, update, func, StaticPool
+from sqlalchemy.orm import Session
+
+from Scout.core.nationstates import ingest
+from Scout.core.nationstates.nationstates import NationStates
+from Scout.database.base import Base
+from Scout.database.models import Region, Nation, IngestCheckpoint, User
+from Scout.nsapi.dumps import parse_records, DumpManifest
+from Scout.nsapi.exceptions import NotFound
+from Scout.nsapi.parsing import parse_response
+
+
+def make_region(name: str) -> dict:
+    return {"NAME": name, "DELEGATE": "0", "FOUNDER": "nation_0"}
+
+
+def make_nation(name: str, region: str, endorsements: str = "") -> dict:
+    return {"NAME": name, "REGION": region, "UNSTATUS": "Non-member", "ENDORSEMENTS": endorsements or None,
+            "LASTLOGIN": "1700000000"}
+
+
+def run_ingest(engine, loader_class, identity: str, regions: list[dict], nations: list[dict],
+               **kwargs) -> tuple[ingest.DumpLoader, ingest.DumpLoader]:
+    loaders = (loader_class(engine, Region, identity, **kwargs), loader_class(engine, Nation, identity, **kwargs))
+    for loader, records in zip(loaders, (regions, nations)):
+        loader.open()
+        loader.stage(records)
+        loader.merge()
+    for loader in reversed(loaders):
+        loader.remove_missing()
+        loader.close()
+    return loaders
+
+
+def open_loader(engine, loader_class, table, identity: str, **kwargs) -> ingest.DumpLoader:
+    loader = loader_class(engine, table, identity, **kwargs)
+    loader.open()
+    return loader
+
+
+def checkpoint(engine, table) -> tuple[str, str, int]:
+    with Session(engine) as session:
+        return tuple(session.execute(select(IngestCheckpoint.identity, IngestCheckpoint.phase, IngestCheckpoint.records)
+                                     .where(IngestCheckpoint.dump_type == table.__tablename__)).one())
+
+
+def rows(engine) -> dict[str, tuple]:
+    with Session(engine) as session:
+        return {name: (region, data_hash, last_updated) for name, region, data_hash, last_updated in session.execute(
+            select(Nation.name, Region.name, Nation.data_hash, Nation.last_updated)
+            .outerjoin(Region, Region.id == Nation.region_id))}
+
+
+def verify(engine, snowflake: int, *names: str):
+    with Session(engine) as session:
+        nations = set(session.scalars(select(Nation).where(Nation.name.in_(names))))
+        session.add(User(snowflake=snowflake, nations=nations))
+        session.commit()
+
+
+def region_ids(engine) -> dict[str, int]:
+    with Session(engine) as session:
+        return {name: id for name, id in session.execute(select(Region.name, Region.id))}
+
+
+def nation_ids(engine) -> dict[str, int]:
+    with Session(engine) as session:
+        return {name: id for name, id in session.execute(select(Nation.name, Nation.id))}
+
+
+class FakeNationsClient:
+    """Answers get_nations with the given results, NotFound for any nation not given."""
+
+    def __init__(self, results: dict):
+        self.results = results
+        self.requested = []
+
+    async def get_nations(self, names, shards, *, user_agent=None, priority=None):
+        for name in names:
+            self.requested.append(name)
+            yield name, self.results.get(name, NotFound(name))
+
+
+def make_dumps(regions: list[str], nations: dict[str, str]) -> dict[str, bytes]:
+    region_records = "".join("<REGION><NAME>{}</NAME><DELEGATE>0</DELEGATE></REGION>".format(name) for name in regions)
+    nation_records = "".join("<NATION><NAME>{}</NAME><REGION>{}</REGION><ENDORSEMENTS></ENDORSEMENTS></NATION>"
+                             .format(name, region) for name, region in nations.items())
+    return {"regions": gzip.compress("<REGIONS>{}</REGIONS>".format(region_records).encode()),
+            "nations": gzip.compress("<NATIONS>{}</NATIONS>".format(nation_records).encode())}
+
+
+class FakeDumpClient:
+    """Downloads the given dumps into a directory, keeping a manifest like the real client."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.dumps = {}
+        self.error = None
+        self.dump_manifest = DumpManifest(os.path.join(directory, "dumps.json")).load()
+
+    async def get_daily_dump(self, dump_type: str, *, user_agent=None, progress=None) -> bool:
+        if self.error is not None:
+            raise self.error
+        path = os.path.join(self.directory, "{}.xml.gz".format(dump_type))
+        if os.path.exists(path) and open(path, 'rb').read() == self.dumps[dump_type]:
+            return False
+        with open(path, 'wb') as dump:
+            dump.write(self.dumps[dump_type])
+        self.dump_manifest.finish_download(dump_type, len(self.dumps[dump_type]))
+        return True
+
+    async def save_dump_manifest(self):
+        self.dump_manifest.save()
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+LOADERS = [pytest.param(ingest.DumpLoader, {}, id="orm"),
+           pytest.param(ingest.DumpLoader, {"bounded": True}, id="orm-bounded"),
+           pytest.param(ingest.SQLiteLoader, {}, id="staging")]
+
+
+# Unit Tests
+class Test_Unit_Ingest:
+    @pytest.mark.parametrize("loader_class, kwargs", LOADERS)
+    def test_loader_counts(self, engine, loader_class, kwargs):
+        regions = [make_region("region_a"), make_region("region_b")]
+        _, nations = run_ingest(engine, loader_class, "1", regions,
+                                [make_nation(name, "Region_A") for name in ("a", "b", "c")], **kwargs)
+        assert (nations.counts["inserted"], nations.counts["updated"], nations.counts["unchanged"]) == (3, 0, 0)
+
+        # Rows that are not written keep their old timestamp.
+        old = datetime.datetime(2000, 1, 1)
+        with Session(engine) as session:
+            session.execute(update(Nation).values(last_updated=old))
+            session.commit()
+        before = rows(engine)
+
+        _, nations = run_ingest(engine, loader_class, "2", regions,
+                                [make_nation("a", "Region_A"), make_nation("b", "Region_B"), make_nation("d", "Region_A")],
+                                **kwargs)
+        assert (nations.counts["inserted"], nations.counts["updated"], nations.counts["unchanged"],
+                nations.counts["removed"]) == (1, 1, 1, 1)
+        after = rows(engine)
+        assert after["a"] == before["a"]
+        assert after["b"][0] == "region_b" and after["b"][1] != before["b"][1] and after["b"][2] != old
+        assert "c" not in after and after["d"][0] == "region_a"
+
+    @pytest.mark.parametrize("loader_class, kwargs", LOADERS)
+    def test_loader_orphans(self, engine, loader_class, kwargs):
+        run_ingest(engine, loader_class, "1", [make_region("region_a")], [make_nation("a", "Region_A")], **kwargs)
+        _, nations = run_ingest(engine, loader_class, "2", [make_region("region_a")],
+                                [make_nation("a", "Region_A"), make_nation("b", "Nowhere")], **kwargs)
+
+        # A nation in a region that is not in the regions table is still written, and is counted.
+        assert nations.counts["orphaned"] == 1
+        assert nations.counts["inserted"] == 1
+        assert rows(engine)["b"][0] is None
+        _, nations = run_ingest(engine, loader_class, "3", [make_region("region_a")],
+                                [make_nation("a", "Region_A"), make_nation("b", "Nowhere")], **kwargs)
+        assert nations.counts["unchanged"] == 2 and not nations.counts["removed"]
+
+    @pytest.mark.parametrize("loader_class, kwargs", LOADERS)
+    def test_checkpoint_resume(self, engine, loader_class, kwargs):
+        run_ingest(engine, loader_class, "1", [make_region("region_a")], [], **kwargs)
+        first, second = [make_nation(name, "Region_A") for name in "abc"], [make_nation(name, "Region_A") for name in "de"]
+
+        # The first loader stops after a batch, as if the bot was restarted.
+        loader = open_loader(engine, loader_class, Nation, "2", **kwargs)
+        assert loader.stage(first) == 3
+        loader.close()
+        assert checkpoint(engine, Nation) == ("2", "staging", 3)
+
+        loader = open_loader(engine, loader_class, Nation, "2", **kwargs)
+        assert (loader.phase, loader.resumed) == ("staging", 3)
+        assert loader.stage(first) == 0
+        assert loader.stage(second) == 2
+        if isinstance(loader, ingest.StagingLoader):
+            assert loader._connection.scalar(select(func.count()).select_from(loader.staging)) == 5
+        loader.merge()
+        loader.remove_missing()
+        loader.close()
+
+        # Every record was written by exactly one of the loaders, and the resumed loader did not remove the first batch.
+        written = loader.counts["inserted"] + loader.counts["updated"] + loader.counts["unchanged"]
+        assert written == (5 if isinstance(loader, ingest.StagingLoader) else 2)
+        assert not loader.counts["updated"] and not loader.counts["removed"]
+        assert sorted(rows(engine)) == ["a", "b", "c", "d", "e"]
+        assert checkpoint(engine, Nation) == ("2", "done", 5)
+
+    @pytest.mark.parametrize("loader_class, kwargs", LOADERS)
+    def test_checkpoint_phases(self, engine, loader_class, kwargs):
+        run_ingest(engine, loader_class, "1", [make_region("region_a")], [make_nation("old", "Region_A")], **kwargs)
+        nations = [make_nation(name, "Region_A") for name in "ab"]
+
+        # The first loader stops after merging, before removing the missing rows.
+        loader = open_loader(engine, loader_class, Nation, "2", **kwargs)
+        loader.stage(nations)
+        loader.merge()
+        loader.close()
+        assert loader.counts["inserted"] == 2
+        assert checkpoint(engine, Nation) == ("2", "merged", 2)
+
+        loader = open_loader(engine, loader_class, Nation, "2", **kwargs)
+        assert loader.phase == "merged"
+        assert loader.stage(nations) == 0
+        loader.merge()
+        loader.remove_missing()
+        loader.close()
+        assert (loader.counts["inserted"], loader.counts["removed"]) == (0, 1)
+        assert sorted(rows(engine)) == ["a", "b"]
+
+        # Once the dump is done nothing is done again.
+        loader = open_loader(engine, loader_class, Nation, "2", **kwargs)
+        assert loader.phase == "done"
+        assert loader.stage(nations) == 0
+        loader.merge()
+        loader.remove_missing()
+        loader.close()
+        assert not +loader.counts
+        assert checkpoint(engine, Nation) == ("2", "done", 2)
+
+    @pytest.mark.parametrize("loader_class, kwargs", LOADERS)
+    def test_checkpoint_other_dump(self, engine, loader_class, kwargs):
+        run_ingest(engine, loader_class, "1", [make_region("region_a")], [], **kwargs)
+        nations = [make_nation(name, "Region_A") for name in "abc"]
+        loader = open_loader(engine, loader_class, Nation, "2", **kwargs)
+        loader.stage(nations[:2])
+        loader.close()
+
+        # A checkpoint of another dump is thrown away, and the new dump is staged from the start.
+        loader = open_loader(engine, loader_class, Nation, "3", **kwargs)
+        assert (loader.phase, loader.resumed) == ("staging", 0)
+        assert checkpoint(engine, Nation) == ("3", "staging", 0)
+        assert loader.stage(nations) == 3
+        loader.merge()
+        loader.remove_missing()
+        loader.close()
+        assert loader.counts["inserted"] + loader.counts["unchanged"] == 3
+        assert sorted(rows(engine)) == ["a", "b", "c"]
+        assert checkpoint(engine, Nation) == ("3", "done", 3)
+
+    def test_region_moves(self, engine):
+        regions = [make_region("region_a"), make_region("region_b")]
+        run_ingest(engine, ingest.DumpLoader, "1", regions, [make_nation(name, "Region_A") for name in "abc"])
+        verify(engine, 1, "a", "b", "c")
+        before = ingest.verified_nations(engine)
+
+        # a moves, b stays, and c leaves the dump but is kept because it is verified. d is verified after the ingest.
+        run_ingest(engine, ingest.DumpLoader, "2", regions,
+                   [make_nation("a", "Region_B"), make_nation("b", "Region_A"), make_nation("d", "Region_A")])
+        verify(engine, 2, "d")
+        after = ingest.verified_nations(engine)
+        ids, regions = nation_ids(engine), region_ids(engine)
+        assert ingest.region_moves(before, after) == {ids["a"]: (regions["region_a"], regions["region_b"])}
+
+        # A nation that ceased to exist is taken out of its region, and written back if it is founded again.
+        ingest.detach_nations(engine, [ids["c"]])
+        assert rows(engine)["c"][:2] == (None, None)
+        assert ingest.region_moves(before, ingest.verified_nations(engine)) == {
+            ids["a"]: (regions["region_a"], regions["region_b"]), ids["c"]: (regions["region_a"], None)}
+        _, nations = run_ingest(engine, ingest.DumpLoader, "3", [make_region("region_a"), make_region("region_b")],
+                                [make_nation(name, "Region_A") for name in "abcd"])
+        assert rows(engine)["c"][0] == "region_a" and nations.counts["updated"] == 2
+
+    @pytest.mark.asyncio
+    async def test_find_region_moves(self, engine):
+        regions = [make_region("region_a"), make_region("region_b")]
+        run_ingest(engine, ingest.DumpLoader, "1", regions, [make_nation(name, "Region_A") for name in "abcde"])
+        verify(engine, 1, *"abcde")
+        before = ingest.verified_nations(engine)
+        run_ingest(engine, ingest.DumpLoader, "2", regions,
+                   [make_nation("a", "Region_B"), make_nation("b", "Region_A")])
+        ids, regions = nation_ids(engine), region_ids(engine)
+
+        # c no longer exists, d was founded again after the dump was made and e could not be checked.
+        cog = NationStates.__new__(NationStates)
+        cog.scout = types.SimpleNamespace(engine=engine)
+        cog.user_agent = "Test"
+        cog.ns_client = FakeNationsClient({"d": {"NAME": "d"}, "e": RuntimeError("Test")})
+        dump = types.SimpleNamespace(nation_index=types.SimpleNamespace(is_current=lambda: True,
+                                                                        contains=lambda name: name in ("a", "b")))
+        moves = await cog.find_region_moves(dump, before, tracked=True)
+
+        assert sorted(cog.ns_client.requested) == ["c", "d", "e"]
+        assert moves == {ids["a"]: (regions["region_a"], regions["region_b"]), ids["c"]: (regions["region_a"], None)}
+        after = rows(engine)
+        assert after["c"][0] is None and after["d"][0] == "region_a" and after["e"][0] == "region_a"
+
+        # Moves can not be tracked over a resumed ingest, but nations that ceased are still taken out of their region.
+        cog.ns_client = FakeNationsClient({})
+        assert await cog.find_region_moves(dump, before, tracked=False) is None
+        assert rows(engine)["d"][0] is None and rows(engine)["e"][0] is None
+
+    def test_content_hash(self):
+        nation = {"NAME": "a", "REGION": "Region_A", "FREEDOM": {"CIVILRIGHTS": "Good", "ECONOMY": "Fair"}}
+        reordered = {"FREEDOM": {"ECONOMY": "Fair", "CIVILRIGHTS": "Good"}, "REGION": "Region_A", "NAME": "a"}
+        assert ingest.content_hash(nation) == ingest.content_hash(reordered)
+        assert ingest.content_hash(nation) != ingest.content_hash({**nation, "REGION": "Region_B"})
+
+    @pytest.mark.asyncio
+    async def test_process_data_dump(self, engine, tmp_path):
+        cog = NationStates.__new__(NationStates)
+        dispatched = []
+        cog.scout = types.SimpleNamespace(engine=engine, config={"DUMP_DIRECTORY": str(tmp_path)},
+                                          dispatch=lambda event, *args: dispatched.append((event, *args)))
+        cog.ns_client = FakeDumpClient(str(tmp_path))
+        cog.user_agent = "Test"
+        cog.ingest_progress = ingest.IngestProgress()
+        cog.dump_archive = None
+
+        cog.ns_client.dumps = make_dumps(["Region A", "Region B"], {"a": "Region A", "b": "Region A", "c": "Region A"})
+        await cog.process_data_dump()
+        old = datetime.datetime(2000, 1, 1)
+        with Session(engine) as session:
+            session.execute(update(Nation).values(last_updated=old))
+            session.commit()
+
+        # Only the nations that changed are written.
+        cog.ns_client.dumps = make_dumps(["Region A", "Region B"], {"a": "Region A", "b": "Region B", "d": "Region A"})
+        await cog.process_data_dump()
+        after = rows(engine)
+        assert sorted(after) == ["a", "b", "d"]
+        assert after["a"][2] == old and after["b"][2] != old and after["b"][0] == "region b"
+        assert dispatched == [("nation_moves", {}), ("nation_moves", {})]
+        assert cog.ns_client.dump_manifest.is_ingested("nations")
+
+        # Dumps that have not changed since they were ingested are skipped.
+        await cog.process_data_dump()
+        assert len(dispatched) == 2 and not cog.is_processing
+
+        # A failed update does not stop the next one from running.
+        cog.ns_client.error = RuntimeError("Test")
+        with pytest.raises(ExceptionGroup):
+            await cog.process_data_dump()
+        assert not cog.is_processing
+
+    def test_record_columns(self, tmp_path):
+        nation = ("<NATION><NAME>Test Nation</NAME><UNSTATUS>WA Member</UNSTATUS><ENDORSEMENTS>a,b,c</ENDORSEMENTS>"
+                  "<INFLUENCE>Zero</INFLUENCE><LASTLOGIN>1700000000</LASTLOGIN><LASTACTIVITY>1 hour ago</LASTACTIVITY>"
+                  "</NATION>")
+        (tmp_path / "nations.xml").write_text(nation)
+        expected = {'canonical_name': "test_nation", 'wa_status': "WA Member", 'endorsement_count': 3,
+                    'influence': "Zero", 'last_login': 1700000000, 'last_activity': "1 hour ago"}
+        # Dump records, API responses and xmltodict all give the same columns.
+        for record in (parse_records(str(tmp_path / "nations.xml"), 0, len(nation), "NATION")[0],
+                       parse_response(nation, "NATION"), xmltodict.parse(nation)["NATION"]):
+            assert ingest.record_columns(Nation, record) == expected
+
+        record = parse_response("<NATION><NAME>Test</NAME><ENDORSEMENTS></ENDORSEMENTS></NATION>", "NATION")
+        assert ingest.record_columns(Nation, record) == {
+            'canonical_name': "test", 'wa_status': None, 'endorsement_count': 0, 'influence': None,
+            'last_login': None, 'last_activity': None}
+        assert ingest.record_columns(Nation, {"NAME": "Test"})['endorsement_count'] is None
+
+        region = parse_response("<REGION><NAME>Test Region</NAME><DELEGATE>0</DELEGATE><FOUNDER>Test Nation</FOUNDER>"
+                                "</REGION>", "REGION")
+        assert ingest.record_columns(Region, region) == {'canonical_name': "test_region", 'delegate': None,
+                                                         'founder': "test_nation"}
+
+    def test_staging_duplicates(self, engine):
+        _, nations = run_ingest(engine, ingest.SQLiteLoader, "1", [make_region("region_a")],
+                                [make_nation("a", "Region_A"), make_nation("b", "Region_A"),
+                                 make_nation("A", "Region_A")])
+        assert nations.counts["inserted"] == 2
+        assert sorted(rows(engine)) == ["a", "b"]
+
+
+# Integration Tests
+class Test_Integration_Ingest:
+    @pytest.mark.skipif(not os.environ.get("SCOUT_TEST_POSTGRES"),
+                        reason="SCOUT_TEST_POSTGRES is not set to a PostgreSQL database URL")
+    def test_postgres_copy(self):
+        pytest.importorskip("psycopg")
+        engine = create_engine(os.environ["SCOUT_TEST_POSTGRES"])
+        Base.metadata.create_all(engine)
+        try:
+            _, nations = run_ingest(engine, ingest.PostgresLoader, "1", [make_region("region_a")],
+                                    [make_nation("a", "Region_A", "b,c"), make_nation("b", "Nowhere")])
+            assert (nations.counts["inserted"], nations.counts["orphaned"]) == (2, 1)
+            with Session(engine) as session:
+                nation = session.scalar(select(Nation).where(Nation.name == "a"))
+                assert nation.data["ENDORSEMENTS"] == "b,c"
+                assert nation.endorsement_count == 2
+        finally:
+            Base.metadata.drop_all(engine)
+            engine.dispose()
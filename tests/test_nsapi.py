@@ -1,12 +1,126 @@
+import asyncio
+import datetime
+import gzip
 import os
+import subprocess
+import sys
+import time
 
 import aiohttp
 import pytest
+import pytest_asyncio
+import xmltodict
+from aiohttp import web
 
-import Scout.core.nationstates.nsapi.ns as ns
+import Scout.nsapi.ns as ns
+from Scout.nsapi import dumps
+from Scout.nsapi.cache import ResponseCache
+from Scout.nsapi.exceptions import RateLimited, NotFound
+from Scout.nsapi.parsing import parse_response
+from Scout.nsapi.ratelimit import RateLimiter
+from Scout.nsapi.scheduler import Priority, RequestScheduler
 from Scout import __VERSION__
 
 
+def make_nations_dump(count: int) -> bytes:
+    nations = "".join("<NATION><NAME>Nation {0}</NAME><REGION>Region {1}</REGION></NATION>".format(i, i % 3)
+                      for i in range(count))
+    return gzip.compress('<?xml version="1.0" encoding="UTF-8"?><NATIONS>{}</NATIONS>'.format(nations).encode())
+
+
+MEMORY_BUDGET_SCRIPT = """
+import asyncio, resource
+import Scout.nsapi.ns as ns
+
+async def main():
+    api = ns.NationStates_DataDump_Client({directory!r})
+    api.batch_bytes = {budget} // api.batches_in_flight if {bounded} else None
+    start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    count = 0
+    async for batch in api.iter_nations():
+        count += len(batch)
+    print(count, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start) * 1024)
+
+asyncio.run(main())
+"""
+
+
+@pytest_asyncio.fixture
+async def dump_server(aiohttp_server):
+    dump = make_nations_dump(2000)
+
+    async def nations_dump(request):
+        return web.Response(body=dump)
+
+    app = web.Application()
+    app.router.add_get("/pages/nations.xml.gz", nations_dump)
+    server = await aiohttp_server(app)
+    server.dump = dump
+    return server
+
+
+@pytest_asyncio.fixture
+async def static_dump_server(aiohttp_server, tmp_path_factory):
+    directory = tmp_path_factory.mktemp("server")
+    dump_file = directory / "nations.xml.gz"
+    dump_file.write_bytes(make_nations_dump(5000))
+    (directory / "regions.xml.gz").write_bytes(
+        gzip.compress(b"<REGIONS><REGION><NAME>Region 0</NAME></REGION></REGIONS>"))
+    requests = []
+
+    async def record_requests(request, response):
+        requests.append((request.headers.copy(), response.status))
+
+    async def dump(request):
+        return web.FileResponse(directory / "{}.xml.gz".format(request.match_info["dump_type"]))
+
+    app = web.Application()
+    app.on_response_prepare.append(record_requests)
+    app.router.add_get("/pages/{dump_type}.xml.gz", dump)
+    server = await aiohttp_server(app)
+    server.dump_file = dump_file
+    server.requests = requests
+    return server
+
+
+@pytest_asyncio.fixture
+async def api_server(aiohttp_server):
+    requests = []
+
+    async def api(request):
+        requests.append(request.query.copy())
+        await asyncio.sleep(server.delay)
+        if server.rate_limited > 0:
+            server.rate_limited -= 1
+            return web.Response(status=429, headers={"Retry-After": str(server.retry_after)})
+        if request.query.get("nation", None) in server.missing:
+            return web.Response(status=404, text="<h1>Not Found</h1>", content_type="text/html")
+        if "nation" in request.query:
+            name = request.query["nation"]
+            body = "<NATION id=\"{0}\"><NAME>{0}</NAME><REGION>Testregionia</REGION></NATION>".format(name)
+        else:
+            name = request.query["region"]
+            body = "<REGION id=\"{0}\"><NAME>{0}</NAME><DELEGATE>testlandia</DELEGATE></REGION>".format(name)
+        return web.Response(text=body, content_type="text/xml", headers=server.rate_limit_headers)
+
+    app = web.Application()
+    app.router.add_get("/cgi-bin/api.cgi", api)
+    server = await aiohttp_server(app)
+    server.requests = requests
+    server.delay = 0
+    server.rate_limited = 0
+    server.retry_after = 0
+    server.missing = set()
+    server.rate_limit_headers = {"RateLimit-Policy": "50;w=30"}
+    return server
+
+
+def make_client(session, server, **kwargs) -> ns.NationStates_Client:
+    api = ns.NationStates_Client(user_agent="Test", session=session, **kwargs)
+    api.nationstates_api_url = str(server.make_url("/cgi-bin/api.cgi")) + "?"
+    return api
+
+
 # Unit Tests
 class Test_Unit_NSAPI:
     def test_create_user_agent(self):
@@ -16,6 +130,380 @@ class Test_Unit_NSAPI:
         assert ua_region == "Scout-Bot/{v} Nation-{n} for Region-{r} Contact-{c}".format(v=__VERSION__, n="Bigtopia",
                                                                                          r="Regionia", c="Blah")
 
+    @pytest.mark.asyncio
+    async def test_get_daily_dump_streams_to_disk(self, dump_server, tmp_path):
+        async with aiohttp.ClientSession() as session:
+            api = ns.NationStates_Client(user_agent="Test", session=session, dump_directory=str(tmp_path))
+            api.nationstates_dump_url = str(dump_server.make_url("/pages/")) + "{}.xml.gz"
+            progress = []
+            await api.get_daily_dump("nations", progress=lambda downloaded, total: progress.append(downloaded))
+
+        assert (tmp_path / "nations.xml.gz").read_bytes() == dump_server.dump
+        assert not (tmp_path / "nations.xml.gz.part").exists()
+        assert progress[-1] == len(dump_server.dump)
+
+        result = await ns.NationStates_DataDump_Client(str(tmp_path)).get_nation("nation 1999", shards=None)
+        assert result["REGION"] == "Region 1"
+
+    @pytest.mark.asyncio
+    async def test_iter_nations(self, tmp_path):
+        (tmp_path / "nations.xml.gz").write_bytes(make_nations_dump(2500))
+        api = ns.NationStates_DataDump_Client(str(tmp_path))
+
+        batches = [batch async for batch in api.iter_nations(batch_size=1000)]
+        assert [len(batch) for batch in batches] == [1000, 1000, 500]
+        assert batches[2][-1]["NAME"] == "Nation 2499"
+
+        async for batch in api.iter_nations(batch_size=10):
+            assert batch[0]["NAME"] == "Nation 0"
+            break
+
+        seen = []
+        await api.process_nation_data_dump(lambda _, nation: seen.append(nation["NAME"]) or len(seen) < 5)
+        assert seen == ["Nation {}".format(i) for i in range(5)]
+
+    @pytest.mark.asyncio
+    async def test_iter_nations_parallel(self, tmp_path):
+        nations = "".join("<NATION><NAME>Nation {0}</NAME><CENSUS><SCALE id=\"0\"><SCORE>{0}</SCORE></SCALE>"
+                          "<SCALE id=\"1\"><SCORE>1</SCORE></SCALE></CENSUS><MOTTO>&amp;</MOTTO></NATION>".format(i)
+                          for i in range(2500))
+        (tmp_path / "nations.xml.gz").write_bytes(gzip.compress("<NATIONS>{}</NATIONS>".format(nations).encode()))
+        serial = ns.NationStates_DataDump_Client(str(tmp_path))
+        parallel = ns.NationStates_DataDump_Client(str(tmp_path), processes=2)
+        await asyncio.to_thread(parallel.nation_index.build)
+
+        expected = [batch async for batch in serial.iter_nations(batch_size=1000)]
+        batches = [batch async for batch in parallel.iter_nations(batch_size=1000)]
+        assert [len(batch) for batch in batches] == [1000, 1000, 500]
+        assert batches == expected
+
+    def test_iter_nations_memory_budget(self, tmp_path):
+        # A run of nations with long endorsement lists makes batches of a fixed amount of records far larger than the
+        # rest, only batches sized by their bytes stay under the budget.
+        endorsements = ",".join("nation_{}".format(i) for i in range(2000))
+        with gzip.open(tmp_path / "nations.xml.gz", "wt", compresslevel=1) as dump:
+            dump.write("<NATIONS>")
+            for i in range(1_000_000):
+                dump.write("<NATION><NAME>Nation {}</NAME><ENDORSEMENTS>{}</ENDORSEMENTS></NATION>".format(
+                    i, endorsements if 500_000 <= i < 505_000 else ""))
+            dump.write("</NATIONS>")
+        budget = 16 * 1024 * 1024
+        # The dump is read in a fresh process, so its peak RSS is not affected by the rest of the tests.
+        script = MEMORY_BUDGET_SCRIPT.format(directory=str(tmp_path), budget=budget, bounded=True)
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                                env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)})
+        count, growth = map(int, result.stdout.split())
+        assert count == 1_000_000
+        assert growth < budget
+
+    @pytest.mark.asyncio
+    async def test_response_cache(self, api_server, tmp_path):
+        cache = ResponseCache(path=str(tmp_path / "cache.sqlite"))
+        async with aiohttp.ClientSession() as session:
+            api = make_client(session, api_server, cache=cache)
+            first = await api.get_nation("Testlandia", shards=["region", "name"])
+            second = await api.get_nation("testlandia", shards=["name", "region"])
+            await api.get_nation("Testlandia", shards=["region"])
+            await api.get_region("Testregionia", shards=None)
+            await api.get_region("testregionia", shards=None)
+            await api.get_nation("Testlandia", shards=["region"], checksum="abc")
+
+        assert first == second
+        assert len(api_server.requests) == 4
+        assert cache.stats()["hits"] == 2
+
+        # Changing a response, or the shards it was requested with, does not change what is cached.
+        first["REGION"] = "Elsewhere"
+        assert (await cache.get("nation", "Testlandia", ["name", "region"]))["REGION"] == "Testregionia"
+        shards = ["region", "verify"]
+        async with aiohttp.ClientSession() as session:
+            await make_client(session, api_server, cache=cache).get_nation("Testlandia", shards, checksum="abc")
+        assert shards == ["region", "verify"]
+
+        cache.close()
+        restarted = ResponseCache(path=str(tmp_path / "cache.sqlite"))
+        assert (await restarted.get("nation", "Testlandia", ["name", "region"]))["REGION"] == "Testregionia"
+        assert restarted.stats()["disk_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_request_coalescing(self, api_server):
+        api_server.delay = 0.1
+        async with aiohttp.ClientSession() as session:
+            api = make_client(session, api_server)
+            results = await asyncio.gather(*(api.get_nation("Testlandia", shards=["region"]) for _ in range(10)),
+                                           api.get_region("Testregionia", shards=None),
+                                           api.get_region("Testregionia", shards=None))
+            assert not api._in_flight
+            await api.get_nation("Testlandia", shards=["region"])
+
+        assert all(result["REGION"] == "Testregionia" for result in results[:10])
+        assert results[10]["DELEGATE"] == "testlandia"
+        assert len(api_server.requests) == 3
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_retry_after(self, api_server):
+        api_server.rate_limited = 1
+        api_server.retry_after = 1
+        async with aiohttp.ClientSession() as session:
+            api = make_client(session, api_server)
+            start = time.monotonic()
+            result = await api.get_nation("Testlandia", shards=None, user_agent="Other")
+            assert time.monotonic() - start >= 1
+
+        assert result["NAME"] == "Testlandia"
+        assert len(api_server.requests) == 2
+        assert api.limiter.stats()["rate_limited"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_gives_up(self, api_server):
+        api_server.rate_limited = 10
+        async with aiohttp.ClientSession() as session:
+            api = make_client(session, api_server)
+            api.max_retries = 2
+            with pytest.raises(RateLimited):
+                await api.get_nation("Testlandia", shards=None)
+        assert len(api_server.requests) == 3
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_headers(self, api_server):
+        api_server.rate_limit_headers = {"RateLimit-Policy": "40;w=20", "RateLimit-Remaining": "0",
+                                         "RateLimit-Reset": "1"}
+        async with aiohttp.ClientSession() as session:
+            api = make_client(session, api_server)
+            await api.get_nation("Testlandia", shards=None)
+            assert (api.limiter.max_rate, api.limiter.time_period) == (40, 20)
+            assert api.limiter.budget == 0
+            assert api.limiter.wait_time() > 0.5
+            start = time.monotonic()
+            await api.get_region("Testregionia", shards=None)
+            assert time.monotonic() - start >= 0.5
+        assert api.limiter.stats()["waits"] == 1
+
+    def test_rate_limit_window(self):
+        limiter = RateLimiter(max_rate=3, time_period=10)
+        for _ in range(3):
+            asyncio.run(limiter.acquire())
+        assert limiter.budget == 0
+        assert 9 < limiter.wait_time() <= 10
+
+    @pytest.mark.asyncio
+    async def test_scheduler_priority(self):
+        limiter = RateLimiter(max_rate=1, time_period=0.05)
+        scheduler = RequestScheduler(limiter)
+        order = []
+
+        async def request(priority, requester, label):
+            await scheduler.acquire(priority, requester)
+            order.append(label)
+
+        # Take the only slot so everything else has to queue.
+        await scheduler.acquire(Priority.BACKGROUND)
+        tasks = [asyncio.create_task(request(Priority.BACKGROUND, "refresh", "background-{}".format(i)))
+                 for i in range(3)]
+        tasks += [asyncio.create_task(request(Priority.USER, "a", "a-{}".format(i))) for i in range(3)]
+        tasks.append(asyncio.create_task(request(Priority.USER, "b", "b-0")))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request(Priority.INTERACTIVE, "verify", "verify")))
+        await asyncio.sleep(0)
+
+        assert scheduler.queue_depth() == 8
+        assert scheduler.queue_depth(Priority.USER) == 4
+        assert scheduler.estimated_wait(Priority.INTERACTIVE) < scheduler.estimated_wait(Priority.BACKGROUND)
+
+        await asyncio.gather(*tasks)
+        scheduler.close()
+        assert order == ["verify", "a-0", "b-0", "a-1", "a-2", "background-0", "background-1", "background-2"]
+
+    @pytest.mark.asyncio
+    async def test_scheduler_background_flood(self):
+        limiter = RateLimiter(max_rate=4, time_period=0.2)
+        scheduler = RequestScheduler(limiter)
+        flood = [asyncio.create_task(scheduler.acquire(Priority.BACKGROUND, "refresh")) for _ in range(40)]
+        await asyncio.sleep(0.1)
+
+        start = time.monotonic()
+        await scheduler.acquire(Priority.INTERACTIVE, "verify")
+        waited = time.monotonic() - start
+        queued = scheduler.queue_depth(Priority.BACKGROUND)
+        scheduler.close()
+        for task in flood:
+            task.cancel()
+
+        # The interactive request only waits for the next free slot, not for the background requests queued before it.
+        assert waited <= limiter.time_period + 0.05
+        assert queued >= 30
+
+    @pytest.mark.asyncio
+    async def test_get_nations(self, api_server):
+        api_server.delay = 0.05
+        api_server.missing = {"nation_3"}
+        names = ["nation_{}".format(i) for i in range(20)]
+        async with aiohttp.ClientSession() as session:
+            api = make_client(session, api_server)
+            started = time.monotonic()
+            results = {name: result async for name, result in api.get_nations(names, shards=["region"],
+                                                                              concurrency=10)}
+            elapsed = time.monotonic() - started
+            with pytest.raises(NotFound):
+                await api.get_nation("nation_3", shards=None)
+            api.close()
+
+        assert set(results) == set(names)
+        assert isinstance(results["nation_3"], NotFound)
+        assert results["nation_7"]["REGION"] == "Testregionia"
+        # Ten requests in flight at a time, instead of one after another.
+        assert elapsed < 20 * api_server.delay / 2
+
+    @pytest.mark.asyncio
+    async def test_get_verify_missing(self, api_server):
+        api_server.missing.add("missing")
+        async with aiohttp.ClientSession() as session:
+            api = make_client(session, api_server)
+            assert not await api.get_verify("missing", "abcdefgh1234567890")
+
+    def test_parse_response(self):
+        response = ("<NATION id=\"testlandia\"><NAME>Testlandia &amp; Co</NAME><ENDORSEMENTS>a,b</ENDORSEMENTS>"
+                    "<POPULATION>42</POPULATION><FLAG/><CENSUS><SCALE id=\"0\"><SCORE>1.5</SCORE></SCALE></CENSUS>"
+                    "<HAPPENINGS><EVENT id=\"1\"><TEXT>x</TEXT></EVENT><EVENT id=\"2\"><TEXT>y</TEXT></EVENT>"
+                    "</HAPPENINGS><EMBASSIES><EMBASSY type=\"pending\">A</EMBASSY></EMBASSIES></NATION>")
+        nation = parse_response(response, "NATION")
+        assert nation == xmltodict.parse(response)["NATION"]
+        assert type(nation) is dict
+        assert nation["ENDORSEMENTS"] == "a,b"
+        with pytest.raises(KeyError):
+            parse_response(response, "REGION")
+
+    def test_response_cache_ttl(self):
+        cache = ResponseCache(default_ttl=60, shard_ttls={"region": 10, "name": 3600})
+        assert cache.ttl(None) == 60
+        assert cache.ttl(["name"]) == 3600
+        assert cache.ttl(["name", "region"]) == 10
+        assert cache.ttl(["flag"]) == 60
+        assert cache.key("nation", "The Testlandia", ["Region", "name"]) == "nation:the_testlandia:name+region"
+
+    def test_scan_records(self):
+        dump = gzip.decompress(make_nations_dump(50))
+        chunks = (dump[i:i + 7] for i in range(0, len(dump), 7))
+        records = list(dumps.scan_records(chunks, "NATION"))
+        assert len(records) == 50
+        name, offset, length = records[42]
+        assert name == "nation 42"
+        assert dump[offset:offset + length].startswith(b"<NATION><NAME>Nation 42</NAME>")
+        assert dump[offset:offset + length].endswith(b"</NATION>")
+
+        # Names are unescaped the same way the parser does it, numeric character references included.
+        dump = b"<NATIONS><NATION><NAME>Testlandia&#39;s &amp; &quot;Co&quot;</NAME></NATION></NATIONS>"
+        (name, offset, length), = dumps.scan_records(iter([dump]), "NATION")
+        assert name == xmltodict.parse(dump)["NATIONS"]["NATION"]["NAME"].casefold()
+        assert name == "testlandia's & \"co\""
+
+    def test_dump_archive(self, tmp_path):
+        pytest.importorskip("numpy")
+        from Scout.nsapi.archive import DumpArchive
+
+        def nations(count: int, shift: int):
+            return [{"NAME": "Nation {}".format(i), "REGION": "Region {}".format((i + shift) % 3),
+                     "UNSTATUS": "WA Member", "ENDORSEMENTS": ",".join(["a"] * (i + shift)), "LASTLOGIN": "1700000000",
+                     "CENSUS": {"SCALE": [{"@id": "0", "SCORE": str(i)}, {"@id": "66", "SCORE": str(i + shift)}]}}
+                    for i in range(count)]
+
+        archive = DumpArchive(str(tmp_path), retention_days=7)
+        for date, count, shift in ((datetime.date(2024, 1, 1), 10, 0), (datetime.date(2024, 1, 5), 12, 1)):
+            writer = archive.writer(date)
+            writer.add(nations(count, shift)[:5])
+            writer.add(nations(count, shift)[5:])
+            writer.finish()
+
+        snapshot = archive.get(datetime.date(2024, 1, 4))
+        assert snapshot.date == datetime.date(2024, 1, 1)
+        assert snapshot.region_names()[snapshot.find("NATION 4")] == b"region 1"
+
+        changes = archive.changes_since(4)
+        assert list(changes.added) == [b"nation 10", b"nation 11"]
+        assert len(changes.removed) == 0 and len(changes.moved) == 10
+        assert (changes.endorsements == 1).all()
+        arrived, left = changes.region("Region 0")
+        assert list(arrived) == [b"nation 2", b"nation 5", b"nation 8"]
+        assert list(left) == [b"nation 0", b"nation 3", b"nation 6", b"nation 9"]
+
+        assert archive.prune(datetime.date(2024, 1, 10)) == 1
+        assert archive.dates() == [datetime.date(2024, 1, 5)]
+
+    @pytest.mark.asyncio
+    async def test_indexed_lookup(self, tmp_path):
+        (tmp_path / "nations.xml.gz").write_bytes(make_nations_dump(3000))
+        (tmp_path / "regions.xml.gz").write_bytes(gzip.compress(
+            b"<REGIONS><REGION><NAME>Region &amp; Co</NAME><DELEGATE>nation_1</DELEGATE></REGION></REGIONS>"))
+        api = ns.NationStates_DataDump_Client(str(tmp_path))
+        await api.build_indexes()
+        assert api.nation_index.is_current()
+
+        result = await api.get_nation("NATION 2500", shards=None)
+        assert result["NAME"] == "Nation 2500"
+        assert result["REGION"] == "Region 1"
+        result = await api.get_nation("Nation 2500", shards=["region"])
+        assert list(result.keys()) == ["REGION"]
+        assert await api.get_nation("Nation 3000", shards=None) is None
+        result = await api.get_region("region & co", shards=None)
+        assert result["DELEGATE"] == "nation_1"
+
+        # A new dump makes the index stale, so lookups fall back to scanning the dump.
+        (tmp_path / "nations.xml.gz").write_bytes(make_nations_dump(3001))
+        assert not api.nation_index.is_current()
+        result = await api.get_nation("Nation 3000", shards=None)
+        assert result["REGION"] == "Region 0"
+
+    @pytest.mark.asyncio
+    async def test_get_daily_dump_conditional(self, static_dump_server, tmp_path):
+        async with aiohttp.ClientSession() as session:
+            api = ns.NationStates_Client(user_agent="Test", session=session, dump_directory=str(tmp_path))
+            api.nationstates_dump_url = str(static_dump_server.make_url("/pages/")) + "{}.xml.gz"
+            assert await api.get_daily_dump("nations")
+            assert not await api.get_daily_dump("nations")
+
+            api = ns.NationStates_Client(user_agent="Test", session=session, dump_directory=str(tmp_path))
+            api.nationstates_dump_url = str(static_dump_server.make_url("/pages/")) + "{}.xml.gz"
+            assert not await api.get_daily_dump("nations")
+
+        assert [status for _, status in static_dump_server.requests] == [200, 304, 304]
+        assert (tmp_path / "nations.xml.gz").read_bytes() == static_dump_server.dump_file.read_bytes()
+
+    @pytest.mark.asyncio
+    async def test_get_daily_dump_concurrent(self, static_dump_server, tmp_path):
+        async with aiohttp.ClientSession() as session:
+            api = ns.NationStates_Client(user_agent="Test", session=session, dump_directory=str(tmp_path))
+            api.nationstates_dump_url = str(static_dump_server.make_url("/pages/")) + "{}.xml.gz"
+            assert await asyncio.gather(api.get_daily_dump("regions"), api.get_daily_dump("nations")) == [True, True]
+
+            # Both downloads are recorded in the one manifest, so neither is downloaded again after a restart.
+            assert set(dumps.DumpManifest(str(tmp_path / "dumps.json")).load().entries) == {"regions", "nations"}
+            assert not list(tmp_path.glob("*.tmp"))
+            api = ns.NationStates_Client(user_agent="Test", session=session, dump_directory=str(tmp_path))
+            api.nationstates_dump_url = str(static_dump_server.make_url("/pages/")) + "{}.xml.gz"
+            assert await asyncio.gather(api.get_daily_dump("regions"), api.get_daily_dump("nations")) == [False, False]
+
+        assert sorted(status for _, status in static_dump_server.requests) == [200, 200, 304, 304]
+
+    @pytest.mark.asyncio
+    async def test_get_daily_dump_resume(self, static_dump_server, tmp_path):
+        async with aiohttp.ClientSession() as session:
+            api = ns.NationStates_Client(user_agent="Test", session=session, dump_directory=str(tmp_path))
+            api.nationstates_dump_url = str(static_dump_server.make_url("/pages/")) + "{}.xml.gz"
+            assert await api.get_daily_dump("nations")
+
+            # Pretend the download was interrupted halfway through.
+            dump = (tmp_path / "nations.xml.gz").read_bytes()
+            (tmp_path / "nations.xml.gz").unlink()
+            (tmp_path / "nations.xml.gz.part").write_bytes(dump[:len(dump) // 2])
+            api.dump_manifest.start_download("nations", *api.dump_manifest.validators("nations"))
+            assert await api.get_daily_dump("nations")
+
+        headers, status = static_dump_server.requests[-1]
+        assert status == 206
+        assert headers["Range"] == "bytes={}-".format(len(dump) // 2)
+        assert (tmp_path / "nations.xml.gz").read_bytes() == static_dump_server.dump_file.read_bytes()
+        assert not api.dump_manifest.is_ingested("nations")
+
 
 # Integration Tests
 class Test_Integration_NSAPI:
@@ -76,10 +564,11 @@ class Test_Integration_NSAPI:
         assert not result
 
     @pytest.mark.asyncio
-    async def test_get_data_dump(self, useragent):
-        api = ns.NationStates_Client(user_agent=useragent, session=aiohttp.ClientSession())
-        result = await api.get_daily_dump("nations")
-        assert not result
+    async def test_get_data_dump(self, useragent, tmp_path):
+        api = ns.NationStates_Client(user_agent=useragent, session=aiohttp.ClientSession(),
+                                     dump_directory=str(tmp_path))
+        assert await api.get_daily_dump("nations")
+        assert not await api.get_daily_dump("nations")
 
 
 class Test_Integration_NSAPI_Dumps:
@@ -0,0 +1,221 @@
+import asyncio
+import types
+
+import discord
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
+
+from Scout.core.nationstates import roles
+from Scout.core.nationstates.nsverify import NSVerify, MEMBER_FETCH_CONCURRENCY
+from Scout.core.nationstates.roles import VERIFIED, RESIDENT
+from Scout.database.base import Base
+from Scout.database.models import Region, Nation, Guild, User
+from Scout.database.role_index import GuildRoleIndex
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_engine():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+def member(id: int, roles: set[int] = frozenset()):
+    return types.SimpleNamespace(id=id, roles=[types.SimpleNamespace(id=role, is_default=lambda: False)
+                                               for role in roles])
+
+
+def role_index() -> GuildRoleIndex:
+    # Guild 1 has both roles, guild 2 only has a verified role and guild 3 has neither. Guilds 1 and 3 are linked to
+    # the same region.
+    index = GuildRoleIndex()
+    index.set(1, VERIFIED, 100)
+    index.set(1, RESIDENT, 101)
+    index.set(2, VERIFIED, 200)
+    return index
+
+
+def add_users(session: Session | AsyncSession) -> dict[str, Nation]:
+    linked, other = Region(name="linked", data={}), Region(name="other", data={})
+    nations = {"resident": Nation(name="resident", data={}, region=linked),
+               "visitor": Nation(name="visitor", data={}, region=other)}
+    session.add_all([
+        Guild(snowflake=1, regions={linked}), Guild(snowflake=2, regions=set()), Guild(snowflake=3, regions={linked}),
+        User(snowflake=10, nations={nations["resident"]}),
+        User(snowflake=11, nations={nations["visitor"]}),
+        User(snowflake=12, nations=set()),
+    ])
+    return nations
+
+
+class FakeGuild:
+    def __init__(self, id: int, members: list, *, chunked: bool = False, fetchable: list = ()):
+        self.id = id
+        self.chunked = chunked
+        self.members = {member.id: member for member in members}
+        self.fetchable = {member.id: member for member in fetchable}
+        self.fetched = []
+
+    def get_member(self, id: int):
+        return self.members.get(id, None)
+
+    async def fetch_member(self, id: int):
+        self.fetched.append(id)
+        if id not in self.fetchable:
+            raise discord.NotFound(types.SimpleNamespace(status=404, reason="Not Found"), "Unknown Member")
+        return self.fetchable[id]
+
+
+# Unit Tests
+class Test_Unit_NSVerify:
+    @pytest.mark.asyncio
+    async def test_eligible_nsv_role(self, async_engine):
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            linked, other = Region(name="linked", data={}), Region(name="other", data={})
+            guild, unlinked_guild = Guild(snowflake=1, regions={linked}), Guild(snowflake=2, regions=set())
+            session.add_all([
+                guild, unlinked_guild,
+                User(snowflake=10, nations={Nation(name="resident", data={}, region=linked)}),
+                User(snowflake=11, nations={Nation(name="visitor", data={}, region=other)}),
+                User(snowflake=12, nations={Nation(name="ceased", data={}, region=None)}),
+            ])
+            await session.commit()
+
+            assert await NSVerify.eligible_nsv_role(member(10), guild, session) == RESIDENT
+            assert await NSVerify.eligible_nsv_role(member(10), unlinked_guild, session) == VERIFIED
+            assert await NSVerify.eligible_nsv_role(member(11), guild, session) == VERIFIED
+            assert await NSVerify.eligible_nsv_role(member(12), guild, session) == VERIFIED
+            assert await NSVerify.eligible_nsv_role(member(13), guild, session) is None
+            assert await NSVerify.eligible_nsv_role(member(10), None, session) is None
+
+    def test_reconciler_desired(self, engine):
+        reconciler = roles.RoleReconciler(role_index())
+        with Session(engine) as session:
+            add_users(session)
+            session.commit()
+            reconciler.load(session)
+
+        assert reconciler.verified == {10, 11}
+        assert reconciler.desired(1, 10) == {101}
+        assert reconciler.desired(1, 11) == {100}
+        assert reconciler.desired(2, 10) == {200}
+        # Members that have not verified a nation, and guilds without managed roles, get nothing.
+        assert reconciler.desired(1, 12) == set()
+        assert reconciler.desired(1, 13) == set()
+        assert reconciler.desired(3, 10) == set()
+
+    def test_reconciler_plan(self, engine):
+        reconciler = roles.RoleReconciler(role_index())
+        with Session(engine) as session:
+            add_users(session)
+            session.commit()
+            reconciler.load(session)
+
+        members = [(10, {100, 5}), (11, {100}), (12, {101, 5}), (13, set())]
+        changes = reconciler.diff(1, members)
+        # Roles that are not managed are left alone, and members whose roles are right are not changed.
+        assert [(change.member, change.add, change.remove) for change in changes] == [
+            (10, {101}, {100}), (12, set(), {101})]
+        assert reconciler.diff(3, members) == []
+        assert [(change.guild, change.member) for change in reconciler.plan([(1, members), (2, members), (3, members)])
+                ] == [(1, 10), (1, 12), (2, 10), (2, 11)]
+
+    def test_reconciler_users(self, engine):
+        reconciler = roles.RoleReconciler(role_index())
+        with Session(engine) as session:
+            add_users(session)
+            session.commit()
+            reconciler.load(session, users={10, 12})
+        assert reconciler.verified == {10}
+        assert reconciler.residents == {1: {10}, 3: {10}}
+
+    @pytest.mark.asyncio
+    async def test_moved_members_fetched(self, async_engine):
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            nations = add_users(session)
+            await session.commit()
+
+        # Member 10 is not cached in either linked guild, guild 3's cache is complete so only guild 1 is asked over REST.
+        guilds = {1: FakeGuild(1, [member(11, {101})], fetchable=[member(10, {100})]), 2: FakeGuild(2, []),
+                  3: FakeGuild(3, [], chunked=True)}
+        queued = []
+
+        async def enqueue(changes):
+            queued.extend(changes)
+            return len(changes)
+
+        cog = NSVerify.__new__(NSVerify)
+        cog.scout = types.SimpleNamespace(role_index=role_index(), async_session=async_sessionmaker(async_engine),
+                                          get_guild=guilds.get)
+        cog.role_jobs = types.SimpleNamespace(enqueue=enqueue)
+        await cog.update_moved_roles({nations["resident"].id: (nations["visitor"].region_id,
+                                                               nations["resident"].region_id),
+                                      nations["visitor"].id: (nations["resident"].region_id,
+                                                              nations["visitor"].region_id)})
+
+        assert guilds[1].fetched == [10] and guilds[3].fetched == []
+        assert sorted((change.guild, change.member, change.add, change.remove) for change in queued) == [
+            (1, 10, {101}, {100}), (1, 11, {100}, {101})]
+
+    @pytest.mark.asyncio
+    async def test_mutual_members(self):
+        cached, uncached, missing = member(10, {100}), member(10, {200}), member(11)
+        guilds = [FakeGuild(1, [cached], fetchable=[cached]), FakeGuild(2, [], fetchable=[uncached]),
+                  FakeGuild(3, [], chunked=True, fetchable=[member(10)]), FakeGuild(4, [missing])]
+        user = types.SimpleNamespace(id=10, mutual_guilds=[guilds[0]])
+
+        # The cached member is used as is, and only the guilds whose cache is not complete are asked over REST.
+        members = await NSVerify.mutual_members(user, guilds)
+        assert {guild.id: member for guild, member in members.items()} == {1: cached, 2: uncached}
+        assert [guild.fetched for guild in guilds] == [[], [10], [], [10]]
+
+    @pytest.mark.asyncio
+    async def test_mutual_members_concurrency(self):
+        running, peak = 0, 0
+
+        class SlowGuild(FakeGuild):
+            async def fetch_member(self, id: int):
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+                return await super().fetch_member(id)
+
+        guilds = [SlowGuild(id, [], fetchable=[member(10)]) for id in range(MEMBER_FETCH_CONCURRENCY * 3)]
+        members = await NSVerify.mutual_members(types.SimpleNamespace(id=10, mutual_guilds=[]), guilds)
+        assert len(members) == len(guilds)
+        assert peak == MEMBER_FETCH_CONCURRENCY
+
+    @pytest.mark.asyncio
+    async def test_edit_roles(self):
+        edits = []
+
+        async def edit(*, roles, reason):
+            edits.append({role.id for role in roles})
+
+        target = member(10, {5, 100})
+        target.roles.append(types.SimpleNamespace(id=1, is_default=lambda: True))
+        target.edit = edit
+
+        # Nothing is sent when the roles would not change.
+        assert not await NSVerify.edit_roles(target, set(), set())
+        assert not await NSVerify.edit_roles(target, {100}, {101})
+        assert edits == []
+
+        # Adding and removing is done with one edit, which leaves the default role and unmanaged roles alone.
+        assert await NSVerify.edit_roles(target, {101}, {100})
+        assert edits == [{5, 101}]
@@ -0,0 +1,255 @@
+import asyncio
+import datetime
+import time
+import types
+
+import discord
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from Scout.core.nationstates import role_jobs
+from Scout.core.nationstates.role_jobs import RoleJobQueue, TokenBucket, MAX_ATTEMPTS
+from Scout.core.nationstates.roles import RoleChange
+from Scout.database.base import Base
+from Scout.database.models import RoleJob
+
+
+@pytest_asyncio.fixture
+async def async_engine(tmp_path):
+    # The workers use sessions of their own at the same time, so the database is a file instead of one connection.
+    engine = create_async_engine("sqlite+aiosqlite:///{}".format(tmp_path / "scout.sqlite"))
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def short_delays(monkeypatch):
+    monkeypatch.setattr(role_jobs, "RETRY_DELAY", 0.01)
+
+
+def http_error(status: int, error: type[discord.HTTPException] = discord.HTTPException) -> discord.HTTPException:
+    return error(types.SimpleNamespace(status=status, reason="Test"), "Test")
+
+
+class FakeApply:
+    """Records every job it is given, and fails with the given errors before succeeding."""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.calls = []
+
+    async def __call__(self, guild: int, member: int, add: set[int], remove: set[int]) -> bool:
+        self.calls.append((guild, member, add, remove))
+        if self.errors:
+            raise self.errors.pop(0)
+        return bool(add or remove)
+
+
+async def finished(queue: RoleJobQueue, jobs: int):
+    # Waits until the queue has dealt with the given amount of jobs, and the workers are done with every guild.
+    async def wait():
+        while queue.applied + queue.skipped + queue.failed < jobs or queue._members:
+            await asyncio.sleep(0.005)
+    await asyncio.wait_for(wait(), 5)
+
+
+async def stored_jobs(engine) -> dict[tuple[int, int], RoleJob]:
+    async with AsyncSession(engine) as session:
+        return {(job.guild_snowflake, job.member_snowflake): job for job in await session.scalars(select(RoleJob))}
+
+
+# Unit Tests
+class Test_Unit_RoleJobs:
+    def test_merge(self):
+        # The newer change wins for a role both changes touch.
+        assert role_jobs._merge({1, 2}, {3}, {3}, {2}) == ({1, 3}, {2})
+        assert role_jobs._merge({1}, {2}, set(), set()) == ({1}, {2})
+        assert role_jobs._merge(set(), set(), {1}, {2}) == ({1}, {2})
+
+    @pytest.mark.asyncio
+    async def test_token_bucket(self):
+        bucket = TokenBucket(100, 2)
+        start = time.monotonic()
+        await bucket.wait()
+        bucket.take()
+        await bucket.wait()
+        bucket.take()
+        assert time.monotonic() - start < 0.01
+
+        # Once the burst is used up, waiting takes as long as a token takes to refill.
+        await bucket.wait()
+        assert time.monotonic() - start >= 0.009
+        assert bucket.tokens >= 1
+        bucket.take()
+        bucket.take()
+        assert bucket.tokens < 0
+
+    @pytest.mark.asyncio
+    async def test_apply(self, async_engine):
+        apply = FakeApply()
+        queue = RoleJobQueue(async_engine, apply, workers=2)
+        await queue.start()
+        try:
+            assert await queue.enqueue([RoleChange(1, 10, {100}, set()), RoleChange(1, 11, set(), set()),
+                                        RoleChange(1, 10, set(), {101}), RoleChange(2, 10, {200}, set())]) == 3
+            await finished(queue, 3)
+        finally:
+            queue.stop()
+        assert sorted(apply.calls) == [(1, 10, {100}, {101}), (1, 11, set(), set()), (2, 10, {200}, set())]
+        assert (queue.applied, queue.skipped, queue.failed) == (2, 1, 0)
+        assert await stored_jobs(async_engine) == {}
+
+    @pytest.mark.asyncio
+    async def test_merge_while_applying(self, async_engine):
+        started, release = asyncio.Event(), asyncio.Event()
+        calls = []
+
+        async def apply(guild: int, member: int, add: set[int], remove: set[int]) -> bool:
+            calls.append((add, remove))
+            if len(calls) == 1:
+                started.set()
+                await release.wait()
+            return True
+
+        queue = RoleJobQueue(async_engine, apply, workers=1)
+        await queue.start()
+        try:
+            await queue.enqueue([RoleChange(1, 10, {100}, {101})])
+            await asyncio.wait_for(started.wait(), 5)
+            await queue.enqueue([RoleChange(1, 10, {101}, {100})])
+            release.set()
+            await finished(queue, 2)
+        finally:
+            queue.stop()
+
+        # The job that changed while it was applied is not deleted, and the newer change is applied after it.
+        assert calls == [({100}, {101}), ({101}, {100})]
+        assert await stored_jobs(async_engine) == {}
+
+    @pytest.mark.asyncio
+    async def test_retry(self, async_engine, monkeypatch):
+        apply = FakeApply(*(http_error(500) for _ in range(MAX_ATTEMPTS)))
+        queue = RoleJobQueue(async_engine, apply)
+        delays = []
+        later = queue._later
+
+        def record(delay: float, guild: int, member: int):
+            delays.append(delay)
+            later(delay, guild, member)
+
+        monkeypatch.setattr(queue, "_later", record)
+        await queue.start()
+        try:
+            await queue.enqueue([RoleChange(1, 10, {100}, set())])
+            await finished(queue, 1)
+        finally:
+            queue.stop()
+
+        # Each retry waits twice as long as the last, and the job is dropped after the last attempt.
+        assert len(apply.calls) == MAX_ATTEMPTS
+        assert delays == [role_jobs.RETRY_DELAY * 2 ** attempt for attempt in range(MAX_ATTEMPTS - 1)]
+        assert queue.failed == 1
+        assert await stored_jobs(async_engine) == {}
+
+    @pytest.mark.asyncio
+    async def test_not_retried(self, async_engine):
+        apply = FakeApply(http_error(404, discord.NotFound), http_error(403, discord.Forbidden))
+        queue = RoleJobQueue(async_engine, apply)
+        await queue.start()
+        try:
+            await queue.enqueue([RoleChange(1, 10, {100}, set()), RoleChange(1, 11, {100}, set())])
+            await finished(queue, 2)
+        finally:
+            queue.stop()
+        assert len(apply.calls) == 2 and queue.failed == 2
+        assert await stored_jobs(async_engine) == {}
+
+    @pytest.mark.asyncio
+    async def test_unexpected_error(self, async_engine):
+        apply = FakeApply(RuntimeError("Test"))
+        queue = RoleJobQueue(async_engine, apply)
+        await queue.start()
+        try:
+            await queue.enqueue([RoleChange(1, 10, {100}, set())])
+            await finished(queue, 1)
+        finally:
+            queue.stop()
+
+        # A job that fails in an unexpected way is tried again instead of waiting for a restart.
+        assert len(apply.calls) == 2 and queue.applied == 1
+        assert await stored_jobs(async_engine) == {}
+
+    @pytest.mark.asyncio
+    async def test_unexpected_error_limit(self, async_engine, monkeypatch):
+        apply = FakeApply(*(RuntimeError("Test") for _ in range(MAX_ATTEMPTS)))
+        queue = RoleJobQueue(async_engine, apply)
+        delays = []
+        later = queue._later
+
+        def record(delay: float, guild: int, member: int):
+            delays.append(delay)
+            later(delay, guild, member)
+
+        monkeypatch.setattr(queue, "_later", record)
+        await queue.start()
+        try:
+            await queue.enqueue([RoleChange(1, 10, {100}, set())])
+            await finished(queue, 1)
+        finally:
+            queue.stop()
+
+        # A job that always fails is given up on like any other failure, instead of being retried forever.
+        assert len(apply.calls) == MAX_ATTEMPTS and queue.failed == 1
+        assert delays == [role_jobs.RETRY_DELAY * 2 ** attempt for attempt in range(MAX_ATTEMPTS - 1)]
+        assert await stored_jobs(async_engine) == {}
+
+    @pytest.mark.asyncio
+    async def test_database_error(self, async_engine, monkeypatch):
+        apply = FakeApply()
+        queue = RoleJobQueue(async_engine, apply)
+        finish = queue._finish
+        failures = [RuntimeError("Test")]
+
+        async def flaky_finish(guild: int, member: int, revision: int):
+            if failures:
+                raise failures.pop()
+            await finish(guild, member, revision)
+
+        monkeypatch.setattr(queue, "_finish", flaky_finish)
+        await queue.start()
+        try:
+            await queue.enqueue([RoleChange(1, 10, {100}, set())])
+            await finished(queue, 2)
+        finally:
+            queue.stop()
+
+        # The failure is counted as an attempt, and the job is tried again after a delay.
+        assert len(apply.calls) == 2
+        assert await stored_jobs(async_engine) == {}
+
+    @pytest.mark.asyncio
+    async def test_resume(self, async_engine):
+        # The first queue is stopped before any job is applied, as if the bot was restarted.
+        await RoleJobQueue(async_engine, FakeApply()).enqueue([RoleChange(1, 10, {100}, set()),
+                                                               RoleChange(1, 11, {100}, set())])
+        async with AsyncSession(async_engine) as session:
+            job = await session.get(RoleJob, (1, 11))
+            job.attempts, job.not_before = 1, role_jobs._now() + datetime.timedelta(seconds=0.2)
+            await session.commit()
+
+        apply = FakeApply()
+        queue = RoleJobQueue(async_engine, apply)
+        await queue.start()
+        try:
+            await finished(queue, 1)
+            # The job waiting to be retried is only applied once its time comes.
+            assert apply.calls == [(1, 10, {100}, set())]
+            await finished(queue, 2)
+        finally:
+            queue.stop()
+        assert apply.calls[1] == (1, 11, {100}, set())
+        assert await stored_jobs(async_engine) == {}